@@ -18,8 +18,12 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import os
 import sys
+import time
 import json
-from sdb_component import SDBError
+import pickle
+import hashlib
+from .sdb_component import SDBError
+from .sdb_component import STRING_TYPES
 from collections import OrderedDict as odict
 
 __author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
@@ -31,6 +35,54 @@ Functions to manage devices
 LOCAL_DEVICE_LIST = os.path.join(os.path.dirname(__file__), "data", "local_devices", "devices.json")
 LOCAL_DEVICE_LIST = os.path.abspath(LOCAL_DEVICE_LIST)
 
+#Environmental variable with more device lists (separated by os.pathsep)
+DEVICE_LIST_ENV = "SDB_DEVICE_LIST"
+
+#Registry merged from all the device lists, reloaded when one of them changes
+_registry = None
+#When the device lists were last checked for changes
+_registry_checked = None
+
+#Seconds between checks for changes to the device lists, lookups in between
+#use the registry without touching the file system
+REFRESH_INTERVAL = 1.0
+
+#Bumped when the layout of the registry snapshot changes
+SNAPSHOT_VERSION = 2
+#Protocol 2 can be read by both Python 2 and 3
+SNAPSHOT_PROTOCOL = 2
+#Number of snapshots kept for different sets of device lists
+SNAPSHOT_LIMIT = 8
+
+
+def get_device_list_paths():
+    """Return the device lists that make up the registry, later lists are
+    layered on top of earlier ones:
+        The device list that comes with SDB
+        The user's device list: <config dir>/sdb/devices.json where the
+            config dir is $XDG_CONFIG_HOME or ~/.config
+        Every path in the SDB_DEVICE_LIST environmental variable
+
+    Args:
+      Nothing
+
+    Returns:
+      (list of strings): paths of the device lists, including the ones that
+          do not exist
+
+    Raises:
+      Nothing
+    """
+    #An empty variable is the same as one that is not set
+    config_dir = os.environ.get("XDG_CONFIG_HOME") or \
+                 os.path.join(os.path.expanduser("~"), ".config")
+    paths = [LOCAL_DEVICE_LIST,
+             os.path.join(config_dir, "sdb", "devices.json")]
+    for path in os.environ.get(DEVICE_LIST_ENV, "").split(os.pathsep):
+        if len(path) > 0:
+            paths.append(os.path.abspath(path))
+    return paths
+
 
 def get_device_list():
     """Return a list of device names where the index corresponds to the device
@@ -46,41 +98,8 @@ def get_device_list():
     Raises:
       Nothing
     """
-    dev_tags = {}
-    dev_list = []
-    index = 0
-    length = 0
-    try:
-        f = open(LOCAL_DEVICE_LIST, "r")
-        sdb_tags = json.load(f, object_pairs_hook = odict)
-    except TypeError as err:
-        print ("JSON Error: %s" % str(err))
-        raise SDBError("DRT Error: %s", str(err))
-
-    dev_tags = sdb_tags["devices"]
-
-    length = len(dev_tags.keys())
-
-    int_dict = {}
-    for key in dev_tags:
-        #change the hex number into a integer
-        index = None
-        id_val = dev_tags[key]["ID"]
-        if isinstance(id_val, str) or isinstance(id_val, unicode):
-            index = int(id_val[2:], 16)
-        else:
-            index = id_val
-
-        dev_tags[key]["name"] = key
-        #print "index: %d" % index
-        int_dict[index] = dev_tags[key]
-
-    ordered_keys = int_dict.keys()
-    dev_list = []
-    for key in ordered_keys:
-        dev_list.append(int_dict[key])
-
-    return dev_list
+    #Copies so the caller can not change the registry
+    return [odict(device) for device in _get_registry()["devices"]]
 
 def get_device_name_from_id(device_id):
     """return device name for the ID
@@ -94,28 +113,7 @@ def get_device_name_from_id(device_id):
     Raises:
         Nothing
     """
-    #print "Index: 0x%04X" % device_id
-    dev_tags = {}
-    try:
-        f = open(LOCAL_DEVICE_LIST, "r")
-        sdb_tags = json.load(f)
-    except TypeError as err:
-        print ("JSON Error: %s" % str(err))
-        raise SDBError("DRT Error: %s", str(err))
-
-    dev_tags = sdb_tags["devices"]
-    did = 0
-    for device in dev_tags:
-        #print "Looking at: %s" % device
-        did = None
-        if (type(dev_tags[device]["ID"]) == str) or (type(dev_tags[device]["ID"]) == unicode):
-            did = int(dev_tags[device]["ID"], 16)
-        else:
-            did = dev_tags[device]["ID"]
-
-        if did == device_id:
-            return device
-    return "Unknown Device"
+    return _get_registry()["id_to_name"].get(device_id, "Unknown Device")
 
 def get_device_id_from_name(name):
     """return the index of the device speicified by name
@@ -132,23 +130,12 @@ def get_device_id_from_name(name):
       Nothing
 
     """
-    dev_tags = {}
-    try:
-        f = open(LOCAL_DEVICE_LIST, "r")
-        sdb_tags = json.load(f)
-    except TypeError as err:
-        print ("JSON Error: %s" % str(err))
-        raise SDBError("DRT Error: %s", str(err))
-
-    dev_tags = sdb_tags["devices"]
-    for key in dev_tags:
-        if name.lower().strip() == key.lower().strip():
-            name = key
-
-    if name not in dev_tags.keys():
+    registry = _get_registry()
+    key = name.lower().strip()
+    if key not in registry["lower_name_to_id"]:
         raise SDBError("Name: %s is not a known type of devices" % name)
 
-    return int(dev_tags[name]["ID"], 0)
+    return registry["lower_name_to_id"][key]
 
 
 def get_device_type(index):
@@ -163,7 +150,202 @@ def get_device_type(index):
     Raises:
         Nothing
     """
-    dev_list = get_device_list()
-    return dev_list[index]["name"]
+    return _get_registry()["devices"][index]["name"]
+
+def refresh_device_lists():
+    """Check the device lists for changes on the next lookup instead of
+    waiting for REFRESH_INTERVAL to pass, call this after adding, removing or
+    modifying a device list or changing the environmental variables that
+    point to them
+
+    Args:
+      Nothing
+
+    Returns:
+      Nothing
+
+    Raises:
+      Nothing
+    """
+    global _registry_checked
+    _registry_checked = None
+
+def _get_registry():
+    """Return the registry of devices, the device lists are checked for
+    changes at most once every REFRESH_INTERVAL seconds and only read again
+    when one of them is added, removed or modified
+    """
+    global _registry
+    global _registry_checked
+    now = time.time()
+    if _registry is not None and _registry_checked is not None and \
+            0 <= now - _registry_checked < REFRESH_INTERVAL:
+        return _registry
+
+    sources = []
+    for path in get_device_list_paths():
+        mtime = None
+        if os.path.exists(path):
+            mtime = os.path.getmtime(path)
+        sources.append((path, mtime))
+
+    if _registry is None or _registry["sources"] != sources:
+        paths = [path for path, mtime in sources if mtime is not None]
+        digest = _hash_device_lists(paths)
+        registry = _read_snapshot(digest)
+        if registry is None:
+            registry = _load_registry(paths)
+            _write_snapshot(digest, registry)
+        registry["sources"] = sources
+        _registry = registry
+    #Not until the registry loads, a conflict is raised by every lookup
+    _registry_checked = now
+    return _registry
+
+def get_snapshot_dir():
+    """Return the directory of the compiled registries: <cache dir>/sdb where
+    the cache dir is $XDG_CACHE_HOME or ~/.cache, every user has their own
+    snapshots as the registry includes their device lists
+    """
+    #An empty variable is the same as one that is not set
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or \
+                os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_dir, "sdb")
+
+def _get_snapshot_path(digest):
+    """Return the path of the registry compiled from the device lists with
+    the digest, each set of device lists has its own snapshot
+    """
+    return os.path.join(get_snapshot_dir(), "devices-%s.pickle" % digest)
+
+def _hash_device_lists(paths):
+    """Return a digest of the names and contents of the device lists"""
+    digest = hashlib.sha1(("%d\0" % SNAPSHOT_VERSION).encode("ascii"))
+    for path in paths:
+        digest.update(path.encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _read_snapshot(digest):
+    """Return the registry from the snapshot or None if the snapshot is
+    missing, unreadable or was compiled from different device lists
+    """
+    path = _get_snapshot_path(digest)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            snapshot = pickle.load(f)
+        if snapshot["version"] != SNAPSHOT_VERSION or snapshot["digest"] != digest:
+            return None
+        #Most recently used
+        os.utime(path, None)
+        return snapshot["registry"]
+    except Exception:
+        #The JSON files are always there to fall back on
+        return None
+
+def _write_snapshot(digest, registry):
+    """Write the registry to its snapshot and remove the least recently used
+    snapshots beyond SNAPSHOT_LIMIT, a directory that can not be written to
+    only costs the next run the JSON parse
+    """
+    path = _get_snapshot_path(digest)
+    temp_path = "%s.%d" % (path, os.getpid())
+    snapshot = {"version": SNAPSHOT_VERSION,
+                "digest": digest,
+                "registry": registry}
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(temp_path, "wb") as f:
+            pickle.dump(snapshot, f, SNAPSHOT_PROTOCOL)
+        os.rename(temp_path, path)
+    except (IOError, OSError):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+    _remove_old_snapshots()
+
+def _remove_old_snapshots():
+    directory = get_snapshot_dir()
+    snapshots = []
+    for name in os.listdir(directory):
+        if not (name.startswith("devices-") and name.endswith(".pickle")):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            snapshots.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+    #Newest first
+    snapshots.sort(reverse = True)
+    for mtime, path in snapshots[SNAPSHOT_LIMIT:]:
+        try:
+            os.remove(path)
+        except OSError:
+            #Already removed by another process
+            pass
+
+def _read_device_list(path):
+    """Read a device list, returns the devices by name"""
+    try:
+        with open(path, "r") as f:
+            sdb_tags = json.load(f, object_pairs_hook = odict)
+    except (TypeError, ValueError) as err:
+        print ("JSON Error: %s" % str(err))
+        raise SDBError("DRT Error: %s: %s" % (path, str(err)))
+
+    return sdb_tags["devices"]
 
+def _load_registry(paths):
+    """Merge device lists and index them by ID and by name, a later list can
+    change a device but can not give a name to an ID that already has a
+    different one or a new ID to a name
 
+    Raises:
+      SDBError: device lists conflict
+    """
+    int_dict = {}
+    lower_name_to_id = {}
+    sources = {}
+    conflicts = []
+    for path in paths:
+        dev_tags = _read_device_list(path)
+        for key in dev_tags:
+            #change the hex number into a integer
+            id_val = dev_tags[key]["ID"]
+            if isinstance(id_val, STRING_TYPES):
+                index = int(id_val, 16)
+            else:
+                index = id_val
+            lower_name = key.lower().strip()
+
+            if lower_name in lower_name_to_id and lower_name_to_id[lower_name] != index:
+                conflicts.append("%s: %s is 0x%04X but is 0x%04X in %s" %
+                                 (path, key, index, lower_name_to_id[lower_name],
+                                  sources[lower_name_to_id[lower_name]]))
+                continue
+            if index in int_dict and int_dict[index]["name"].lower().strip() != lower_name:
+                conflicts.append("%s: 0x%04X is %s but is %s in %s" %
+                                 (path, index, key, int_dict[index]["name"], sources[index]))
+                continue
+
+            device = odict(dev_tags[key])
+            device["name"] = key
+            int_dict[index] = device
+            lower_name_to_id[lower_name] = index
+            sources[index] = path
+
+    if len(conflicts) > 0:
+        raise SDBError("Conflicting device definitions:\n%s" % "\n".join(conflicts))
+
+    id_to_name = {}
+    for index in int_dict:
+        id_to_name[index] = int_dict[index]["name"]
+
+    return {"devices": [int_dict[index] for index in sorted(int_dict)],
+            "id_to_name": id_to_name,
+            "lower_name_to_id": lower_name_to_id}
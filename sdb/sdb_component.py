@@ -17,15 +17,20 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import sys
+import struct
+import binascii
+import hashlib
 from datetime import datetime
 from array import array as Array
 import collections
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
 
-from sdb_core import SDBInfo
-from sdb_core import SDBWarning
-from sdb_core import SDBError
-
-import string
+from .sdb_core import SDBInfo
+from .sdb_core import SDBWarning
+from .sdb_core import SDBError
 
 DESCRIPTION = "SDB Component Parser and Generator"
 
@@ -73,6 +78,32 @@ SDB_RECORD_TYPE_REPO_URL     = 0x81
 SDB_RECORD_TYPE_SYNTHESIS    = 0x82
 SDB_RECORD_TYPE_EMPTY        = 0xFF
 
+#Layout of each of the 64 byte records within the ROM (Big Endian)
+#   Component:  First Address (Q), Last Address (Q)
+#   Product:    Vendor ID (Q), Device ID (I), Version (I),
+#               Date (Century, Year, Month, Day) (4B), Name (19s)
+#   Every record ends with the record type (B)
+SDB_INTERCONNECT_RECORD = struct.Struct(">IHBB" "QQ" "QII4B19s" "B")
+SDB_DEVICE_RECORD       = struct.Struct(">HBBHBB" "QQ" "QII4B19s" "B")
+SDB_BRIDGE_RECORD       = struct.Struct(">Q" "QQ" "QII4B19s" "B")
+SDB_INTEGRATION_RECORD  = struct.Struct(">24x" "QII4B19s" "B")
+SDB_REPO_URL_RECORD     = struct.Struct(">63s" "B")
+SDB_SYNTHESIS_RECORD    = struct.Struct(">16s16s8s4s4B15s" "B")
+SDB_EMPTY_RECORD        = struct.Struct(">63x" "B")
+
+MASK_32 = 0xFFFFFFFF
+MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+SDB_ENDIAN_BIG              = 0x00
+SDB_ENDIAN_LITTLE           = 0x01
+
+if sys.version_info < (3,):
+    STRING_TYPES = basestring
+    INTEGER_TYPES = (int, long)
+else:
+    STRING_TYPES = str
+    INTEGER_TYPES = (int,)
+
 def create_device_record(   name = None,
                             vendor_id = None,
                             device_id = None,
@@ -82,21 +113,21 @@ def create_device_record(   name = None,
                             version_minor = None,
                             size = None):
     sdb = SDBComponent()
-    sdb.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_DEVICE
+    sdb.set_record_type(SDB_RECORD_TYPE_DEVICE)
     if name is not None:
-        sdb.d["SDB_NAME"] = name
+        sdb.set_name(name)
     if vendor_id is not None:
-        sdb.d["SDB_VENDOR_ID"] = hex(vendor_id)
+        sdb.set_vendor_id(vendor_id)
     if device_id is not None:
-        sdb.d["SDB_DEVICE_ID"] = hex(device_id)
+        sdb.set_device_id(device_id)
     if core_version is not None:
-        sdb.d["SDB_CORE_VERSION"] = core_version
+        sdb.set_core_version(core_version)
     if abi_class is not None:
-        sdb.d["SDB_ABI_CLASS"] = hex(abi_class)
+        sdb.set_abi_class(abi_class)
     if version_major is not None:
-        sdb.d["SDB_ABI_VERSION_MAJOR"] = hex(version_major)
+        sdb.set_abi_version_major(version_major)
     if version_minor is not None:
-        sdb.d["SDB_ABI_VERSION_MINOR"] = hex(version_minor)
+        sdb.set_abi_version_minor(version_minor)
     if size is not None:
         sdb.set_size(size)
     return sdb
@@ -107,13 +138,13 @@ def create_interconnect_record( name = None,
                                 start_address = None,
                                 size = None):
     sdb = SDBComponent()
-    sdb.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_INTERCONNECT
+    sdb.set_record_type(SDB_RECORD_TYPE_INTERCONNECT)
     if name is not None:
-        sdb.d["SDB_NAME"] = name
+        sdb.set_name(name)
     if vendor_id is not None:
-        sdb.d["SDB_VENDOR_ID"] = hex(vendor_id)
+        sdb.set_vendor_id(vendor_id)
     if device_id is not None:
-        sdb.d["SDB_DEVICE_ID"] = hex(device_id)
+        sdb.set_device_id(device_id)
     if start_address is not None:
         sdb.set_start_address(start_address)
     if size is not None:
@@ -126,13 +157,13 @@ def create_bridge_record(       name = None,
                                 start_address = None,
                                 size = None):
     sdb = SDBComponent()
-    sdb.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_BRIDGE
+    sdb.set_record_type(SDB_RECORD_TYPE_BRIDGE)
     if name is not None:
-        sdb.d["SDB_NAME"] = name
+        sdb.set_name(name)
     if vendor_id is not None:
-        sdb.d["SDB_VENDOR_ID"] = hex(vendor_id)
+        sdb.set_vendor_id(vendor_id)
     if device_id is not None:
-        sdb.d["SDB_DEVICE_ID"] = hex(device_id)
+        sdb.set_device_id(device_id)
     if start_address is not None:
         sdb.set_start_address(start_address)
     if size is not None:
@@ -143,12 +174,12 @@ def create_integration_record(  information,
                                 vendor_id = None,
                                 device_id = None):
     sdb = SDBComponent()
-    sdb.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_INTEGRATION
-    sdb.d["SDB_NAME"] = information
+    sdb.set_record_type(SDB_RECORD_TYPE_INTEGRATION)
+    sdb.set_name(information)
     if vendor_id is not None:
-        sdb.d["SDB_VENDOR_ID"] = hex(vendor_id)
+        sdb.set_vendor_id(vendor_id)
     if device_id is not None:
-        sdb.d["SDB_DEVICE_ID"] = hex(device_id)
+        sdb.set_device_id(device_id)
     return sdb
 
 def create_synthesis_record(synthesis_name,
@@ -157,24 +188,185 @@ def create_synthesis_record(synthesis_name,
                       tool_version,
                       user_name):
     sdb = SDBComponent()
-    sdb.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_SYNTHESIS
-    sdb.d["SDB_SYNTH_NAME"] = synthesis_name
-    if isinstance(commit_id, int):
+    sdb.set_record_type(SDB_RECORD_TYPE_SYNTHESIS)
+    sdb.set_synthesis_name(synthesis_name)
+    if isinstance(commit_id, INTEGER_TYPES):
         commit_id = hex(commit_id)
-    sdb.d["SDB_SYNTH_COMMIT_ID"] = commit_id
-    sdb.d["SDB_SYNTH_TOOL_NAME"] = tool_name
-    if not isinstance(tool_version, str):
+    sdb.set_synthesis_commit_id(commit_id)
+    sdb.set_synthesis_tool_name(tool_name)
+    if not isinstance(tool_version, STRING_TYPES):
         tool_version = str(tool_version)
-    sdb.d["SDB_SYNTH_TOOL_VER"] = tool_version
-    sdb.d["SDB_SYNTH_USER_NAME"] = user_name
+    sdb.set_synthesis_tool_version(tool_version)
+    sdb.set_synthesis_user_name(user_name)
     return sdb
 
 def create_repo_url_record(url):
     sdb = SDBComponent()
-    sdb.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_REPO_URL
-    sdb.d["SDB_MODULE_URL"] = url
+    sdb.set_record_type(SDB_RECORD_TYPE_REPO_URL)
+    sdb.set_url(url)
     return sdb
 
+#Conversions between the native values and the strings of the legacy
+#dictionary view
+def _to_int(value, base):
+    if isinstance(value, INTEGER_TYPES):
+        return value
+    value = value.strip().rstrip("Ll")
+    if len(value) == 0:
+        return 0
+    return int(value, base)
+
+def _to_hex_int(value):
+    return _to_int(value, 16)
+
+def _to_auto_int(value):
+    return _to_int(value, 0)
+
+def _to_dec_int(value):
+    return _to_int(value, 10)
+
+def _to_version_int(value):
+    #Version fields are decimal with leading zeros ("00.000.001")
+    value = value.strip()
+    if value.lower().startswith("0x"):
+        return int(value, 16)
+    return int(value, 10)
+
+def _to_bool(value):
+    if isinstance(value, STRING_TYPES):
+        return value.strip().lower() == "true"
+    return bool(value)
+
+def _to_endian(value):
+    if isinstance(value, STRING_TYPES):
+        if value.strip().upper() == "LITTLE":
+            return SDB_ENDIAN_LITTLE
+        return SDB_ENDIAN_BIG
+    return value
+
+def _to_bus_type(value):
+    if isinstance(value, STRING_TYPES):
+        if value.strip().lower() == "wishbone":
+            return SDB_BUS_TYPE_WISHBONE
+        if value.strip().lower() == "storage":
+            return SDB_BUS_TYPE_STORAGE
+        raise SDBError("Unknown Bus Type: %s" % value)
+    return value
+
+def _to_string(value):
+    if isinstance(value, STRING_TYPES):
+        return value
+    return str(value)
+
+def _from_hex(value):
+    return "0x%x" % value
+
+def _from_address(value):
+    return "0x%X" % value
+
+def _from_endian(value):
+    if value == SDB_ENDIAN_LITTLE:
+        return "Little"
+    return "Big"
+
+def _from_bus_type(value):
+    if value == SDB_BUS_TYPE_STORAGE:
+        return "storage"
+    return "wishbone"
+
+def _from_value(value):
+    return value
+
+#Element Name: (attribute, value -> legacy string, legacy string -> value)
+_ELEMENT_FIELDS = {
+    "SDB_VENDOR_ID":            ("vendor_id",           _from_hex,      _to_hex_int),
+    "SDB_DEVICE_ID":            ("device_id",           _from_hex,      _to_hex_int),
+    "SDB_CORE_VERSION":         ("core_version",        _from_value,    _to_string),
+    "SDB_NAME":                 ("name",                _from_value,    _to_string),
+    "SDB_ABI_CLASS":            ("abi_class",           _from_hex,      _to_hex_int),
+    "SDB_ABI_VERSION_MAJOR":    ("abi_version_major",   _from_hex,      _to_hex_int),
+    "SDB_ABI_VERSION_MINOR":    ("abi_version_minor",   _from_hex,      _to_hex_int),
+    "SDB_ABI_ENDIAN":           ("abi_endian",          _from_endian,   _to_endian),
+    "SDB_ABI_DEVICE_WIDTH":     ("abi_device_width",    str,            _to_dec_int),
+    "SDB_MODULE_URL":           ("module_url",          _from_value,    _to_string),
+    "SDB_DATE":                 ("date",                _from_value,    _to_string),
+    "SDB_EXECUTABLE":           ("executable",          str,            _to_bool),
+    "SDB_READABLE":             ("readable",            str,            _to_bool),
+    "SDB_WRITEABLE":            ("writeable",           str,            _to_bool),
+    "SDB_NRECS":                ("nrecs",               _from_hex,      _to_hex_int),
+    "SDB_BUS_TYPE":             ("bus_type",            _from_bus_type, _to_bus_type),
+    "SDB_VERSION":              ("version",             str,            _to_dec_int),
+    "SDB_BRIDGE_CHILD_ADDR":    ("bridge_child_addr",   _from_hex,      _to_hex_int),
+    "SDB_SIZE":                 ("size",                _from_address,  _to_auto_int),
+    "SDB_START_ADDRESS":        ("start_address",       _from_address,  _to_hex_int),
+    "SDB_LAST_ADDRESS":         ("last_address",        _from_address,  _to_hex_int),
+    "SDB_SYNTH_NAME":           ("synth_name",          _from_value,    _to_string),
+    "SDB_SYNTH_COMMIT_ID":      ("synth_commit_id",     _from_value,    _to_string),
+    "SDB_SYNTH_TOOL_NAME":      ("synth_tool_name",     _from_value,    _to_string),
+    "SDB_SYNTH_TOOL_VER":       ("synth_tool_ver",      _from_value,    _to_string),
+    "SDB_SYNTH_USER_NAME":      ("synth_user_name",     _from_value,    _to_string),
+    "SDB_RECORD_TYPE":          ("record_type",         _from_value,    _to_dec_int)
+}
+
+#Offset of the date within the records that have one
+_DATE_OFFSETS = {SDB_RECORD_TYPE_INTERCONNECT:  0x28,
+                 SDB_RECORD_TYPE_DEVICE:        0x28,
+                 SDB_RECORD_TYPE_BRIDGE:        0x28,
+                 SDB_RECORD_TYPE_INTEGRATION:   0x28,
+                 SDB_RECORD_TYPE_SYNTHESIS:     0x2C}
+
+class SDBComponentDict(MutableMapping):
+    """
+    Dictionary view of an SDBComponent
+
+    The component stores all of the values in their native form, this view
+    presents the values as the strings that used to be stored in
+    SDBComponent.d, values written to the view are converted back to their
+    native form
+    """
+
+    def __init__(self, component):
+        self.component = component
+
+    def __getitem__(self, key):
+        if key in _ELEMENT_FIELDS:
+            attr, to_string, to_value = _ELEMENT_FIELDS[key]
+            return to_string(getattr(self.component, attr))
+        extra = self.component.extra
+        if extra is None or key not in extra:
+            raise KeyError(key)
+        return extra[key]
+
+    def __setitem__(self, key, value):
+        if key in _ELEMENT_FIELDS:
+            attr, to_string, to_value = _ELEMENT_FIELDS[key]
+            self.component._set_field(attr, to_value(value))
+            return
+        if self.component.extra is None:
+            self.component.extra = {}
+        self.component.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _ELEMENT_FIELDS:
+            raise SDBError("%s cannot be removed from an SDB Component" % key)
+        extra = self.component.extra
+        if extra is None or key not in extra:
+            raise KeyError(key)
+        del extra[key]
+
+    def __iter__(self):
+        for e in SDBComponent.ELEMENTS:
+            yield e
+        if self.component.extra is not None:
+            for key in self.component.extra:
+                yield key
+
+    def __len__(self):
+        length = len(SDBComponent.ELEMENTS)
+        if self.component.extra is not None:
+            length += len(self.component.extra)
+        return length
+
 class SDBComponent (object):
 
     SDB_VERSION = 1
@@ -209,34 +401,170 @@ class SDBComponent (object):
         "SDB_RECORD_TYPE"
     ]
 
+    __slots__ = (
+        "vendor_id",
+        "device_id",
+        "core_version",
+        "name",
+        "abi_class",
+        "abi_version_major",
+        "abi_version_minor",
+        "abi_endian",
+        "abi_device_width",
+        "module_url",
+        "date",
+        "executable",
+        "readable",
+        "writeable",
+        "nrecs",
+        "bus_type",
+        "version",
+        "bridge_child_addr",
+        "size",
+        "start_address",
+        "last_address",
+        "synth_name",
+        "synth_commit_id",
+        "synth_tool_name",
+        "synth_tool_ver",
+        "synth_user_name",
+        "record_type",
+        #Parsed versions of the core version and date strings
+        "core_version_int",
+        "date_tuple",
+        #Lazily created dictionary view and any user defined elements
+        "dict_view",
+        "extra",
+        #Entity of the SOM that holds this component, told about changes
+        "owner"
+    )
+
     def __init__(self):
-        self.d = {}
-        for e in self.ELEMENTS:
-            self.d[e] = ""
-
-        self.d["SDB_SIZE"] = hex(0)
-        self.d["SDB_START_ADDRESS"] = "0x00"
-        self.d["SDB_LAST_ADDRESS"] = "0x00"
-        self.d["SDB_NRECS"] = "0"
-        self.d["SDB_BUS_TYPE"] = "Wishbone"
-        self.d["SDB_VERSION"] = str(self.SDB_VERSION)
-        self.d["SDB_CORE_VERSION"] = "0.0.01"
-        self.d["SDB_BRIDGE_CHILD_ADDR"] = "0"
-        self.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_INTERCONNECT
-        self.d["SDB_ABI_CLASS"] = hex(0x00)
-        self.d["SDB_ABI_VERSION_MAJOR"] = hex(0x00)
-        self.d["SDB_ABI_VERSION_MINOR"] = hex(0x00)
-        self.d["SDB_VENDOR_ID"] = hex(0x8000000000000000)
-        self.d["SDB_DEVICE_ID"] = hex(0x00000000)
-        self.d["SDB_ABI_ENDIAN"] = "BIG"
-        self.d["SDB_ABI_DEVICE_WIDTH"] = "32"
-        self.d["SDB_EXECUTABLE"] = "True"
-        self.d["SDB_WRITEABLE"] = "True"
-        self.d["SDB_READABLE"] = "True"
+        self.owner = None
+        self.vendor_id = 0x8000000000000000
+        self.device_id = 0x00000000
+        self.core_version = "0.0.01"
+        self.name = ""
+        self.abi_class = 0x00
+        self.abi_version_major = 0x00
+        self.abi_version_minor = 0x00
+        self.abi_endian = SDB_ENDIAN_BIG
+        self.abi_device_width = 32
+        self.module_url = ""
+        self.executable = True
+        self.readable = True
+        self.writeable = True
+        self.nrecs = 0
+        self.bus_type = SDB_BUS_TYPE_WISHBONE
+        self.version = self.SDB_VERSION
+        self.bridge_child_addr = 0
+        self.size = 0
+        self.start_address = 0
+        self.last_address = 0
+        self.synth_name = ""
+        self.synth_commit_id = ""
+        self.synth_tool_name = ""
+        self.synth_tool_ver = ""
+        self.synth_user_name = ""
+        self.record_type = SDB_RECORD_TYPE_INTERCONNECT
+        self.core_version_int = None
+        self.date_tuple = None
+        self.dict_view = None
+        self.extra = None
         d = datetime.now()
 
         sd = "%04d/%02d/%02d" % (d.year, d.month, d.day)
-        self.d["SDB_DATE"] = sd
+        self.date = sd
+
+    def set_owner(self, owner):
+        """
+        Sets the entity that holds this component, the owner is told when a
+        field that is written to the ROM changes
+
+        A component can only be held by one entity, the same component can
+        not be in two SOMs (or twice in one SOM) as only one of them would be
+        told about its changes
+
+        Args:
+            owner (SOMComponent): an object with an invalidate_hash method or
+                None to release the component
+
+        Return:
+            Nothing
+
+        Raises:
+            SDBError: the component is already held by another entity
+        """
+        if owner is not None and self.owner is not None and self.owner is not owner:
+            raise SDBError("%s already belongs to a SOM, create another "
+                           "component to insert it again" % self.name)
+        self.owner = owner
+
+    def get_owner(self):
+        return self.owner
+
+    def _changed(self):
+        #A field that is written to the ROM changed
+        if self.owner is not None:
+            self.owner.invalidate_hash()
+
+    def update_hash(self, digest, include_date = True):
+        """
+        Feed the ROM record of this component into a hashlib digest, a
+        component parsed from a ROM matches the original and a record can be
+        hashed straight from the ROM without being parsed
+
+        Args:
+            digest (hashlib hash): digest to update
+            include_date (boolean): when False the date in the record is
+                replaced with zeros
+
+        Return:
+            Nothing
+
+        Raises:
+            SDBError: the component can not be written to a record
+        """
+        record = bytearray(SDB_ROM_RECORD_LENGTH)
+        pack_record(self, record)
+        if not include_date and self.record_type in _DATE_OFFSETS:
+            offset = _DATE_OFFSETS[self.record_type]
+            record[offset:offset + 4] = b"\x00\x00\x00\x00"
+        digest.update(record)
+
+    def get_hash(self, include_date = True):
+        """
+        Returns a hash of the ROM record of this component
+
+        Args:
+            include_date (boolean): the date is part of the hash
+
+        Return:
+            (bytes): SHA-1 digest
+
+        Raises:
+            Nothing
+        """
+        digest = hashlib.sha1()
+        self.update_hash(digest, include_date)
+        return digest.digest()
+
+    @property
+    def d(self):
+        """
+        Dictionary view of the component, the values are presented as strings
+        """
+        if self.dict_view is None:
+            self.dict_view = SDBComponentDict(self)
+        return self.dict_view
+
+    def _set_field(self, attr, value):
+        setattr(self, attr, value)
+        if attr == "core_version":
+            self.core_version_int = None
+        elif attr == "date":
+            self.date_tuple = None
+        self._changed()
 
 #Verilog Module -> SDB Device
     def parse_buffer(self, in_buffer):
@@ -267,10 +595,11 @@ class SDBComponent (object):
 
 #Utility Functions
     def set_bridge_address(self, addr):
-        self.d["SDB_BRIDGE_CHILD_ADDR"] = hex(addr)
+        self.bridge_child_addr = addr
+        self._changed()
 
     def get_bridge_address_as_int(self):
-        return int(self.d["SDB_BRIDGE_CHILD_ADDR"], 16)
+        return self.bridge_child_addr
 
     def set_start_address(self, addr):
         """
@@ -285,88 +614,172 @@ class SDBComponent (object):
         Raises:
             Nothing
         """
-        #self.d["SDB_START_ADDRESS"] = hex(addr)
-        self.d["SDB_START_ADDRESS"] = "0x%X" % (addr)
-        addr = int(addr)
-        if sys.version_info < (3,):
-            addr = long(addr)
-        self.d["SDB_LAST_ADDRESS"] = hex(addr + self.get_size_as_int())
+        self.start_address = int(addr)
+        self.last_address = self.start_address + self.size
+        self._changed()
 
     def get_start_address_as_int(self):
-        if sys.version_info < (3,):
-            return long(self.d["SDB_START_ADDRESS"], 16)
-        return int(self.d["SDB_START_ADDRESS"], 16)
+        return self.start_address
 
     def set_size(self, size):
-        self.d["SDB_SIZE"] = "0x%X" % size
-        start_addr = self.get_start_address_as_int()
-        self.d["SDB_LAST_ADDRESS"] = hex(start_addr + self.get_size_as_int())
+        self.size = int(size)
+        self.last_address = self.start_address + self.size
+        self._changed()
 
     def set_number_of_records(self, nrecs):
-        self.d["SDB_NRECS"] = str(nrecs)
+        self.nrecs = nrecs
+        self._changed()
 
     def get_number_of_records_as_int(self):
-        return int(self.d["SDB_NRECS"], 16)
+        return self.nrecs
 
     def is_writeable(self):
-        return (self.d["SDB_WRITEABLE"].lower() == "true")
+        return self.writeable
 
     def enable_read(self, enable):
-        self.d["SDB_READABLE"] = str(enable)
+        self.readable = _to_bool(enable)
+        self._changed()
 
     def is_readable(self):
-        return (self.d["SDB_READABLE"].lower() == "true")
+        return self.readable
 
     def set_name(self, name):
-        self.d["SDB_NAME"] = name
+        self.name = name
+        self._changed()
 
     def get_name(self):
-        return self.d["SDB_NAME"]
+        return self.name
+
+    def set_record_type(self, record_type):
+        self.record_type = record_type
+        self._changed()
+
+    def set_vendor_id(self, vendor_id):
+        self.vendor_id = vendor_id
+        self._changed()
+
+    def set_device_id(self, device_id):
+        self.device_id = device_id
+        self._changed()
+
+    def set_core_version(self, version):
+        self.core_version = version
+        self.core_version_int = None
+        self._changed()
+
+    def set_abi_class(self, abi_class):
+        self.abi_class = abi_class
+        self._changed()
+
+    def set_abi_version_major(self, major):
+        self.abi_version_major = major
+        self._changed()
+
+    def set_abi_version_minor(self, minor):
+        self.abi_version_minor = minor
+        self._changed()
+
+    def set_endian(self, endian):
+        """
+        Sets the endian of the device
+
+        Args:
+            endian (integer or string): SDB_ENDIAN_BIG, SDB_ENDIAN_LITTLE
+                or 'Big', 'Little'
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.abi_endian = _to_endian(endian)
+        self._changed()
+
+    def set_bus_width(self, width):
+        self.abi_device_width = width
+        self._changed()
+
+    def set_date(self, date):
+        self.date = date
+        self.date_tuple = None
+        self._changed()
+
+    def set_version(self, version):
+        self.version = version
+        self._changed()
+
+    def set_bus_type(self, bus_type):
+        """
+        Sets the type of bus
+
+        Args:
+            bus_type (integer or string): SDB_BUS_TYPE_WISHBONE,
+                SDB_BUS_TYPE_STORAGE or 'wishbone', 'storage'
+
+        Return:
+            Nothing
+
+        Raises:
+            SDBError: Unknown bus type
+        """
+        self.bus_type = _to_bus_type(bus_type)
+        self._changed()
+
+    def set_url(self, url):
+        self.module_url = url
+        self._changed()
+
+    def set_synthesis_name(self, name):
+        self.synth_name = name
+        self._changed()
+
+    def set_synthesis_commit_id(self, commit_id):
+        self.synth_commit_id = commit_id
+        self._changed()
+
+    def set_synthesis_tool_name(self, name):
+        self.synth_tool_name = name
+        self._changed()
+
+    def set_synthesis_tool_version(self, version):
+        self.synth_tool_ver = version
+        self._changed()
+
+    def set_synthesis_user_name(self, name):
+        self.synth_user_name = name
+        self._changed()
 
 #Integer Rerpresentation of values
     def get_size_as_int(self):
-        if sys.version_info < (3,):
-            return long(self.d["SDB_SIZE"], 0)
-        return int(self.d["SDB_SIZE"], 0)
+        return self.size
 
     def get_end_address_as_int(self):
-        if sys.version_info < (3,):
-            return long(self.d["SDB_LAST_ADDRESS"], 16)
-        return int(self.d["SDB_LAST_ADDRESS"], 16)
+        return self.last_address
 
     def get_vendor_id_as_int(self):
-        if sys.version_info < (3,):
-            return long(self.d["SDB_VENDOR_ID"], 16)
-        return int(self.d["SDB_VENDOR_ID"], 16)
+        return self.vendor_id
 
     def get_device_id_as_int(self):
-        #print "device id: %s" % self.d["SDB_DEVICE_ID"]
-        return int(self.d["SDB_DEVICE_ID"], 16)
+        return self.device_id
 
     def get_abi_class_as_int(self):
-        return int(self.d["SDB_ABI_CLASS"], 16)
+        return self.abi_class
 
     def get_abi_version_major_as_int(self):
-        if sys.version_info < (3,):
-            return long(self.d["SDB_ABI_VERSION_MAJOR"], 16)
-        return int(self.d["SDB_ABI_VERSION_MAJOR"], 16)
+        return self.abi_version_major
 
     def get_abi_version_minor_as_int(self):
-        if sys.version_info < (3,):
-            return long(self.d["SDB_ABI_VERSION_MINOR"], 16)
-        return int(self.d["SDB_ABI_VERSION_MINOR"], 16)
+        return self.abi_version_minor
 
     def get_endian_as_int(self):
-        if string.upper(self.d["SDB_ABI_ENDIAN"]) == "LITTLE":
-            return 1
-        else:
-            return 0
+        return self.abi_endian
 
     def get_bus_width_as_int(self):
-        return int(self.d["SDB_ABI_DEVICE_WIDTH"])
+        return self.abi_device_width
 
     def _translate_buf_width_to_rom_version(self):
-        value = int(self.d["SDB_ABI_DEVICE_WIDTH"])
+        value = self.abi_device_width
         if value == 8:
             return 0
         if value == 16:
@@ -378,118 +791,118 @@ class SDBComponent (object):
         raise SDBError("Unknown Device Width: %d" % value)
 
     def get_core_version_as_int(self):
-        version_strings = self.d["SDB_CORE_VERSION"].split(".")
-        #print "version string: %s" % self.d["SDB_CORE_VERSION"]
+        if self.core_version_int is not None:
+            return self.core_version_int
+        version_strings = self.core_version.split(".")
+        #print "version string: %s" % self.core_version
         version = 0
-        version |= (0x0F & int(version_strings[0], 0)) << 24
-        version |= (0x0F & int(version_strings[1], 0)) << 16
-        version |= (0xFF & int(version_strings[2], 0))
+        version |= (0x0F & _to_version_int(version_strings[0])) << 24
+        version |= (0x0F & _to_version_int(version_strings[1])) << 16
+        version |= (0xFF & _to_version_int(version_strings[2]))
         #print "Version output: %04d" % version
         #Base 10
+        self.core_version_int = version
         return version
 
     def get_core_version(self):
-        return self.d["SDB_CORE_VERSION"]
+        return self.core_version
 
     def get_date_as_int(self):
-        date = self.d["SDB_DATE"]
+        if self.date_tuple is not None:
+            return self.date_tuple
+        date = self.date
         #print "date: %s" % date
         year = int(date[0:4])
         month = int(date[5:7])
         day = int(date[9:10])
-        return year, month, day
+        self.date_tuple = (year, month, day)
+        return self.date_tuple
 
     def get_date(self):
         year, month, day = self.get_date_as_int()
         return "%04d/%02d/%02d" % (year, month, day)
 
     def enable_executable(self, enable):
-        self.d["SDB_EXECUTABLE"] = str(enable)
+        self.executable = _to_bool(enable)
+        self._changed()
 
     def is_executable(self):
-        return (self.d["SDB_EXECUTABLE"].lower() == "true")
+        return self.executable
 
     def enable_write(self, enable):
-        self.d["SDB_WRITEABLE"] = str(enable)
+        self.writeable = _to_bool(enable)
+        self._changed()
 
     def get_bus_type_as_int(self):
-        if self.d["SDB_BUS_TYPE"].lower() == "wishbone":
-            return 0
-        elif self.d["SDB_BUS_TYPE"].lower() == "storage":
-            return 1
-        else:
-            raise SDBError("Unknown Bus Type: %s" % self.d["SDB_BUS_TYPE"])
+        return self.bus_type
 
     def get_url(self):
-        return self.d["SDB_MODULE_URL"]
+        return self.module_url
 
     def get_synthesis_name(self):
-        return self.d["SDB_SYNTH_NAME"]
+        return self.synth_name
 
     def get_synthesis_commit_id(self):
-        return self.d["SDB_SYNTH_COMMIT_ID"]
+        return self.synth_commit_id
 
     def get_synthesis_tool_name(self):
-        return self.d["SDB_SYNTH_TOOL_NAME"]
+        return self.synth_tool_name
 
     def get_synthesis_tool_version(self):
-        return self.d["SDB_SYNTH_TOOL_VER"]
+        return self.synth_tool_ver
 
     def get_synthesis_user_name(self):
-        return self.d["SDB_SYNTH_USER_NAME"]
+        return self.synth_user_name
 
     def get_version_as_int(self):
-        return int (self.d["SDB_VERSION"])
+        return self.version
 
     def set_bridge_child_addr(self, addr):
-        self.d["SDB_BRIDGE_CHILD_ADDR"] = hex(addr)
+        self.bridge_child_addr = addr
+        self._changed()
 
     def get_bridge_child_addr_as_int(self):
-        return int(self.d["SDB_BRIDGE_CHILD_ADDR"], 16)
+        return self.bridge_child_addr
 
     def is_device(self):
-        if self.d["SDB_RECORD_TYPE"] == SDB_RECORD_TYPE_DEVICE:
-            return True
-        return False
+        return self.record_type == SDB_RECORD_TYPE_DEVICE
 
     def is_interconnect(self):
-        if self.d["SDB_RECORD_TYPE"] == SDB_RECORD_TYPE_INTERCONNECT:
-            return True
-        return False
+        return self.record_type == SDB_RECORD_TYPE_INTERCONNECT
 
     def is_bridge(self):
-        if self.d["SDB_RECORD_TYPE"] == SDB_RECORD_TYPE_BRIDGE:
-            return True
-        return False
+        return self.record_type == SDB_RECORD_TYPE_BRIDGE
 
     def is_integration_record(self):
-        if self.d["SDB_RECORD_TYPE"] == SDB_RECORD_TYPE_INTEGRATION:
-            return True
-        return False
+        return self.record_type == SDB_RECORD_TYPE_INTEGRATION
 
     def is_url_record(self):
-        if self.d["SDB_RECORD_TYPE"] == SDB_RECORD_TYPE_REPO_URL:
-            return True
-        return False
+        return self.record_type == SDB_RECORD_TYPE_REPO_URL
 
     def is_synthesis_record(self):
-        if self.d["SDB_RECORD_TYPE"] == SDB_RECORD_TYPE_SYNTHESIS:
-            return True
-        return False
+        return self.record_type == SDB_RECORD_TYPE_SYNTHESIS
+
+    def is_informative_record(self):
+        """
+        Returns true if this is an integration, synthesis or URL record, these
+        records do not take up any address space and are put at the end of a
+        bus
+        """
+        return  self.is_integration_record() or \
+                self.is_synthesis_record() or \
+                self.is_url_record()
 
     def is_empty_record(self):
-        if self.d["SDB_RECORD_TYPE"] == SDB_RECORD_TYPE_EMPTY:
-            return True
-        return False
+        return self.record_type == SDB_RECORD_TYPE_EMPTY
 
     def get_module_record_type(self):
-        return self.d["SDB_RECORD_TYPE"]
+        return self.record_type
 
     def __str__(self):
         buf = ""
         buf += "SDB Component\n"
-        buf += "\tName: %s\n" % self.d["SDB_NAME"]
-        buf += "\tType: %s\n" % self.d["SDB_RECORD_TYPE"]
+        buf += "\tName: %s\n" % self.name
+        buf += "\tType: %s\n" % self.record_type
         buf += "\tSize: 0x%08X\n" % self.get_size_as_int()
         if self.is_interconnect():
             buf += "\tNum Devices: %d\n" % self.get_number_of_records_as_int()
@@ -504,16 +917,137 @@ def is_valid_bus_type(bus_type):
         return True
     return False
 
-def convert_rom_to_32bit_buffer(rom):
-    buf = ""
-    last = False
-    for i in range(0, len(rom), 4):
-        if i + 4 >= len(rom):
-            last = True
-        buf += "%02X%02X%02X%02X" % (rom[i], rom[i + 1], rom[i + 2], rom[i + 3])
-        if not last:
-            buf += "\n"
-
-    return buf
-
+def pack_record(component, buf, addr = 0, bridge_child_addr = None):
+    """
+    Write the ROM record of a component into a buffer
+
+    Args:
+        component (SDBComponent): component to write
+        buf (bytearray): buffer to write into
+        addr (integer): offset of the record within the buffer
+        bridge_child_addr (integer): offset of the table of a sub bus within
+            the ROM, when set the (interconnect) component is written as a
+            bridge that points to the table
+
+    Return:
+        Nothing
+
+    Raises:
+        SDBError: the component can not be written to a record
+    """
+    if bridge_child_addr is not None:
+        _pack_bridge_record(component, buf, addr, bridge_child_addr)
+    elif component.is_interconnect():
+        _pack_interconnect_record(component, buf, addr)
+    elif component.is_device():
+        _pack_device_record(component, buf, addr)
+    elif component.is_integration_record():
+        _pack_integration_record(component, buf, addr)
+    elif component.is_url_record():
+        _pack_url_record(component, buf, addr)
+    elif component.is_synthesis_record():
+        _pack_synthesis_record(component, buf, addr)
+
+def _pack_bridge_record(entity, buf, addr, child_addr):
+    #The bridge points to the sub bus in 8 byte units
+    offset = child_addr // 8
+    values = (offset & MASK_64,) + \
+             _component_values(entity) + \
+             _product_values(entity) + \
+             (SDB_RECORD_TYPE_BRIDGE,)
+    SDB_BRIDGE_RECORD.pack_into(buf, addr, *values)
+
+def _pack_interconnect_record(entity, buf, addr):
+    values = (SDB_INTERCONNECT_MAGIC,
+              entity.get_number_of_records_as_int() & 0xFFFF,
+              entity.get_version_as_int() & 0xFF,
+              entity.get_bus_type_as_int() & 0xFF) + \
+             _component_values(entity) + \
+             _product_values(entity) + \
+             (entity.get_module_record_type(),)
+    SDB_INTERCONNECT_RECORD.pack_into(buf, addr, *values)
+
+def _pack_device_record(entity, buf, addr):
+    #Bus Specific Stuff
+    endian = entity.get_endian_as_int()
+    bus_width = entity._translate_buf_width_to_rom_version()
+    executable = 0
+    writeable = 0
+    readable = 0
+
+    if entity.is_executable():
+        executable = 1
+    if entity.is_writeable():
+        writeable = 1
+    if entity.is_readable():
+        readable = 1
+
+    values = (entity.get_abi_class_as_int() & 0xFFFF,
+              entity.get_abi_version_major_as_int() & 0xFF,
+              entity.get_abi_version_minor_as_int() & 0xFF,
+              0,
+              bus_width,
+              (endian << 4 | executable << 2 | writeable << 1 | readable)) + \
+             _component_values(entity) + \
+             _product_values(entity) + \
+             (entity.get_module_record_type(),)
+    SDB_DEVICE_RECORD.pack_into(buf, addr, *values)
+
+def _pack_integration_record(entity, buf, addr):
+    values = _product_values(entity) + \
+             (entity.get_module_record_type(),)
+    SDB_INTEGRATION_RECORD.pack_into(buf, addr, *values)
+
+def _pack_url_record(entity, buf, addr):
+    SDB_REPO_URL_RECORD.pack_into(buf, addr,
+                                  _encode_string(entity.get_url(), SDB_ROM_RECORD_LENGTH - 1),
+                                  entity.get_module_record_type())
+
+def _pack_synthesis_record(entity, buf, addr):
+    #The tool version is cut short by the date
+    year, month, day = entity.get_date_as_int()
+    SDB_SYNTHESIS_RECORD.pack_into(buf, addr,
+                                   _encode_string(entity.get_synthesis_name(),         16),
+                                   _encode_string(entity.get_synthesis_commit_id(),    16),
+                                   _encode_string(entity.get_synthesis_tool_name(),     8),
+                                   _encode_string(entity.get_synthesis_tool_version(),  4),
+                                   int(year   / 100),
+                                   int(year   % 100),
+                                   month,
+                                   day,
+                                   _encode_string(entity.get_name(),                   15),
+                                   entity.get_module_record_type())
+
+def _product_values(entity):
+    """
+    Returns the values of the product portion of a record:
+        vendor id, device id, version, date (4 bytes), name
+    """
+    year, month, day = entity.get_date_as_int()
+    return (entity.get_vendor_id_as_int() & MASK_64,
+            entity.get_device_id_as_int() & MASK_32,
+            entity.get_core_version_as_int() & MASK_32,
+            int(year   / 100),
+            int(year   % 100),
+            month,
+            day,
+            _encode_string(entity.get_name(), 19))
+
+def _component_values(entity):
+    """
+    Returns the values of the component portion of a record:
+        first address, last address
+    """
+    return (entity.get_start_address_as_int() & MASK_64,
+            entity.get_end_address_as_int() & MASK_64)
+
+def _encode_string(s, max_length):
+    if len(s) > max_length:
+        s = s[:max_length]
+    if not isinstance(s, bytes):
+        s = s.encode("utf-8")
+    return s
 
+def convert_rom_to_32bit_buffer(rom):
+    text = binascii.hexlify(bytearray(rom)).decode("ascii").upper()
+    return "\n".join([text[i:i + 8] for i in range(0, len(text), 8)])
@@ -15,58 +15,283 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-import sdb_component
-import device_manager
-from sdb_component import SDBComponent as sdbc
-from sdb_component import is_valid_bus_type
-
-from sdb_core import SDBInfo
-from sdb_core import SDBWarning
-from sdb_core import SDBError
+import bisect
+import collections
+import contextlib
+import binascii
+import fnmatch
+import hashlib
+import heapq
+import io
+import sys
+
+from . import sdb_component
+from . import device_manager
+from .sdb_component import SDBComponent as sdbc
+from .sdb_component import is_valid_bus_type
+
+from .sdb_core import SDBInfo
+from .sdb_core import SDBWarning
+from .sdb_core import SDBError
 
 DEPTH_SPACE = 4
+#Indent strings for each depth, extended as deeper buses are written
+_INDENTS = [""]
+
+#Address allocation policies for an auto addressed bus
+ALLOCATE_FIRST_FIT = "first_fit"
+ALLOCATE_BEST_FIT = "best_fit"
+ALLOCATION_POLICIES = [ALLOCATE_FIRST_FIT, ALLOCATE_BEST_FIT]
+
+#Traversal orders for SOM.walk
+WALK_DEPTH_FIRST = "depth"
+WALK_BREADTH_FIRST = "breadth"
+
+def _has_wildcard(pattern):
+    for c in "*?[":
+        if c in pattern:
+            return True
+    return False
+
+def _align_up(value, alignment):
+    if alignment <= 1:
+        return value
+    return ((value + alignment - 1) // alignment) * alignment
+
+def _next_power_of_two(value):
+    power = 1
+    while power < value:
+        power <<= 1
+    return power
+
+def _allocate_range(free, size, alignment, best_fit):
+    """
+    Take an aligned range out of a list of free ranges, the list is a sorted
+    list of (start, end) tuples where the end of the last range is None
+    (unbounded)
+
+    First fit takes the lowest range that fits, best fit takes the range that
+    leaves the least space behind
+
+    Returns the start address of the range
+    """
+    best = None
+    best_waste = None
+    for i in range(len(free)):
+        start, end = free[i]
+        address = _align_up(start, alignment)
+        if end is not None and address + size > end:
+            continue
+        if not best_fit:
+            best = (i, address)
+            break
+        if end is None:
+            if best is None:
+                best = (i, address)
+            continue
+        waste = (end - start) - size
+        if best_waste is None or waste < best_waste:
+            best = (i, address)
+            best_waste = waste
+
+    i, address = best
+    start, end = free[i]
+    remaining = []
+    if address > start:
+        remaining.append((start, address))
+    if end is None or address + size < end:
+        remaining.append((address + size, end))
+    free[i:i + 1] = remaining
+    return address
+
+def _reserve_range(free, start, end):
+    """
+    Remove the range start to end from a list of free ranges
+    """
+    remaining = []
+    for free_start, free_end in free:
+        if (free_end is not None and free_end <= start) or free_start >= end:
+            remaining.append((free_start, free_end))
+            continue
+        if free_start < start:
+            remaining.append((free_start, start))
+        if free_end is None or free_end > end:
+            remaining.append((end, free_end))
+    free[:] = remaining
 
 class SOMComponent(object):
 
     def __init__(self, parent, c):
         self.parent = parent
+        self.hash = None
+        self._c = None
         self.c = c
+        self.alignment = 0
+        self.fixed_address = None
+
+    @property
+    def c(self):
+        return self._c
+
+    @c.setter
+    def c(self, c):
+        self._set_component(c)
+
+    def _set_component(self, c):
+        if c is not None:
+            #Raises before anything changes if another entity holds it
+            c.set_owner(self)
+        if self._c is not None and self._c is not c and self._c.get_owner() is self:
+            self._c.set_owner(None)
+        self._c = c
+        self.invalidate_hash()
 
     def get_component(self):
         return self.c
 
+    def get_hash(self):
+        """
+        Returns a hash of everything this entity writes to the ROM, for a bus
+        this includes all the entities underneath it
+
+        The hash is kept until the entity, or something underneath it,
+        changes so two SOMs (or parts of them) can be compared without going
+        through all of their records
+
+        Args:
+            Nothing
+
+        Returns (bytes):
+            SHA-1 digest
+
+        Raises:
+            Nothing
+        """
+        if self.hash is None:
+            digest = hashlib.sha1(b"R")
+            self.c.update_hash(digest)
+            self.hash = digest.digest()
+        return self.hash
+
+    def invalidate_hash(self):
+        """
+        Forget the hash of this entity and of all the buses above it
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        entity = self
+        #A bus above an entity without a hash does not have one either
+        while entity is not None and entity.hash is not None:
+            entity.hash = None
+            entity = entity.parent
+
     def get_parent(self):
         return self.parent
 
     def get_name(self):
         return self.c.get_name()
 
+    def get_record_type(self):
+        return self.c.get_module_record_type()
+
     def set_name(self, name):
         self.c.set_name(name)
+        som = self.get_som()
+        if som is not None:
+            som._reindex_paths(self)
+
+    def set_alignment(self, alignment = 0):
+        """
+        Set the alignment of the start address of this entity when the bus
+        it is on is auto addressed, zero means no alignment
+
+        Args:
+            alignment (integer): alignment, a power of two
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.alignment = alignment
+
+    def get_alignment(self):
+        return self.alignment
+
+    def set_fixed_address(self, address = None):
+        """
+        Pin the start address (relative to the bus) of this entity, the
+        allocator places all the other entities around it
+
+        Args:
+            address (integer): start address, None to let the allocator
+                place the entity
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.fixed_address = address
+
+    def get_fixed_address(self):
+        return self.fixed_address
+
+    def get_som(self):
+        """
+        Returns the SOM this entity belongs to
+
+        Args:
+            Nothing
+
+        Returns (SOM):
+            The SOM, None if the entity is not attached to one
+
+        Raises:
+            Nothing
+        """
+        entity = self
+        while entity.parent is not None:
+            entity = entity.parent
+        if isinstance(entity, SOMRoot):
+            return entity.som
+        return None
 
 class SOMBus(SOMComponent):
 
     def __init__(self, parent):
         self.spacing = 0
+        self.allocation_policy = ALLOCATE_FIRST_FIT
+        self.natural_alignment = False
+        self.fixed_size = None
         self.children = []
+        self.dirty = False
+        #Interconnect and empty record
+        self.record_count = 2
         super(SOMBus, self).__init__(parent, sdbc())
         self.c = sdb_component.create_interconnect_record( name = "bus",
                                                   vendor_id = 0x800000000000C594,
                                                   device_id = 0x00000001,
                                                   start_address = 0x00,
                                                   size = 0x00)
-        self.curr_pos = 0
 
     def insert_child(self, child, pos = -1):
+        child.parent = self
         if pos == -1:
             self.children.append(child)
         else:
             self.children.insert(pos, child)
-        size = 0
-        for child in self.children:
-            size += child.c.get_size_as_int()
-
-        #self.c.set_size(size)
+        self._adjust_record_count(SOMBus._get_entity_record_count(child))
+        self.invalidate_hash()
 
     def get_child_from_index(self, i):
         return self.children[i]
@@ -77,15 +302,132 @@ class SOMBus(SOMComponent):
 
     def remove_child(self, child):
         self.children.remove(child)
-        size = 0
-        for child in self.children:
-            size += child.c.get_size_as_int()
-
-        #self.c.set_size(size)
+        child.parent = None
+        self._adjust_record_count(-SOMBus._get_entity_record_count(child))
+        self.invalidate_hash()
 
     def get_child_count(self):
         return len(self.children)
 
+    def get_record_count(self):
+        """
+        Returns the number of 64 byte records this bus and all the buses
+        underneath it will take up within the ROM
+
+        Every bus has an interconnect record, one record per child and an
+        empty record at the end, every sub bus adds its own records
+
+        Args:
+            Nothing
+
+        Returns (integer):
+            number of records
+
+        Raises:
+            Nothing
+        """
+        return self.record_count
+
+    @staticmethod
+    def _get_entity_record_count(entity):
+        #A sub bus is a bridge record within this bus and its own table
+        if isinstance(entity, SOMBus):
+            return 1 + entity.record_count
+        return 1
+
+    def get_hash(self):
+        if self.hash is not None:
+            return self.hash
+
+        #Hash the sub buses from the bottom up without recursion
+        stack = [(self, False)]
+        while len(stack) > 0:
+            bus, ready = stack.pop()
+            if ready:
+                digest = hashlib.sha1(b"B")
+                bus.c.update_hash(digest)
+                for child in bus.children:
+                    digest.update(child.get_hash())
+                bus.hash = digest.digest()
+                continue
+
+            stack.append((bus, True))
+            for child in bus.children:
+                if child.hash is None and isinstance(child, SOMBus):
+                    stack.append((child, False))
+        return self.hash
+
+    def _adjust_record_count(self, delta):
+        bus = self
+        while bus is not None:
+            bus.record_count += delta
+            bus = bus.parent
+
+    def move_informative_to_end(self):
+        """
+        Move all the informative records (integration, synthesis and URL) to
+        the end of the bus, this is a stable partition so the order of the
+        devices, and the order of the informative records, does not change
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        entities = []
+        informative = []
+        for child in self.children:
+            if child.c.is_informative_record():
+                informative.append(child)
+            else:
+                entities.append(child)
+
+        if len(informative) > 0:
+            children = entities + informative
+            if children != self.children:
+                self.children[:] = children
+                self.invalidate_hash()
+
+    def get_depth(self):
+        """
+        Returns the number of buses above this bus, the root is at depth 0
+
+        Args:
+            Nothing
+
+        Returns (integer):
+            depth of the bus within the tree
+
+        Raises:
+            Nothing
+        """
+        depth = 0
+        parent = self.parent
+        while parent is not None:
+            depth += 1
+            parent = parent.parent
+        return depth
+
+    def is_dirty(self):
+        """
+        Returns true if the bus needs to be laid out again
+
+        Args:
+            Nothing
+
+        Returns (Boolean):
+            True: The layout of the children is out of date
+            False: The layout is up to date
+
+        Raises:
+            Nothing
+        """
+        return self.dirty
+
     def is_root(self):
         return False
 
@@ -103,6 +445,9 @@ class SOMBus(SOMComponent):
         child 1 @ 0x01000000
         child 2 & 0x02000000
 
+        A child larger than the spacing takes up as many boundaries as it
+        needs, the spacing is the minimum alignment of every child
+
         Args:
             spacing (integer): start spacing of a child in the bus
 
@@ -116,6 +461,73 @@ class SOMBus(SOMComponent):
         #pdb.set_trace()
         self.spacing = spacing
 
+    def set_allocation_policy(self, policy = ALLOCATE_FIRST_FIT):
+        """
+        Sets how the children of an auto addressed bus are placed
+
+        ALLOCATE_FIRST_FIT: every child, in order, goes into the lowest
+            space that fits it, without any constraints the children are
+            put right after each other
+        ALLOCATE_BEST_FIT: the children with the largest alignment and size
+            are placed first, each one goes into the space that leaves the
+            least behind
+
+        Args:
+            policy (String): ALLOCATE_FIRST_FIT or ALLOCATE_BEST_FIT
+
+        Return:
+            Nothing
+
+        Raises:
+            SDBError: Unknown policy
+        """
+        if policy not in ALLOCATION_POLICIES:
+            raise SDBError("%s is not a valid allocation policy" % policy)
+        self.allocation_policy = policy
+
+    def get_allocation_policy(self):
+        return self.allocation_policy
+
+    def enable_natural_alignment(self, enable):
+        """
+        Align every child of an auto addressed bus on its own size rounded up
+        to a power of two, this keeps the address decoding of every child
+        simple
+
+        Args:
+            enable (boolean): enable natural alignment
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.natural_alignment = enable
+
+    def is_natural_alignment(self):
+        return self.natural_alignment
+
+    def set_fixed_size(self, size = None):
+        """
+        Keep the size of a manually addressed bus instead of sizing it to fit
+        its children, children that do not fit are reported by validate
+
+        Args:
+            size (integer): size of the bus, None to size the bus to fit its
+                children
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.fixed_size = size
+
+    def get_fixed_size(self):
+        return self.fixed_size
+
     def get_child_spacing(self):
         """
         Returns the minimum spacing between children start address
@@ -135,21 +547,14 @@ class SOMBus(SOMComponent):
         return len(self.children)
 
     def __iter__(self):
-        self.curr_pos = 0
-        return self
-
-    def next(self):
-        if self.curr_pos == len(self.children):
-            raise StopIteration
-        pos = self.curr_pos
-        self.curr_pos += 1
-        return self.children[pos]
+        return iter(self.children)
 
 class SOMRoot(SOMBus):
 
     def __init__(self):
+        self.som = None
         super(SOMRoot, self).__init__(None)
-        self.c.d["SDB_NAME"] = "Root"
+        self.c.set_name("Root")
 
     def is_root(self):
         return True
@@ -164,6 +569,9 @@ class SOM(object):
         self.current_rot = self.root
         self.current_pos = 0
         self.auto_address = auto_address
+        self.batch_depth = 0
+        self.batch_pending = False
+        self.dirty_buses = []
 
     #Bus Functions
     def initialize_root(self,
@@ -174,16 +582,17 @@ class SOM(object):
                                 bus_type = "wishbone"):
 
         c = self.root.get_component()
-        c.d["SDB_NAME"] = name
+        c.set_name(name)
         if version > sdbc.SDB_VERSION:
             raise SDBError("Version %d is greater than known version! (%d)" %
                             (version,
                             sdbc.SDB_VERSION))
-        c.d["SDB_VERSION"] = version
+        c.set_version(version)
 
         if not is_valid_bus_type(bus_type):
             raise SDBError("%s is not a valid bus type" % bus_type)
-        c.d["SDB_BUS_TYPE"] = "wishbone"
+        c.set_bus_type("wishbone")
+        self._reindex_paths(self.root)
 
     def get_root(self):
         """
@@ -288,12 +697,17 @@ class SOM(object):
         c = bus.get_component()
 
         if name is not None:
-            c.d["SDB_NAME"] = name
+            c.set_name(name)
 
         #if start_address is not None:
         #    self.c.set_start_address(start_address)
 
         root.insert_child(bus, pos)
+        self._index_entities(bus)
+        #A pre-existing bus may bring a sub tree that was never laid out
+        for sub_bus in self._get_sub_buses(bus):
+            self._mark_dirty(sub_bus)
+        self._mark_dirty(root)
         self._update()
         return bus
 
@@ -319,8 +733,12 @@ class SOM(object):
         except ValueError as ex:
             raise SDBError("Attempted to remove a non-existent bus from a "\
                             "parent bus: Parent Bus: %s, Child Bus: %s" %
-                            parent.c.d["SDB_NAME"],
-                            bus.c.d["SDB_NAME"])
+                            parent.c.get_name(),
+                            bus.c.get_name())
+        self._unindex_entities(bus)
+        self._mark_dirty(parent)
+        self._update()
+        return bus
 
     def set_bus_name(self, bus, name):
         """
@@ -344,6 +762,7 @@ class SOM(object):
 
         c = bus.get_component()
         c.set_name(name)
+        self._reindex_paths(bus)
 
     def get_bus_name(self, bus):
         """
@@ -383,6 +802,9 @@ class SOM(object):
         insert a new component into a bus, if root is left empty then
         insert this component into the root
 
+        A component can only be in one place of one SOM, create another
+        component to insert the same device again
+
         Args:
             root(SOMBus): The bus where this component should
                 be located
@@ -397,7 +819,7 @@ class SOM(object):
             the tree
 
         Raises:
-            Nothing
+            SDBError: the component is a bus or is already in a SOM
         """
         if root is None:
             #print "root is None, Using base root!"
@@ -414,7 +836,10 @@ class SOM(object):
 
         leaf = SOMComponent(root, component)
         root.insert_child(leaf, pos)
+        self._index_entities(leaf)
+        self._mark_dirty(root)
         self._update()
+        return leaf
 
     def get_component(self, root = None, index = None):
         """
@@ -441,14 +866,15 @@ class SOM(object):
 
     def remove_component_by_index(self, root = None, index = -1):
         """
-        Removes a component given it's root and index
+        Removes a component given it's root and index, the component can be
+        inserted again afterwards
 
         Args:
             root (SOMBus): bus for the entity, leave blan for root
             index (integer): index of item on bus
 
         Returns:
-            Nothing
+            (SOMComponent): the removed entity
 
         Raises:
             ValueError: Component not found
@@ -457,12 +883,17 @@ class SOM(object):
             root = self.root
 
         child = root.get_child_from_index(index)
-        return self._remove_component(child)
+        self._remove_component(child)
+        child.get_component().set_owner(None)
+        return child
 
     def move_component(self, from_root, from_index, to_root, to_index):
         """
         Move a component to another location in the SDB
 
+        The SOMComponent itself is moved so its alignment and fixed address
+        go with it
+
         Args:
             from_root (SOMBus): bus where the component is located
             from_index (integer): index of where to get the item
@@ -474,10 +905,22 @@ class SOM(object):
 
         Raises:
             Value Error: Component not found
+            SDBError: The item is a bus
         """
-        som_component = self.remove_component_by_index(from_root, from_index)
-        component = som_component.get_component()
-        self.insert_component(to_root, component, to_index)
+        if from_root is None:
+            from_root = self.root
+        if to_root is None:
+            to_root = self.root
+
+        som_component = from_root.get_child_from_index(from_index)
+        if isinstance(som_component, SOMBus):
+            raise SDBError("Only component can be moved, not %s" % som_component.get_name())
+
+        with self.batch():
+            self._remove_component(som_component)
+            to_root.insert_child(som_component, to_index)
+            self._index_entities(som_component)
+            self._mark_dirty(to_root)
 
     #Component Private Functions
     def _remove_component(self, som_component):
@@ -495,12 +938,22 @@ class SOM(object):
         """
         parent = som_component.get_parent()
         parent.remove_child(som_component)
+        self._unindex_entities(som_component)
+        self._mark_dirty(parent)
         self._update()
         return som_component
 
     #Utility Functions
     def reset_som(self):
         self.root = SOMRoot()
+        self.root.som = self
+        self.dirty_buses = []
+        self.address_index = None
+        self.path_index = None
+        self.entity_paths = None
+        self.vendor_product_index = None
+        self.abi_index = None
+        self.entity_device_keys = None
 
     def get_child_count(self, root = None):
         """
@@ -520,178 +973,930 @@ class SOM(object):
 
         return root.get_child_count()
 
-    def set_bus_component(self, bus, component):
+    def walk(self, root = None, order = WALK_DEPTH_FIRST):
         """
-        Replace the internal SDB Component for a BUS
+        Generator that visits a bus and everything underneath it
 
-        This is usefull when parsing a ROM
+        The tree is traversed with an explicit stack (or queue) so it works
+        with any depth of buses, the SOM should not be changed while it is
+        being walked
 
         Args:
-            bus (SOMBus): Bus in which to replace the component
-            component (SDBComponent): Replacement Component
-
-        Returns:
-            Noting
+            root (SOMBus): bus to start from, leave blank for the top of the
+                tree
+            order (String): WALK_DEPTH_FIRST ("depth") visits every bus
+                before its children (pre-order), WALK_BREADTH_FIRST
+                ("breadth") visits the tree one level at a time
+
+        Yields (tuple):
+            (path, depth, entity)
+            path (String): dotted path of the entity starting at 'root'
+            depth (integer): depth of the entity below 'root', 'root' is 0
+            entity (SOMComponent or SOMBus): the entity
 
         Raises:
-            Nothing
+            SDBError: Unknown order
         """
-        bus.c = component
-        self._update()
+        if root is None:
+            root = self.root
+        return self._walk(root, order, True)
 
-    def set_child_spacing(self, bus, spacing):
+    def _walk(self, root, order, paths):
         """
-        Set the spacing for the given bus
-
-        This is used to logically sperate devices on a bus
-
-        Args:
-            bus (SOMBus): Bus in which to change spacing
-            spacing (Long): Difference between to devices
+        Generator behind walk, when 'paths' is False the path is always None
+        so the names of the entities are not read
         """
-        bus.set_child_spacing(spacing)
-        self._update()
+        if order == WALK_DEPTH_FIRST:
+            pending = collections.deque()
+            take = pending.pop
+        elif order == WALK_BREADTH_FIRST:
+            pending = collections.deque()
+            take = pending.popleft
+        else:
+            raise SDBError("%s is not a valid walk order" % order)
+
+        pending.append((root.get_name() if paths else None, 0, root))
+        while len(pending) > 0:
+            path, depth, entity = take()
+            yield (path, depth, entity)
+            if isinstance(entity, SOMBus):
+                children = entity.children
+                if order == WALK_DEPTH_FIRST:
+                    children = reversed(children)
+                for child in children:
+                    if paths:
+                        pending.append((path + "." + child.get_name(), depth + 1, child))
+                    else:
+                        pending.append((None, depth + 1, child))
 
-    #Private Functions
-    def _update(self, root = None):
+    def find_by_address(self, address):
         """
-        Go through the entire tree updating all buses with the appropriate sizes
-        from all the elements
+        Find the device that decodes an absolute bus address
+
+        The address ranges of all the devices are kept in a sorted index that
+        is built on the first lookup after the layout of the SOM changes
+
+        The ranges of a manually addressed SOM can overlap (see validate), if
+        more than one device contains the address the one that starts last
+        is returned
 
         Args:
-            Nothing
+            address (integer): absolute address on the top bus
 
-        Return:
-            Nothing
+        Return (SOMComponent):
+            The device that contains the address, None if no device does
 
         Raises:
             Nothing
         """
-        if root is None:
-            root = self.root
-        else:
-            #print "Updating root that is not base!"
-            #print ""
-            #print ""
-            pass
+        if self.address_index is None:
+            self.address_index = self._build_address_index()
+        starts, ends, max_ends, entities = self.address_index
+        i = bisect.bisect_right(starts, address) - 1
+        #A device that starts earlier can still contain the address if it is
+        #longer than the devices after it
+        while i >= 0 and address < max_ends[i]:
+            if address < ends[i]:
+                return entities[i]
+            i -= 1
+        return None
+
+    def get_path(self, entity):
+        """
+        Returns the dotted path of an entity, the names of all the buses
+        above it and its own name, as an example: 'top.peripheral.uart1'
 
+        Args:
+            entity (SOMComponent or SOMBus): entity within the SOM
 
-        bus_size = 0
-        rc = root.get_component()
-        start_address = rc.get_start_address_as_int()
-        #print ("Root: %s: Start: 0x%08X" % (root.c.get_name(), start_address))
-        spacing = root.get_child_spacing()
+        Return (String):
+            path of the entity
 
-        '''
-        #Bubble sort everything
-        for i in range(root.get_child_count()):
-            prev_child = None
-            for j in range(root.get_child_count()):
-                child = root.get_child_from_index(j)
-                if prev_child is None:
-                    prev_child = child
-                    continue
-                if child.c.get_start_address_as_int() < prev_child.c.get_start_address_as_int():
-                    #print "Reordering children"
-                    root.remove_child_at_index(j)
-                    root.insert_child(child, j - 1)
+        Raises:
+            SDBError: entity is not in the SOM
+        """
+        if self.path_index is None:
+            self._build_path_index()
+        if entity not in self.entity_paths:
+            raise SDBError("%s is not in the SOM" % entity.get_name())
+        return self.entity_paths[entity]
 
-                prev_child = child
+    def find_by_path(self, path):
+        """
+        Find an entity by its dotted path, as an example:
+        'top.peripheral.uart1'
 
-        print "Sorted Children:"
-        for i in range(root.get_child_count()):
-            child = root.get_child_from_index(i)
-            print "\tchild %s: 0x%02X" % (child.c.d["SDB_NAME"], child.c.get_start_address_as_int())
-        '''
+        The paths of all the entities are kept in an index that is updated
+        as entities are inserted, removed and renamed
 
-        #Move all informative elements to the end of the bus
-        #Bubble sort all non informative elements to the front of informative
-        #   elements
-        for i in range(root.get_child_count()):
-            prev_child = None
-            for j in range(root.get_child_count() - 1, -1, -1):
-                child = root.get_child_from_index(j)
-                if prev_child is None:
-                    prev_child = child
-                #print "Comparing..."
-                #print "child is an integration record: %s" % str(child.c.is_integration_record())
-                if  child.c.is_integration_record() or child.c.is_synthesis_record() or child.c.is_url_record():
-                    root.remove_child_at_index(j)
-                    root.insert_child(child, j + 1)
+        Args:
+            path (String): dotted path of the entity
 
-                prev_child = child
+        Return (SOMComponent or SOMBus):
+            The entity, if more than one entity has the same path the first
+            one is returned, None if no entity is found
 
-        #Adjust all the sizes for the busses
-        prev_child = None
-        for i in range(root.get_child_count()):
-            child = root.get_child_from_index(i)
-            c = child.get_component()
-            #print ("Child Name: %s" % c.get_name())
-            if prev_child is None:
-                #print ("First Item")
-                #print ("Address: %08X" % c.get_start_address_as_int())
-                #First child should always be 0 relative to this bus
-
-                if self.auto_address:
-                    c.set_start_address(0x00)
-                prev_child = child
-                if isinstance(child, SOMBus):
-                    #print "Found bus, initate recursive update"
-                    self._update(child)
-
-                #Bus Size
-                #bus_size = c.get_start_address_as_int() + c.get_size_as_int()
-                #print "bus size: 0x%08X" % bus_size
-                if self.auto_address:
-                    if spacing == 0:
-                        bus_size += c.get_size_as_int()
-                    else:
-                        mul = (c.get_size_as_int() / spacing) + 1
-                        bus_size += mul * spacing
+        Raises:
+            Nothing
+        """
+        if self.path_index is None:
+            self._build_path_index()
+        entities = self.path_index.get(path)
+        if entities is None:
+            return None
+        return entities[0]
+
+    def find_bus_by_path(self, path):
+        """
+        Find a bus by its dotted path, as an example: 'top.peripheral'
 
-                else:
-                    bus_size = c.get_start_address_as_int() + c.get_size_as_int()
+        Only the names of the buses are compared on the way down from the
+        root, the path index is not built so the records of a lazily parsed
+        ROM are not decoded
 
-                continue
+        Args:
+            path (String): dotted path of the bus
 
-            pc = prev_child.get_component()
-            spacing_size = 0
-            if isinstance(child, SOMBus):
-                #print "Found bus, initate recursive update"
-                self._update(child)
+        Return (SOMBus):
+            The bus, if more than one bus has the same path the first one is
+            returned, None if no bus is found
+
+        Raises:
+            Nothing
+        """
+        parts = path.split(".")
+        if parts[0] != self.root.get_name():
+            return None
+
+        bus = self.root
+        for part in parts[1:]:
+            for child in bus.children:
+                if isinstance(child, SOMBus) and child.get_name() == part:
+                    bus = child
+                    break
+            else:
+                return None
+        return bus
+
+    def find_by_glob(self, pattern):
+        """
+        Find all the entities with a dotted path that matches a glob pattern,
+        every part of the path is matched separately so a wildcard does not
+        match across a '.', as an example: 'top.*.uart*'
+
+        The part of the pattern without wildcards is looked up in the path
+        index, only the buses underneath it that match the pattern are
+        searched
+
+        Args:
+            pattern (String): dotted path with shell style wildcards
+
+        Return (list of SOMComponent or SOMBus):
+            All the matching entities
+
+        Raises:
+            Nothing
+        """
+        if self.path_index is None:
+            self._build_path_index()
+        parts = pattern.split(".")
+        prefix_length = 0
+        while prefix_length < len(parts) and not _has_wildcard(parts[prefix_length]):
+            prefix_length += 1
+
+        if prefix_length > 0:
+            entities = list(self.path_index.get(".".join(parts[:prefix_length]), []))
+        else:
+            entities = [self.root] if fnmatch.fnmatchcase(self.root.get_name(), parts[0]) else []
+            prefix_length = 1
+
+        for part in parts[prefix_length:]:
+            matches = []
+            for entity in entities:
+                if not isinstance(entity, SOMBus):
+                    continue
+                for child in entity.children:
+                    if fnmatch.fnmatchcase(child.get_name(), part):
+                        matches.append(child)
+            entities = matches
+        return entities
+
+    def find_by_vendor_product(self, vendor_id, device_id):
+        """
+        Find all the devices with a vendor and product (device) ID
+
+        The devices are kept in an index that is updated as entities are
+        inserted and removed
+
+        Args:
+            vendor_id (integer): vendor ID
+            device_id (integer): product ID
+
+        Return (list of SOMComponent):
+            All the matching devices
+
+        Raises:
+            Nothing
+        """
+        if self.vendor_product_index is None:
+            self._build_device_index()
+        return list(self.vendor_product_index.get((vendor_id, device_id), []))
+
+    def find_by_abi(self, major, minor = None, abi_class = None):
+        """
+        Find all the devices with an ABI major version, this is the device
+        type in the device manager (GPIO, UART, ...), the devices can be
+        narrowed down further by ABI minor version and ABI class
+
+        The devices are kept in an index by ABI class and major version
+
+        Args:
+            major (integer): ABI major version
+            minor (integer): ABI minor version, leave blank for any
+            abi_class (integer): ABI class, leave blank for any, the devices
+                of every class are returned in order of the class
+
+        Return (list of SOMComponent):
+            All the matching devices
+
+        Raises:
+            Nothing
+        """
+        if self.abi_index is None:
+            self._build_device_index()
+        if abi_class is not None:
+            keys = [(abi_class, major)]
+        else:
+            keys = sorted([key for key in self.abi_index if key[1] == major])
+
+        devices = []
+        for key in keys:
+            for entity in self.abi_index.get(key, []):
+                c = entity.get_component()
+                if minor is not None and c.get_abi_version_minor_as_int() != minor:
+                    continue
+                devices.append(entity)
+        return devices
+
+    def validate(self, root = None):
+        """
+        Check that the children of every bus do not overlap and fit within
+        the bus
+
+        The children of each bus are sorted by start address and swept once,
+        the children that have not ended yet are kept in a heap ordered by
+        end address so every overlapping pair is found in O(n log n + k)
+        where k is the number of overlaps
+
+        Args:
+            root (SOMBus): bus to check along with all the buses underneath
+                it, leave blank for the entire SOM
+
+        Return (list of Strings):
+            A description of every problem found, empty if there are none
+
+        Raises:
+            Nothing
+        """
+        if root is None:
+            root = self.root
+
+        errors = []
+        for bus in self._get_sub_buses(root):
+            path = self.get_path(bus)
+            bus_size = bus.get_component().get_size_as_int()
+            ranges = []
+            for child in bus.children:
+                c = child.get_component()
+                if c.get_size_as_int() == 0:
+                    continue
+                start = c.get_start_address_as_int()
+                ranges.append((start, start + c.get_size_as_int(), child.get_name()))
+            ranges.sort()
+
+            #(end, start, name) of the children that can still overlap
+            active = []
+            for start, end, name in ranges:
+                if end > bus_size:
+                    errors.append("%s: %s (0x%X - 0x%X) is outside of the bus (size: 0x%X)" %
+                                  (path, name, start, end, bus_size))
+                while len(active) > 0 and active[0][0] <= start:
+                    heapq.heappop(active)
+                for other_end, other_start, other_name in active:
+                    errors.append("%s: %s (0x%X - 0x%X) overlaps %s (0x%X - 0x%X)" %
+                                  (path, name, start, end,
+                                   other_name, other_start, other_end))
+                heapq.heappush(active, (end, start, name))
+        return errors
+
+    def get_hash(self, entity = None):
+        """
+        Returns the hash of everything an entity writes to the ROM, for a bus
+        this includes everything underneath it
+
+        The hashes are kept by the entities and only calculated again for
+        the buses above an entity that changed
+
+        Args:
+            entity (SOMComponent or SOMBus): leave blank for the entire SOM
+
+        Return (String):
+            hex digest
+
+        Raises:
+            Nothing
+        """
+        if entity is None:
+            entity = self.root
+        return binascii.hexlify(entity.get_hash()).decode("ascii")
+
+    def is_equal(self, other):
+        """
+        Returns True if another SOM generates the same ROM
+
+        Args:
+            other (SOM): SOM to compare against
+
+        Return (Boolean):
+            True: both SOMs have the same hierarchy and records
+            False: the SOMs are different
+
+        Raises:
+            Nothing
+        """
+        return self.root.get_hash() == other.get_root().get_hash()
+
+    def diff(self, other, root = None, other_root = None):
+        """
+        Find the entities that are different in another SOM
+
+        Only the buses with different hashes are searched, the children of
+        two buses in the same position with the same hash are the same, the
+        rest are matched by name (in order when names repeat) so the records
+        of a lazily parsed ROM are only decoded where something changed
+
+        Args:
+            other (SOM): SOM to compare against
+            root (SOMBus): bus to compare, leave blank for the entire SOM
+            other_root (SOMBus): bus of the other SOM to compare against,
+                leave blank for the entire SOM
+
+        Return (list of tuples):
+            (path, entity, other entity) for every difference in depth first
+            order, the entity is None when it is only in the other SOM and
+            the other entity is None when it is not in the other SOM, a bus
+            is only listed when its own record is different
+
+        Raises:
+            Nothing
+        """
+        if root is None:
+            root = self.root
+        if other_root is None:
+            other_root = other.get_root()
+
+        changes = []
+        pending = [(root.get_name(), root, other_root)]
+        while len(pending) > 0:
+            path, entity, other_entity = pending.pop()
+            if entity is None or other_entity is None:
+                #Added or removed, the sub buses are not searched
+                changes.append((path, entity, other_entity))
+                continue
+            if entity.get_hash() == other_entity.get_hash():
+                continue
+            if not (isinstance(entity, SOMBus) and isinstance(other_entity, SOMBus)):
+                changes.append((path, entity, other_entity))
+                continue
+            if entity.get_component().get_hash() != other_entity.get_component().get_hash():
+                changes.append((path, entity, other_entity))
+
+            children = []
+            other_children = []
+            for i in range(max(len(entity.children), len(other_entity.children))):
+                child = None
+                other_child = None
+                if i < len(entity.children):
+                    child = entity.children[i]
+                if i < len(other_entity.children):
+                    other_child = other_entity.children[i]
+                if child is not None and other_child is not None and \
+                        child.get_hash() == other_child.get_hash():
+                    continue
+                if child is not None:
+                    children.append(child)
+                if other_child is not None:
+                    other_children.append(other_child)
+
+            unmatched = collections.OrderedDict()
+            for child in other_children:
+                unmatched.setdefault(child.get_name(), collections.deque()).append(child)
+
+            pairs = []
+            for child in children:
+                child_path = path + "." + child.get_name()
+                candidates = unmatched.get(child.get_name())
+                if candidates:
+                    pairs.append((child_path, child, candidates.popleft()))
+                else:
+                    pairs.append((child_path, child, None))
+            for name in unmatched:
+                for child in unmatched[name]:
+                    pairs.append((path + "." + name, None, child))
+
+            pending.extend(reversed(pairs))
+        return changes
+
+    def set_bus_component(self, bus, component):
+        """
+        Replace the internal SDB Component for a BUS
+
+        This is usefull when parsing a ROM
+
+        Args:
+            bus (SOMBus): Bus in which to replace the component
+            component (SDBComponent): Replacement Component
+
+        Returns:
+            Noting
+
+        Raises:
+            Nothing
+        """
+        bus.c = component
+        self._reindex_paths(bus)
+        #The parent needs to know about the new address and size of the bus
+        self._mark_dirty(bus)
+        if bus.get_parent() is not None:
+            self._mark_dirty(bus.get_parent())
+        self._update()
+
+    def set_child_spacing(self, bus, spacing):
+        """
+        Set the spacing for the given bus
+
+        This is used to logically sperate devices on a bus
+
+        Args:
+            bus (SOMBus): Bus in which to change spacing
+            spacing (Long): Difference between to devices
+        """
+        bus.set_child_spacing(spacing)
+        self._mark_dirty(bus)
+        self._update()
+
+    def set_allocation_policy(self, bus, policy, natural_alignment = False):
+        """
+        Set how the children of an auto addressed bus are placed
+
+        Args:
+            bus (SOMBus): Bus to change
+            policy (String): ALLOCATE_FIRST_FIT or ALLOCATE_BEST_FIT
+            natural_alignment (boolean): align every child on its own size
+                rounded up to a power of two
+
+        Return:
+            Nothing
+
+        Raises:
+            SDBError: Unknown policy
+        """
+        bus.set_allocation_policy(policy)
+        bus.enable_natural_alignment(natural_alignment)
+        self._mark_dirty(bus)
+        self._update()
+
+    def set_alignment(self, entity, alignment):
+        """
+        Set the alignment of the start address of an entity on an auto
+        addressed bus
+
+        Args:
+            entity (SOMComponent or SOMBus): entity to align
+            alignment (integer): alignment, a power of two, zero for none
 
-            prev_start_address = pc.get_start_address_as_int()
-            prev_child_size = pc.get_size_as_int()
+        Return:
+            Nothing
 
-            #Add an extra spacing size so that all divided values will at least
-            #be one
-            spacing_size = prev_child_size
-            if spacing > 0:
-                mul = (prev_child_size / spacing) + 1
-                spacing_size = mul * spacing
+        Raises:
+            Nothing
+        """
+        entity.set_alignment(alignment)
+        if entity.get_parent() is not None:
+            self._mark_dirty(entity.get_parent())
+        self._update()
+
+    def set_fixed_address(self, entity, address):
+        """
+        Pin the start address of an entity on an auto addressed bus
+
+        Args:
+            entity (SOMComponent or SOMBus): entity to pin
+            address (integer): start address relative to the bus, None to
+                let the allocator place the entity
 
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        entity.set_fixed_address(address)
+        if entity.get_parent() is not None:
+            self._mark_dirty(entity.get_parent())
+        self._update()
+
+    def set_fixed_size(self, bus, size):
+        """
+        Keep the size of a bus on a manually addressed SOM, a ROM that is
+        parsed keeps the size of every bus from its interconnect record
+
+        Args:
+            bus (SOMBus): bus to change
+            size (integer): size of the bus, None to size the bus to fit its
+                children
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        bus.set_fixed_size(size)
+        self._mark_dirty(bus)
+        self._update()
+
+    def refresh(self, entity = None):
+        """
+        Lay out the SOM again after an SDBComponent was modified directly
 
-            current_start_address = c.get_start_address_as_int()
-            new_child_start_address = prev_start_address + spacing_size
-            if self.auto_address and (current_start_address < new_child_start_address):
-                    #print ("New child start address: 0x%016X" % new_child_start_address)
-                    c.set_start_address(new_child_start_address)
+        Only the bus that contains the entity (and the buses above it if their
+        sizes change) is laid out, if no entity is specified the entire tree
+        is laid out
 
-            prev_child = child
+        The entity is also updated in the path, vendor:product and ABI indexes
 
-            if spacing == 0:
-                bus_size += c.get_size_as_int()
+        Args:
+            entity (SOMComponent or SOMBus): entity that was modified,
+                leave blank to lay out the entire tree
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        if entity is None:
+            for bus in self._get_sub_buses(self.root):
+                self._mark_dirty(bus)
+            self.path_index = None
+            self.vendor_product_index = None
+            self.abi_index = None
+        else:
+            #The name or IDs may have changed
+            self._unindex_entities(entity)
+            self._index_entities(entity)
+            if isinstance(entity, SOMBus):
+                self._mark_dirty(entity)
+            if entity.get_parent() is not None:
+                self._mark_dirty(entity.get_parent())
+        self._update()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Defer the layout of the SOM until the end of a block of changes
+
+        Every insert or remove normally lays out the entire tree, when
+        building a large bus this can be wrapped in a batch so only one
+        layout pass is performed when the outer most batch exits:
+
+        with som.batch():
+            for component in components:
+                som.insert_component(bus, component)
+
+        Batches can be nested, addresses and sizes within the SOM are not
+        valid until the outer most batch has exited
+
+        Args:
+            Nothing
+
+        Return:
+            (SOM): this SOM
+
+        Raises:
+            Nothing
+        """
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and self.batch_pending:
+                self.batch_pending = False
+                self._update()
+
+    def is_batch_active(self):
+        """
+        Returns true if the SOM is within a batch and the layout is deferred
+
+        Args:
+            Nothing
+
+        Return (Boolean):
+            True: layout is deferred until the batch exits
+            False: layout is performed on every change
+
+        Raises:
+            Nothing
+        """
+        return self.batch_depth > 0
+
+    #Private Functions
+    def _mark_dirty(self, bus):
+        """
+        Schedule a bus to be laid out on the next update
+        """
+        #Any change to a bus can move the devices
+        self.address_index = None
+        if not bus.dirty:
+            bus.dirty = True
+            self.dirty_buses.append(bus)
+
+    def _build_address_index(self):
+        """
+        Returns the start addresses, end addresses, the highest end address
+        up to each device and the devices of the SOM sorted by start address,
+        the addresses are absolute
+        """
+        ranges = []
+        stack = [(self.root, self.root.get_component().get_start_address_as_int())]
+        while len(stack) > 0:
+            bus, base = stack.pop()
+            for child in bus.children:
+                c = child.get_component()
+                if isinstance(child, SOMBus):
+                    stack.append((child, base + c.get_start_address_as_int()))
+                elif c.is_device() and c.get_size_as_int() > 0:
+                    start = base + c.get_start_address_as_int()
+                    ranges.append((start, start + c.get_size_as_int(), child))
+
+        ranges.sort(key = lambda r: r[0])
+        max_ends = []
+        max_end = 0
+        for r in ranges:
+            max_end = max(max_end, r[1])
+            max_ends.append(max_end)
+        return ([r[0] for r in ranges],
+                [r[1] for r in ranges],
+                max_ends,
+                [r[2] for r in ranges])
+
+    def _index_entities(self, entity):
+        """
+        Add an entity and everything underneath it to all the indexes
+        """
+        self._index_paths(entity)
+        self._index_devices(entity)
+
+    def _unindex_entities(self, entity):
+        """
+        Remove an entity and everything underneath it from all the indexes
+        """
+        self._unindex_paths(entity)
+        self._unindex_devices(entity)
+
+    def _build_device_index(self):
+        """
+        Index all the devices by vendor:product and ABI class and major
+        version, after this the indexes are kept up to date as the SOM
+        changes
+        """
+        self.vendor_product_index = {}
+        self.abi_index = {}
+        self.entity_device_keys = {}
+        self._index_devices(self.root)
+
+    def _index_devices(self, entity):
+        """
+        Add the devices of an entity and everything underneath it to the
+        vendor:product and ABI indexes
+        """
+        if self.vendor_product_index is None:
+            return
+        stack = [entity]
+        while len(stack) > 0:
+            e = stack.pop()
+            if isinstance(e, SOMBus):
+                stack.extend(reversed(e.children))
+                continue
+            c = e.get_component()
+            if not c.is_device():
+                continue
+            keys = ((c.get_vendor_id_as_int(), c.get_device_id_as_int()),
+                    (c.get_abi_class_as_int(), c.get_abi_version_major_as_int()))
+            self.entity_device_keys[e] = keys
+            self.vendor_product_index.setdefault(keys[0], []).append(e)
+            self.abi_index.setdefault(keys[1], []).append(e)
+
+    def _unindex_devices(self, entity):
+        """
+        Remove the devices of an entity and everything underneath it from the
+        vendor:product and ABI indexes
+        """
+        if self.vendor_product_index is None:
+            return
+        stack = [entity]
+        while len(stack) > 0:
+            e = stack.pop()
+            if isinstance(e, SOMBus):
+                stack.extend(e.children)
+                continue
+            keys = self.entity_device_keys.pop(e, None)
+            if keys is None:
+                continue
+            for index, key in [(self.vendor_product_index, keys[0]),
+                               (self.abi_index, keys[1])]:
+                entities = index[key]
+                entities.remove(e)
+                if len(entities) == 0:
+                    del index[key]
+
+    def _build_path_index(self):
+        """
+        Index the path of every entity in the SOM, after this the index is
+        kept up to date as the SOM changes
+        """
+        self.path_index = {}
+        self.entity_paths = {}
+        self._index_paths(self.root)
+
+    def _index_paths(self, entity):
+        """
+        Add the paths of an entity and everything underneath it to the index
+        """
+        if self.path_index is None:
+            return
+        stack = [entity]
+        while len(stack) > 0:
+            e = stack.pop()
+            parent = e.get_parent()
+            if parent is None:
+                path = e.get_name()
             else:
-                mul = (c.get_size_as_int() / spacing) + 1
-                bus_size += mul * spacing
+                path = self.entity_paths[parent] + "." + e.get_name()
+            self.entity_paths[e] = path
+            self.path_index.setdefault(path, []).append(e)
+            if isinstance(e, SOMBus):
+                stack.extend(reversed(e.children))
 
+    def _unindex_paths(self, entity):
+        """
+        Remove the paths of an entity and everything underneath it from the
+        index
+        """
+        if self.path_index is None:
+            return
+        stack = [entity]
+        while len(stack) > 0:
+            e = stack.pop()
+            path = self.entity_paths.pop(e, None)
+            if path is not None:
+                entities = self.path_index[path]
+                entities.remove(e)
+                if len(entities) == 0:
+                    del self.path_index[path]
+            if isinstance(e, SOMBus):
+                stack.extend(e.children)
+
+    def _reindex_paths(self, entity):
+        """
+        Update the paths of an entity and everything underneath it after it
+        was renamed
+        """
+        self._unindex_paths(entity)
+        self._index_paths(entity)
 
-        #print "\tbus size: 0x%08X" % bus_size
-        if not self.auto_address and root.get_child_count() > 0:
-            child = root.get_child_from_index(root.get_child_count() - 1)
-            c = child.get_component()
-            bus_size = c.get_start_address_as_int() + c.get_size_as_int()
+    def _get_sub_buses(self, bus):
+        """
+        Returns the bus and all the buses underneath it
+        """
+        buses = []
+        stack = [bus]
+        while len(stack) > 0:
+            b = stack.pop()
+            buses.append(b)
+            for child in b.children:
+                if isinstance(child, SOMBus):
+                    stack.append(child)
+        return buses
 
+    def _update(self, root = None):
+        """
+        Lay out all the buses that have changed, if the size of a bus changes
+        then the bus above it is laid out as well, buses that have not changed
+        are not touched
+
+        The deepest buses are laid out first so the parent bus always sees the
+        final size of the sub buses
+
+        If a batch is active the update is deferred until the batch exits
+
+        Args:
+            root (SOMBus): bus to lay out in addition to the changed buses
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        if root is not None:
+            self._mark_dirty(root)
+
+        if self.batch_depth > 0:
+            self.batch_pending = True
+            return
+
+        heap = []
+        for bus in self.dirty_buses:
+            heapq.heappush(heap, (-bus.get_depth(), id(bus), bus))
+        self.dirty_buses = []
+
+        while len(heap) > 0:
+            depth, bus_id, bus = heapq.heappop(heap)
+            bus.dirty = False
+            if not self._layout_bus(bus):
+                continue
+
+            parent = bus.get_parent()
+            if parent is not None and not parent.dirty:
+                parent.dirty = True
+                heapq.heappush(heap, (depth + 1, id(parent), parent))
+
+    def _layout_bus(self, root):
+        """
+        Update the addresses of all the children within a bus as well as the
+        size and number of records of the bus
+
+        Sub buses are not laid out, they should already be up to date
+
+        Args:
+            root (SOMBus): bus to lay out
+
+        Return (Boolean):
+            True: The size of the bus changed
+            False: The size of the bus did not change
+
+        Raises:
+            Nothing
+        """
+        #The children are about to move, any address index built before the
+        #layout (for example within a batch) is out of date
+        self.address_index = None
+        bus_size = 0
+        rc = root.get_component()
+        start_address = rc.get_start_address_as_int()
+        #print ("Root: %s: Start: 0x%08X" % (root.c.get_name(), start_address))
+
+        '''
+        #Bubble sort everything
+        for i in range(root.get_child_count()):
+            prev_child = None
+            for j in range(root.get_child_count()):
+                child = root.get_child_from_index(j)
+                if prev_child is None:
+                    prev_child = child
+                    continue
+                if child.c.get_start_address_as_int() < prev_child.c.get_start_address_as_int():
+                    #print "Reordering children"
+                    root.remove_child_at_index(j)
+                    root.insert_child(child, j - 1)
+
+                prev_child = child
+
+        print "Sorted Children:"
+        for i in range(root.get_child_count()):
+            child = root.get_child_from_index(i)
+            print "\tchild %s: 0x%02X" % (child.c.d["SDB_NAME"], child.c.get_start_address_as_int())
+        '''
+
+        #Move all informative elements to the end of the bus
+        root.move_informative_to_end()
+
+        if self.auto_address:
+            bus_size = self._allocate_bus(root)
+        elif root.get_fixed_size() is not None:
+            bus_size = root.get_fixed_size()
+        else:
+            #Informative records at the end of the bus do not have an address
+            #so the bus ends where the furthest child ends
+            bus_size = 0
+            for child in root.children:
+                c = child.get_component()
+                bus_size = max(bus_size, c.get_start_address_as_int() + c.get_size_as_int())
+
+        prev_bus_size = rc.get_size_as_int()
         rc.set_size(bus_size)
         rc.set_number_of_records(root.get_child_count())
 
@@ -703,102 +1908,173 @@ class SOM(object):
             child = root.get_child_from_index(i)
             print "\tchild %s: 0x%02X" % (child.c.d["SDB_NAME"], child.c.get_start_address_as_int())
         '''
+        return prev_bus_size != bus_size
+
+    def _allocate_bus(self, root):
+        """
+        Place all the children of an auto addressed bus
+
+        Pinned children are placed first, the rest are allocated around them
+        aligned on the largest of the spacing of the bus, their own alignment
+        and, with natural alignment, their size rounded up to a power of two
+
+        Args:
+            root (SOMBus): bus to lay out
+
+        Return (integer):
+            Size of the bus, the end of the furthest child
+
+        Raises:
+            Nothing
+        """
+        spacing = root.get_child_spacing()
+        best_fit = root.get_allocation_policy() == ALLOCATE_BEST_FIT
+        free = [(0, None)]
+        bus_size = 0
+        placed = []
+        for child in root.children:
+            c = child.get_component()
+            #Informative records do not have an address
+            if c.is_informative_record():
+                continue
+            size = c.get_size_as_int()
+            if child.get_fixed_address() is not None:
+                start = child.get_fixed_address()
+                c.set_start_address(start)
+                _reserve_range(free, start, start + size)
+                bus_size = max(bus_size, start + size)
+                continue
+
+            alignment = max(spacing, child.get_alignment())
+            if root.is_natural_alignment():
+                alignment = max(alignment, _next_power_of_two(size))
+            placed.append((alignment, size, child))
+
+        if best_fit:
+            placed.sort(key = lambda p: (p[0], p[1]), reverse = True)
+
+        for alignment, size, child in placed:
+            start = _allocate_range(free, size, alignment, best_fit)
+            child.get_component().set_start_address(start)
+            bus_size = max(bus_size, start + size)
+
+        return bus_size
+
+    def pretty_print_sdb(self, stream = None, root = None, record_types = None):
+        """
+        Write a human readable description of the SOM to a stream, the
+        description is written one entity at a time so very large SOMs can
+        be written without holding the whole description in memory
+
+        Args:
+            stream (file): writable stream, leave blank for stdout
+            root (SOMBus): only describe this bus and the buses underneath
+                it, leave blank for the entire SOM
+            record_types (list of integers): only describe these record types
+                (SDB_RECORD_TYPE_DEVICE, SDB_RECORD_TYPE_REPO_URL, ...), the
+                buses are always described, leave blank for all records
 
-    def pretty_print_sdb(self):
-        root = self.get_root()
-        s = self._gen_bus_string(root, 1)
-        print (s)
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        if stream is None:
+            stream = sys.stdout
+        if root is None:
+            root = self.get_root()
+        self._write_bus(stream, root, 1, record_types)
+        stream.write("\n")
 
     @staticmethod
     def _add_depth_spacing(depth):
-        s = ""
-        for i in range(depth):
-            for j in range(DEPTH_SPACE):
-                s += " "
-        return s
-
-    def _gen_url_record_string(self, component, depth):
-        s = ""
-        s += SOM._add_depth_spacing(depth)
-        s += "URL: %s\n" % component.get_url()
-        s += "\n"
-        return s
-
-    def _gen_synthesis_record_string(self, component, depth):
-        s = ""
-        s += SOM._add_depth_spacing(depth)
-        s += "Synthesis: {0:20} Date: {1:10}\n".format(component.get_name(),
-                                                       component.get_date())
-        s += SOM._add_depth_spacing(depth + 1)
-        s += "Tool: {0:10} {1:6}\n".format(component.get_synthesis_tool_name(),
-                                           component.get_synthesis_tool_version())
-        s += SOM._add_depth_spacing(depth + 1)
-        s += "Commit ID: {0:20}\n".format(component.get_synthesis_commit_id())
-        s += SOM._add_depth_spacing(depth + 1)
-        s += "User: {0:20}\n".format(component.get_synthesis_user_name())
-        s += "\n"
-        return s
-
-    def _gen_device_record_string(self, component, depth):
-        s = ""
+        while len(_INDENTS) <= depth:
+            _INDENTS.append(_INDENTS[-1] + " " * DEPTH_SPACE)
+        return _INDENTS[depth]
+
+    def _write_url_record(self, stream, component, depth):
+        stream.write(SOM._add_depth_spacing(depth))
+        stream.write("URL: %s\n" % component.get_url())
+        stream.write("\n")
+
+    def _write_synthesis_record(self, stream, component, depth):
+        indent = SOM._add_depth_spacing(depth + 1)
+        stream.write(SOM._add_depth_spacing(depth))
+        stream.write("Synthesis: {0:20} Date: {1:10}\n".format(component.get_name(),
+                                                               component.get_date()))
+        stream.write(indent)
+        stream.write("Tool: {0:10} {1:6}\n".format(component.get_synthesis_tool_name(),
+                                                   component.get_synthesis_tool_version()))
+        stream.write(indent)
+        stream.write("Commit ID: {0:20}\n".format(component.get_synthesis_commit_id()))
+        stream.write(indent)
+        stream.write("User: {0:20}\n".format(component.get_synthesis_user_name()))
+        stream.write("\n")
+
+    def _write_device_record(self, stream, component, depth):
+        indent = SOM._add_depth_spacing(depth + 1)
         name = component.get_name()
         major = component.get_abi_version_major_as_int()
         minor = component.get_abi_version_minor_as_int()
         dev_name = device_manager.get_device_name_from_id(major)
-        s += SOM._add_depth_spacing(depth)
-        s += "Device: {0:20} Type (Major:Minor) ({1:0=2X}:{2:0=2X}): {3:10}\n".format(name,
-                                                                                      major,
-                                                                                      minor,
-                                                                                      dev_name)
-        s += SOM._add_depth_spacing(depth + 1)
-        s += "Address: 0x{0:0=16X}-0x{1:0=16X} : Size: 0x{2:0=8X}\n".format(component.get_start_address_as_int(),
-                                                            component.get_end_address_as_int(),
-                                                            component.get_size_as_int())
-        s += SOM._add_depth_spacing(depth + 1)
-        s += "Vendor:Product: {0:0=16X}:{1:0=8X}\n".format(component.get_vendor_id_as_int(),
-                                                           component.get_device_id_as_int())
-        s += SOM._add_depth_spacing(depth + 1)
-        s += "Version: {0:20}\n".format(component.get_core_version())
-        s += "\n"
-        return s
-
-    def _gen_integration_record_string(self, component, depth):
-        s = ""
-        s += SOM._add_depth_spacing(depth)
-        s += "Integration: {0:20}\n".format(component.get_name())
-        s += SOM._add_depth_spacing(depth + 1)
-        s += "Vendor:Product: {0:0=16X}:{1:0=8X}\n".format(component.get_vendor_id_as_int(),
-                                                           component.get_device_id_as_int())
-        s += "\n"
-        return s
-
-    def _gen_bus_string(self, bus, depth = 0):
-        s = ""
-        c = bus.get_component()
-        s += SOM._add_depth_spacing(depth)
-        s += "Bus: {0:<10} @ 0x{1:0=16X} : Size: 0x{2:0=8X}\n\n".format(bus.get_name(),
-                                                                      c.get_start_address_as_int(),
-                                                                      c.get_size_as_int())
-
-
-        for i in range(bus.get_child_count()):
-            c = bus.get_child_from_index(i)
-            if self.is_entity_a_bus(bus, i):
-                s += self._gen_bus_string(c, depth + 1)
-            else:
-                c = c.get_component()
-                if c.is_url_record():
-                    s += self._gen_url_record_string(c, depth + 1)
-
-                if c.is_synthesis_record():
-                    s += self._gen_synthesis_record_string(c, depth + 1)
-
-                if c.is_device():
-                    s += self._gen_device_record_string(c, depth + 1)
+        stream.write(SOM._add_depth_spacing(depth))
+        stream.write("Device: {0:20} Type (Major:Minor) ({1:0=2X}:{2:0=2X}): {3:10}\n".format(name,
+                                                                                              major,
+                                                                                              minor,
+                                                                                              dev_name))
+        stream.write(indent)
+        stream.write("Address: 0x{0:0=16X}-0x{1:0=16X} : Size: 0x{2:0=8X}\n".format(component.get_start_address_as_int(),
+                                                                    component.get_end_address_as_int(),
+                                                                    component.get_size_as_int()))
+        stream.write(indent)
+        stream.write("Vendor:Product: {0:0=16X}:{1:0=8X}\n".format(component.get_vendor_id_as_int(),
+                                                                   component.get_device_id_as_int()))
+        stream.write(indent)
+        stream.write("Version: {0:20}\n".format(component.get_core_version()))
+        stream.write("\n")
+
+    def _write_integration_record(self, stream, component, depth):
+        stream.write(SOM._add_depth_spacing(depth))
+        stream.write("Integration: {0:20}\n".format(component.get_name()))
+        stream.write(SOM._add_depth_spacing(depth + 1))
+        stream.write("Vendor:Product: {0:0=16X}:{1:0=8X}\n".format(component.get_vendor_id_as_int(),
+                                                                   component.get_device_id_as_int()))
+        stream.write("\n")
+
+    def _write_bus(self, stream, bus, depth = 0, record_types = None):
+        writers = {sdb_component.SDB_RECORD_TYPE_DEVICE:      self._write_device_record,
+                   sdb_component.SDB_RECORD_TYPE_INTEGRATION: self._write_integration_record,
+                   sdb_component.SDB_RECORD_TYPE_REPO_URL:    self._write_url_record,
+                   sdb_component.SDB_RECORD_TYPE_SYNTHESIS:   self._write_synthesis_record}
+
+        #Depths of the buses that have not been closed with a blank line
+        open_buses = []
+        for path, d, entity in self._walk(bus, WALK_DEPTH_FIRST, False):
+            d += depth
+            while len(open_buses) > 0 and open_buses[-1] >= d:
+                open_buses.pop()
+                stream.write("\n")
+
+            if isinstance(entity, SOMBus):
+                c = entity.get_component()
+                stream.write(SOM._add_depth_spacing(d))
+                stream.write("Bus: {0:<10} @ 0x{1:0=16X} : Size: 0x{2:0=8X}\n\n".format(entity.get_name(),
+                                                                                       c.get_start_address_as_int(),
+                                                                                       c.get_size_as_int()))
+                open_buses.append(d)
+                continue
 
-                if c.is_integration_record():
-                    s += self._gen_integration_record_string(c, depth + 1)
+            #Check the type first so filtered out records are never decoded
+            record_type = entity.get_record_type()
+            if record_types is not None and record_type not in record_types:
+                continue
+            if record_type in writers:
+                writers[record_type](stream, entity.get_component(), d)
 
-        s += "\n"
-        return s
+        stream.write("\n" * len(open_buses))
 
+    def _gen_bus_string(self, bus, depth = 0):
+        stream = io.StringIO()
+        self._write_bus(stream, bus, depth)
+        return stream.getvalue()
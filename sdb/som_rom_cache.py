@@ -0,0 +1,169 @@
+# this file is part of SDB.
+#
+# SDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# SDB is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with SDB.  If not, see <http://www.gnu.org/licenses/>
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+
+from .sdb_core import SDBError
+
+'''
+On disk cache of generated ROM images
+
+The images are stored by the digest of the configuration they were
+generated from (som_rom_generator.get_config_digest) or of the SOM
+(som_rom_generator.get_som_digest), every time an image is used its
+modification time is updated so the least recently used images are removed
+first when the cache grows beyond its size
+'''
+
+#Default limit of the size of all the images in the cache
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+
+ROM_EXTENSION = ".rom"
+
+class ROMCache(object):
+
+    def __init__(self, directory, max_size = DEFAULT_MAX_SIZE, include_date = True):
+        """
+        Create a cache of ROM images in a directory
+
+        Args:
+            directory (string): where the images are stored, created if it
+                does not exist
+            max_size (integer): limit of the total size of the images in bytes
+            include_date (boolean): when False the dates of the records are
+                not part of the key, a SOM that only differs by its dates
+                gets the ROM (and the dates) that was stored first
+
+        Return:
+            Nothing
+
+        Raises:
+            SDBError: the directory could not be created
+        """
+        self.directory = os.path.abspath(directory)
+        self.max_size = max_size
+        self.include_date = include_date
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError as err:
+                raise SDBError("Failed to create ROM cache: %s: %s" % (self.directory, str(err)))
+
+    def is_date_included(self):
+        return self.include_date
+
+    def get_max_size(self):
+        return self.max_size
+
+    def get(self, key):
+        """
+        Return the ROM image stored with the key
+
+        Args:
+            key (string): digest of the SOM
+
+        Return:
+            (bytearray): ROM image or None if it is not in the cache
+
+        Raises:
+            Nothing
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as f:
+                rom = bytearray(f.read())
+            #Most recently used
+            os.utime(path, None)
+        except (IOError, OSError):
+            #Missing or evicted by another process
+            return None
+        return rom
+
+    def put(self, key, rom):
+        """
+        Store a ROM image, the least recently used images are removed until
+        the cache fits within its size
+
+        Args:
+            key (string): digest of the SOM
+            rom (bytearray): ROM image
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        if len(rom) > self.max_size:
+            return
+
+        path = self._get_path(key)
+        temp_path = "%s.%d" % (path, os.getpid())
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(rom)
+            #Other processes never see a partial image
+            os.rename(temp_path, path)
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self._evict()
+
+    def get_size(self):
+        """Return the total size of the images in the cache"""
+        return sum([size for mtime, size, path in self._get_entries()])
+
+    def clear(self):
+        """Remove every image from the cache"""
+        for mtime, size, path in self._get_entries():
+            self._remove(path)
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, key + ROM_EXTENSION)
+
+    def _get_entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ROM_EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _evict(self):
+        entries = self._get_entries()
+        total = sum([size for mtime, size, path in entries])
+        #Oldest first
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            #Already removed by another process
+            pass
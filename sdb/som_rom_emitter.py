@@ -0,0 +1,244 @@
+# this file is part of SDB.
+#
+# SDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# SDB is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with SDB.  If not, see <http://www.gnu.org/licenses/>
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import binascii
+import collections
+
+from .sdb_core import SDBError
+
+'''
+Functions to write a generated ROM image in the formats used to initialize
+a block RAM
+
+Every emitter takes the ROM (bytearray) and a stream, the ROM is converted
+a chunk at a time so the whole image is never held as a string
+'''
+
+#Number of bytes converted to hex at a time
+CHUNK_SIZE = 4096
+
+#Number of bytes in an Intel HEX data record
+IHEX_RECORD_SIZE = 16
+
+#Number of bytes on each line of a C header
+HEADER_LINE_SIZE = 12
+
+def _check_word_size(rom, word_size):
+    if len(rom) % word_size != 0:
+        raise SDBError("ROM size: 0x%X is not a multiple of the word size: %d" %
+                       (len(rom), word_size))
+
+def _iter_hex_chunks(rom, chunk_size = CHUNK_SIZE):
+    """Yield the offset of each chunk and its contents as upper case hex"""
+    view = memoryview(rom)
+    for offset in range(0, len(rom), chunk_size):
+        yield offset, binascii.hexlify(view[offset:offset + chunk_size]).decode("ascii").upper()
+
+def _iter_hex_words(rom, word_size):
+    """Yield a list of the words of each chunk as hex"""
+    _check_word_size(rom, word_size)
+    digits = word_size * 2
+    #Chunks always end on a word boundary
+    chunk_size = (CHUNK_SIZE // word_size) * word_size
+    for offset, text in _iter_hex_chunks(rom, chunk_size):
+        yield [text[i:i + digits] for i in range(0, len(text), digits)]
+
+def emit_binary(rom, stream):
+    """Raw ROM image"""
+    stream.write(memoryview(rom))
+
+def _emit_readmemh(rom, stream, word_size):
+    for words in _iter_hex_words(rom, word_size):
+        stream.write("\n".join(words))
+        stream.write("\n")
+
+def emit_readmemh_32(rom, stream):
+    """One 32-bit hex word per line, for $readmemh"""
+    _emit_readmemh(rom, stream, 4)
+
+def emit_readmemh_64(rom, stream):
+    """One 64-bit hex word per line, for $readmemh"""
+    _emit_readmemh(rom, stream, 8)
+
+def emit_coe(rom, stream):
+    """Xilinx memory initialization file with 32-bit words"""
+    stream.write("memory_initialization_radix=16;\n")
+    stream.write("memory_initialization_vector=\n")
+    separator = ""
+    for words in _iter_hex_words(rom, 4):
+        stream.write(separator)
+        stream.write(",\n".join(words))
+        separator = ",\n"
+    stream.write(";\n")
+
+def emit_mif(rom, stream):
+    """Altera memory initialization file with 32-bit words"""
+    _check_word_size(rom, 4)
+    stream.write("WIDTH=32;\n")
+    stream.write("DEPTH=%d;\n\n" % (len(rom) // 4))
+    stream.write("ADDRESS_RADIX=HEX;\n")
+    stream.write("DATA_RADIX=HEX;\n\n")
+    stream.write("CONTENT BEGIN\n")
+    address = 0
+    for words in _iter_hex_words(rom, 4):
+        for word in words:
+            stream.write("\t%X : %s;\n" % (address, word))
+            address += 1
+    stream.write("END;\n")
+
+def _ihex_record(record_type, address, data):
+    checksum = len(data) + (address >> 8) + (address & 0xFF) + record_type + sum(data)
+    return ":%02X%04X%02X%s%02X\n" % (len(data),
+                                      address,
+                                      record_type,
+                                      binascii.hexlify(data).decode("ascii").upper(),
+                                      -checksum & 0xFF)
+
+def emit_ihex(rom, stream):
+    """Intel HEX, an extended linear address record starts every 64K"""
+    view = memoryview(rom)
+    for offset in range(0, len(rom), IHEX_RECORD_SIZE):
+        if offset > 0 and offset & 0xFFFF == 0:
+            upper = offset >> 16
+            stream.write(_ihex_record(0x04, 0, bytearray([upper >> 8, upper & 0xFF])))
+        stream.write(_ihex_record(0x00, offset & 0xFFFF, bytearray(view[offset:offset + IHEX_RECORD_SIZE])))
+    stream.write(_ihex_record(0x01, 0, bytearray()))
+
+def emit_c_header(rom, stream):
+    """C header with the ROM as an array of bytes"""
+    stream.write("/* SDB ROM image */\n")
+    stream.write("#ifndef __SDB_ROM_H__\n")
+    stream.write("#define __SDB_ROM_H__\n\n")
+    stream.write("#include <stdint.h>\n\n")
+    stream.write("#define SDB_ROM_SIZE %d\n\n" % len(rom))
+    stream.write("static const uint8_t sdb_rom[SDB_ROM_SIZE] = {\n")
+    #Chunks always end on a line boundary
+    chunk_size = (CHUNK_SIZE // HEADER_LINE_SIZE) * HEADER_LINE_SIZE
+    for offset, text in _iter_hex_chunks(rom, chunk_size):
+        values = ["0x" + text[i:i + 2] for i in range(0, len(text), 2)]
+        for i in range(0, len(values), HEADER_LINE_SIZE):
+            stream.write("    %s,\n" % ", ".join(values[i:i + HEADER_LINE_SIZE]))
+    stream.write("};\n\n")
+    stream.write("#endif /* __SDB_ROM_H__ */\n")
+
+EMITTERS = collections.OrderedDict([
+    ("rom", {
+        "emitter": emit_readmemh_32,
+        "extension": ".rom",
+        "binary": False,
+        "description": "32-bit hex ROM, the same as readmemh32"
+    }),
+    ("bin", {
+        "emitter": emit_binary,
+        "extension": ".bin",
+        "binary": True,
+        "description": emit_binary.__doc__
+    }),
+    ("readmemh32", {
+        "emitter": emit_readmemh_32,
+        "extension": "_32.mem",
+        "binary": False,
+        "description": emit_readmemh_32.__doc__
+    }),
+    ("readmemh64", {
+        "emitter": emit_readmemh_64,
+        "extension": "_64.mem",
+        "binary": False,
+        "description": emit_readmemh_64.__doc__
+    }),
+    ("coe", {
+        "emitter": emit_coe,
+        "extension": ".coe",
+        "binary": False,
+        "description": emit_coe.__doc__
+    }),
+    ("mif", {
+        "emitter": emit_mif,
+        "extension": ".mif",
+        "binary": False,
+        "description": emit_mif.__doc__
+    }),
+    ("ihex", {
+        "emitter": emit_ihex,
+        "extension": ".hex",
+        "binary": False,
+        "description": emit_ihex.__doc__
+    }),
+    ("header", {
+        "emitter": emit_c_header,
+        "extension": ".h",
+        "binary": False,
+        "description": emit_c_header.__doc__
+    })
+])
+
+def register_emitter(name, emitter, extension, binary = False, description = ""):
+    """
+    Add an output format
+
+    Args:
+        name (string): name of the format
+        emitter (function): called with the ROM (bytearray) and the stream
+        extension (string): appended to the name of the output file
+        binary (boolean): the stream is opened in binary mode
+        description (string): shown in the help
+
+    Return:
+        Nothing
+
+    Raises:
+        SDBError: there is already a format with this name
+    """
+    if name in EMITTERS:
+        raise SDBError("Output format: %s already exists" % name)
+    EMITTERS[name] = {"emitter": emitter,
+                      "extension": extension,
+                      "binary": binary,
+                      "description": description}
+
+def is_binary_format(oformat):
+    """Return True if the format must be written to a binary stream"""
+    return _get_emitter(oformat)["binary"]
+
+def get_format_extension(oformat):
+    """Return the extension of files in this format"""
+    return _get_emitter(oformat)["extension"]
+
+def emit_rom(rom, oformat, stream):
+    """
+    Write the ROM image to the stream in the specified format
+
+    Args:
+        rom (bytearray): ROM image from som_rom_generator.generate_rom_image
+        oformat (string): name of the output format, one of EMITTERS
+        stream (file): binary stream for binary formats, text stream for
+            everything else
+
+    Return:
+        Nothing
+
+    Raises:
+        SDBError: unknown format or the ROM does not fit the format
+    """
+    _get_emitter(oformat)["emitter"](rom, stream)
+
+def _get_emitter(oformat):
+    if oformat not in EMITTERS:
+        raise SDBError("Unknown output format: %s, formats: %s" %
+                       (oformat, ", ".join(EMITTERS.keys())))
+    return EMITTERS[oformat]
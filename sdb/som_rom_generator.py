@@ -17,7 +17,10 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
-from array import array as Array
+import binascii
+import hashlib
+from datetime import datetime
+
 from .sdb_component import SDBComponent as sdbc
 from . import sdb_component
 
@@ -26,27 +29,264 @@ from .sdb_object_model import SOMBus
 from .sdb_core import SDBInfo
 from .sdb_core import SDBWarning
 from .sdb_core import SDBError
-from .sdb_component import SDB_INTERCONNECT_MAGIC
 from .sdb_component import SDB_ROM_RECORD_LENGTH as RECORD_LENGTH
+from .sdb_component import SDB_EMPTY_RECORD
+from .sdb_component import SDB_RECORD_TYPE_EMPTY
+from .sdb_component import pack_record
+
+#The ROM within the FPGA is 32 bits wide
+ROM_WORD_SIZE = 4
+
+#Bumped when the ROM generated from the same configuration changes, it is
+#part of the configuration digest so cached ROMs from an older generator are
+#not used
+GENERATOR_VERSION = 1
+
+class ROMLayout(object):
+
+    def __init__(self):
+        """
+        Where every record of a SOM was written when its ROM image was
+        generated, pass it to generate_rom_image to fill it in and then to
+        patch_rom_image to update the ROM image after the SOM is edited
+
+        The hash of every entity is kept with the address of its record so
+        only the parts of the SOM that changed since the ROM was generated
+        are visited
+
+        Args:
+            Nothing
+
+        Return:
+            Nothing
+
+        Raises:
+            Nothing
+        """
+        self.root = None
+        self.size = 0
+        #id(bus): [table address, number of children]
+        self.tables = {}
+        #id(entity): [entity, record address, hash], the address of a bus is
+        #the address of its bridge record (None for the root)
+        self.records = {}
+
+    def get_size(self):
+        return self.size
+
+    def get_record_address(self, entity):
+        """
+        Return the address of the record of an entity within the ROM, for a
+        bus this is the address of the bridge record that points to it
+
+        Args:
+            entity (SOMComponent or SOMBus): entity of the SOM
+
+        Return:
+            (integer): byte address of the record
+
+        Raises:
+            SDBError: the entity was not part of the SOM or it is the root
+        """
+        record = self.records.get(id(entity))
+        if record is None or record[0] is not entity or record[1] is None:
+            raise SDBError("Entity: %s does not have a record in the ROM" % entity.get_name())
+        return record[1]
+
+    def get_table_address(self, bus):
+        """
+        Return the address of the table of a bus within the ROM, the table
+        starts with the interconnect record of the bus
+
+        Args:
+            bus (SOMBus): bus of the SOM
+
+        Return:
+            (integer): byte address of the table
+
+        Raises:
+            SDBError: the bus was not part of the SOM
+        """
+        record = self.records.get(id(bus))
+        if record is None or record[0] is not bus or id(bus) not in self.tables:
+            raise SDBError("Bus: %s does not have a table in the ROM" % bus.get_name())
+        return self.tables[id(bus)][0]
+
+    def _update(self, root, tables, size, rom = None):
+        """Record the layout, 'rom' is the image that was just generated, the
+        hashes that are missing are calculated from the records in it instead
+        of packing the records again"""
+        if rom is not None:
+            _hash_records(tables, rom)
+        self.root = root
+        self.size = size
+        self.tables = {}
+        self.records = {id(root): [root, None, root.get_hash()]}
+        for bus, addr in tables:
+            count = bus.get_child_count()
+            self.tables[id(bus)] = [addr, count]
+            for pos in range(count):
+                entity = bus.get_child_from_index(pos)
+                self.records[id(entity)] = [entity,
+                                            addr + (pos + 1) * RECORD_LENGTH,
+                                            entity.get_hash()]
 
 #Public facing functions
-def generate_rom_image(som):
+def generate_rom_image(som, cache = None, layout = None):
     """
     Given a populated SOM generate a ROM image
 
+    The ROM is generated in two passes, the first pass finds where the table
+    of each bus will be located, the second pass writes all the records into
+    a buffer that is allocated once
+
     Args:
         som (SDBObjectModel): A populated SOM
+        cache (ROMCache): optional cache of ROM images (see som_rom_cache),
+            a ROM generated from a SOM with the same content is returned
+            from the cache without generating it again, the SOM is found by
+            its hash so this only pays off for a SOM that keeps its hashes
+            between ROMs, use get_config_digest to find the ROM of a
+            configuration without building the SOM
+        layout (ROMLayout): optional, filled in with the address of every
+            record so the ROM can be updated with patch_rom_image
 
     Return:
-        Nothing
+        (bytearray): ROM image
 
     Raises:
         SDBError, error while parsing the SOM
     """
-    rom = Array('B')
+    root = som.get_root()
+    if cache is not None:
+        key = get_som_digest(som, cache.is_date_included())
+        rom = cache.get(key)
+        if rom is not None:
+            if layout is not None:
+                tables, size = _get_bus_tables(root)
+                layout._update(root, tables, size)
+            return rom
+
     #Go through each of the elements.
+    tables, size = _get_bus_tables(root)
+    rom = bytearray(size)
+    offsets = {}
+    for bus, addr in tables:
+        offsets[id(bus)] = addr
+
+    for bus, addr in tables:
+        _bus_to_rom(bus, rom, addr, offsets)
+
+    if cache is not None:
+        cache.put(key, rom)
+    if layout is not None:
+        layout._update(root, tables, size, rom)
+    return rom
+
+def patch_rom_image(som, rom, layout):
+    """
+    Update a ROM image after the SOM it was generated from is edited, only
+    the records that changed are written
+
+    The buses and entities that did not change since the ROM was generated
+    are skipped using their hashes. When the edits change the layout of the
+    ROM (entities are added, removed or moved to another position) the ROM
+    is generated again, the size of the ROM can change
+
+    Args:
+        som (SDBObjectModel): the SOM the ROM was generated from
+        rom (bytearray): ROM image from generate_rom_image, updated in place
+        layout (ROMLayout): layout filled in when the ROM was generated,
+            updated to match the new ROM
+
+    Return:
+        (list of tuples): (first word, last word + 1) of the ranges of
+            ROM_WORD_SIZE words that changed, in order
+
+    Raises:
+        SDBError, error while parsing the SOM
+    """
     root = som.get_root()
-    return _bus_to_rom(root, rom)
+    changes = None
+    if root is layout.root and len(rom) == layout.size:
+        changes = _get_changed_records(root, rom, layout)
+
+    if changes is None:
+        #The layout changed, compare the new ROM with the old one
+        new_rom = generate_rom_image(som, layout = layout)
+        addresses = [addr for addr in range(0, len(new_rom), RECORD_LENGTH)
+                     if rom[addr:addr + RECORD_LENGTH] != new_rom[addr:addr + RECORD_LENGTH]]
+        rom[:] = new_rom
+        return _get_word_ranges(addresses)
+
+    records, addresses = changes
+    for addr, data in addresses:
+        rom[addr:addr + RECORD_LENGTH] = data
+    for record in records:
+        record[2] = record[0].get_hash()
+    return _get_word_ranges([addr for addr, data in addresses])
+
+def get_som_digest(som, include_date = True):
+    """
+    Given a populated SOM return a hash of everything that is written to the
+    ROM: the hierarchy and the records with their addresses
+
+    Two SOMs with the same digest generate the same ROM, with the date
+    included this is the hash the SOM keeps for its root so it is only
+    calculated again for the parts of the SOM that changed
+
+    Args:
+        som (SDBObjectModel): A populated SOM
+        include_date (boolean): when False the SDB_DATE of the records is
+            left out so SOMs that only differ by their dates match
+
+    Return:
+        (string): hex digest
+
+    Raises:
+        Nothing
+    """
+    if include_date:
+        return binascii.hexlify(som.get_root().get_hash()).decode("ascii")
+
+    digest = hashlib.sha1()
+    tables, size = _get_bus_tables(som.get_root())
+    for bus, addr in tables:
+        #The records of the bus in ROM order, the record type tells the sub
+        #buses apart from the other entities
+        bus.get_component().update_hash(digest, include_date)
+        for pos in range(bus.get_child_count()):
+            bus.get_child_from_index(pos).get_component().update_hash(digest, include_date)
+        digest.update(b"E")
+    return digest.hexdigest()
+
+def get_config_digest(config, include_date = True):
+    """
+    Given the contents of the configuration a SOM is built from return a
+    key for the ROM cache
+
+    Unlike get_som_digest the SOM does not need to be built, for a SOM that
+    was just built get_som_digest costs as much as generating the ROM. The
+    records without a date are given the date they are generated on so with
+    the date included the key changes every day
+
+    Args:
+        config (bytes): contents of the configuration file
+        include_date (boolean): when False the key does not change with the
+            date, a ROM generated on another day is used
+
+    Return:
+        (string): hex digest
+
+    Raises:
+        Nothing
+    """
+    digest = hashlib.sha1(("config:%d\0" % GENERATOR_VERSION).encode("ascii"))
+    if include_date:
+        d = datetime.now()
+        digest.update(("%04d/%02d/%02d\0" % (d.year, d.month, d.day)).encode("ascii"))
+    digest.update(config)
+    return digest.hexdigest()
 
 def get_total_number_of_records(som):
     """
@@ -54,6 +294,9 @@ def get_total_number_of_records(som):
     Elements in the ROM (This is used to calculate
     the size of the ROM within the FPGA)
 
+    The count is maintained by the SOM as entities are added and removed so
+    the ROM does not need to be generated
+
     Args:
         som (SDBObjectModel): A populated SOM
 
@@ -64,244 +307,133 @@ def get_total_number_of_records(som):
     Raises:
         SDBError, error while parsing the SOM
     """
-    rom = Array('B')
-    root = som.get_root()
-    _bus_to_rom(root, rom)
-    return len(rom) / 64
+    return som.get_root().get_record_count()
 
 
 #Private functions (SDB -> ROM)
-def _bus_to_rom(bus, rom, addr = None):
+def _get_bus_tables(root):
     """
-    Parse a bus, starting with the actual interconnect and then all the
-    way through the final device, this stores the busses to be processed
-    later and putting a birdge in the spot where the new bus will be
-    """
-    buses = []
-    bridge_address_offset = 0x00
-    if addr is None:
-        addr = 0x00
+    Find the location of the table of every bus within the ROM
 
-    #Generate a slice of the ROM that will contain the entire bus
-    #Add 1 for the initial interconnect
-    #Add 1 for the empty block afterwards
-    #print "Total length: %d" % (len(bus) + 2)
-    #print "Total byte length: %d" % (RECORD_LENGTH * (len(bus) + 2) / 8)
+    Each bus is a table of records starting with the interconnect record
+    followed by one record per child and an empty record at the end. The
+    table of a sub bus is placed after the table of the bus above it and
+    the tables of all the sub buses of the buses before it (depth first)
 
-    for i in range((len(bus) + 2) * RECORD_LENGTH):
-        rom.append(0x00)
+    Returns:
+        (list of tuples): (SOMBus, address of the table) in ROM order
+        (integer): total size of the ROM in bytes
+    """
+    tables = []
+    addr = 0x00
+    stack = [root]
+    while len(stack) > 0:
+        bus = stack.pop()
+        tables.append((bus, addr))
+        #Add 1 for the initial interconnect
+        #Add 1 for the empty block afterwards
+        addr += (bus.get_child_count() + 2) * RECORD_LENGTH
+        for pos in range(bus.get_child_count() - 1, -1, -1):
+            entity = bus.get_child_from_index(pos)
+            if isinstance(entity, SOMBus):
+                stack.append(entity)
+    return tables, addr
+
+def _get_changed_records(root, rom, layout):
+    """
+    Find the records that changed since the ROM was generated, only the
+    buses with a different hash are visited
 
-    #Put in a marker for an empty buffer
-    rom[len(rom) - 1] = 0xFF
+    Returns:
+        (list): the records of the layout of the entities that changed
+        (list of tuples): (address, new record) of the records to write
+        None when the layout of the ROM changed
+    """
+    records = []
+    addresses = []
+    stack = [root]
+    while len(stack) > 0:
+        bus = stack.pop()
+        record = layout.records[id(bus)]
+        if bus.get_hash() == record[2]:
+            continue
+        records.append(record)
+
+        addr, count = layout.tables[id(bus)]
+        if bus.get_child_count() != count:
+            return None
+        data = _pack_record(bus.get_component())
+        if rom[addr:addr + RECORD_LENGTH] != data:
+            addresses.append((addr, data))
+
+        for pos in range(count):
+            entity = bus.get_child_from_index(pos)
+            record = layout.records.get(id(entity))
+            #The same entity must be in the same place
+            if record is None or record[0] is not entity or \
+                    record[1] != addr + (pos + 1) * RECORD_LENGTH:
+                return None
+            if entity.get_hash() == record[2]:
+                continue
+            if isinstance(entity, SOMBus):
+                #The bridge and the table of the sub bus
+                data = _pack_record(entity.get_component(), layout.tables[id(entity)][0])
+                stack.append(entity)
+            else:
+                records.append(record)
+                data = _pack_record(entity.get_component())
+            if rom[record[1]:record[1] + RECORD_LENGTH] != data:
+                addresses.append((record[1], data))
+    return records, addresses
+
+def _hash_records(tables, rom):
+    """Hash the records of the entities that are not buses straight from the
+    ROM, the same as SOMComponent.get_hash"""
+    for bus, addr in tables:
+        for pos in range(bus.get_child_count()):
+            entity = bus.get_child_from_index(pos)
+            if entity.hash is not None or isinstance(entity, SOMBus):
+                continue
+            start = addr + (pos + 1) * RECORD_LENGTH
+            digest = hashlib.sha1(b"R")
+            digest.update(rom[start:start + RECORD_LENGTH])
+            entity.hash = digest.digest()
+
+def _pack_record(component, bridge_child_addr = None):
+    data = bytearray(RECORD_LENGTH)
+    pack_record(component, data, 0, bridge_child_addr)
+    return data
+
+def _get_word_ranges(addresses):
+    """Merge the addresses of the records into ranges of ROM words"""
+    ranges = []
+    for addr in sorted(addresses):
+        start = addr // ROM_WORD_SIZE
+        end = (addr + RECORD_LENGTH) // ROM_WORD_SIZE
+        if len(ranges) > 0 and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
 
-    _generate_interconnect_rom(bus.get_component(), rom, addr)
+def _bus_to_rom(bus, rom, addr, offsets):
+    """
+    Write the table of a bus, starting with the actual interconnect and then
+    all the way through the final device, a sub bus is represented by a
+    bridge that points to the table of the sub bus
+    """
+    pack_record(bus.get_component(), rom, addr)
     addr += RECORD_LENGTH
 
-    pos = 0
-    for entity in bus:
+    for pos in range(bus.get_child_count()):
+        entity = bus.get_child_from_index(pos)
         #print "At position: %d" % pos
-        pos += 1
         if isinstance(entity, SOMBus):
-            _generate_bridge_rom(entity.get_component(), rom, addr)
-            _bus_to_rom(entity, rom, len(rom))
+            pack_record(entity.get_component(), rom, addr, offsets[id(entity)])
         else:
-            _generate_entity_rom(entity.get_component(), rom, addr)
+            pack_record(entity.get_component(), rom, addr)
 
         addr += RECORD_LENGTH
-    return rom
-
-def _generate_entity_rom(entity, rom, addr):
-    """
-    Call this function with anything besides a bridge or an interconnect
-    """
-    if entity.is_device():
-        _generate_device_rom(entity, rom, addr)
-    elif entity.is_integration_record():
-        _generate_integration_rom(entity, rom, addr)
-    elif entity.is_url_record():
-        _generate_url_rom(entity, rom, addr)
-    elif entity.is_synthesis_record():
-        _generate_synthesis_rom(entity, rom, addr)
-
-def _generate_bridge_rom(entity, rom, addr):
-    _generate_product_rom(entity, rom, addr)
-    _generate_component_rom(entity, rom, addr)
-
-    offset = len(rom) / 8
-    #addr = entity.get_bridge_child_addr_as_int()
-    #print "Address: 0x%016X" % addr
-    rom[addr + 0x00] = (offset >> 56) & 0xFF
-    rom[addr + 0x01] = (offset >> 48) & 0xFF
-    rom[addr + 0x02] = (offset >> 40) & 0xFF
-    rom[addr + 0x03] = (offset >> 32) & 0xFF
-    rom[addr + 0x04] = (offset >> 24) & 0xFF
-    rom[addr + 0x05] = (offset >> 16) & 0xFF
-    rom[addr + 0x06] = (offset >> 8 ) & 0xFF
-    rom[addr + 0x07] = (offset >> 0 ) & 0xFF
-    rom[addr + RECORD_LENGTH - 1] = sdb_component.SDB_RECORD_TYPE_BRIDGE
-
-def _generate_interconnect_rom(entity, rom, addr):
-    _generate_product_rom(entity, rom, addr)
-    _generate_component_rom(entity, rom, addr)
-    rom[addr + 0x00] = (SDB_INTERCONNECT_MAGIC >> 24) & 0xFF
-    rom[addr + 0x01] = (SDB_INTERCONNECT_MAGIC >> 16) & 0xFF
-    rom[addr + 0x02] = (SDB_INTERCONNECT_MAGIC >> 8 ) & 0xFF
-    rom[addr + 0x03] = (SDB_INTERCONNECT_MAGIC >> 0 ) & 0xFF
-
-    nrecs = entity.get_number_of_records_as_int()
-    rom[addr + 0x04] = (nrecs >> 8) & 0xFF
-    rom[addr + 0x05] = (nrecs >> 0) & 0xFF
-
-    version = entity.get_version_as_int()
-    rom[addr + 0x06] = version & 0xFF
-
-    bus_type = entity.get_bus_type_as_int()
-    rom[addr + 0x07] = bus_type & 0xFF
-    rom[addr + RECORD_LENGTH - 1] = entity.get_module_record_type()
-
-def _generate_device_rom(entity, rom, addr):
-    _generate_product_rom(entity, rom, addr)
-    _generate_component_rom(entity, rom, addr)
-
-    #ABI Class
-    abi_class = entity.get_abi_class_as_int()
-    rom[addr + 0x00] = (abi_class >> 8) & 0xFF
-    rom[addr + 0x01] = (abi_class) & 0xFF
-
-    #abi version major
-    abi_major = entity.get_abi_version_major_as_int()
-    rom[addr + 0x02] = (abi_major & 0xFF)
-
-    #ABI version minor
-    abi_minor = entity.get_abi_version_minor_as_int()
-    rom[addr + 0x03] = (abi_minor & 0xFF)
-
-    #Bus Specific Stuff
-    endian = entity.get_endian_as_int()
-    bus_width = entity._translate_buf_width_to_rom_version()
-    executable = 0
-    writeable = 0
-    readable = 0
-
-    if entity.is_executable():
-        executable = 1
-    if entity.is_writeable():
-        writeable = 1
-    if entity.is_readable():
-        readable = 1
-
-    #print "executable: %s" % str(executable)
-    #print "writeable: %s" % str(writeable)
-    #print "readable: %s" % str(readable)
-
-    rom[addr + 0x04] = 0
-    rom[addr + 0x05] = 0
-    rom[addr + 0x06] = bus_width
-    rom[addr + 0x07] = (endian << 4 | executable << 2 | writeable << 1 | readable)
-
-    rom[addr + RECORD_LENGTH - 1] = entity.get_module_record_type()
-
-def _generate_integration_rom(entity, rom, addr):
-    for i in range(0x1F):
-        rom[addr + i] = 0x00
-    _generate_product_rom(entity, rom, addr)
-    rom[addr + RECORD_LENGTH - 1] = entity.get_module_record_type()
-
-def _generate_url_rom(entity, rom, addr):
-    url = entity.get_url()
-    _string_to_rom(url, RECORD_LENGTH - 1, rom, addr)
-    rom[addr + RECORD_LENGTH - 1] = entity.get_module_record_type()
-
-def _generate_synthesis_rom(entity, rom, addr):
-
-    _string_to_rom(entity.get_synthesis_name(),           16, rom, addr)
-    _string_to_rom(entity.get_synthesis_commit_id(),      16, rom, addr + 0x10)
-    _string_to_rom(entity.get_synthesis_tool_name(),       8, rom, addr + 0x20)
-    _string_to_rom(entity.get_synthesis_tool_version(),    8, rom, addr + 0x28)
-    #Date
-    year, month, day = entity.get_date_as_int()
-    rom[addr + 0x2C] = int(year   / 100)
-    rom[addr + 0x2D] = int(year   % 100)
-    rom[addr + 0x2E] = (month       )
-    rom[addr + 0x2F] = (day         )
-    name = entity.get_name()
-    if len(name) > 19:
-        name = name[:19]
-    _string_to_rom(name,                                  15, rom, addr + 0x30)
-    rom[addr + RECORD_LENGTH - 1] = entity.get_module_record_type()
-
-def _generate_product_rom(entity, rom, addr):
-
-    #Vendor ID
-    vendor_id = entity.get_vendor_id_as_int()
-    rom[addr + 0x18] = (vendor_id >> 56) & 0xFF
-    rom[addr + 0x19] = (vendor_id >> 48) & 0xFF
-    rom[addr + 0x1A] = (vendor_id >> 40) & 0xFF
-    rom[addr + 0x1B] = (vendor_id >> 32) & 0xFF
-    rom[addr + 0x1C] = (vendor_id >> 24) & 0xFF
-    rom[addr + 0x1D] = (vendor_id >> 16) & 0xFF
-    rom[addr + 0x1E] = (vendor_id >> 8 ) & 0xFF
-    rom[addr + 0x1F] = (vendor_id >> 0 ) & 0xFF
-
-    #Device ID
-    device_id = entity.get_device_id_as_int()
-    rom[addr + 0x20] = (device_id >> 24) & 0xFF
-    rom[addr + 0x21] = (device_id >> 16) & 0xFF
-    rom[addr + 0x22] = (device_id >>  8) & 0xFF
-    rom[addr + 0x23] = (device_id >>  0) & 0xFF
-
-    #Version
-    version = entity.get_core_version_as_int()
-    rom[addr + 0x24] = (version >> 24) & 0xFF
-    rom[addr + 0x25] = (version >> 16) & 0xFF
-    rom[addr + 0x26] = (version >>  8) & 0xFF
-    rom[addr + 0x27] = (version >>  0) & 0xFF
-
-    #Date
-    year, month, day = entity.get_date_as_int()
-    rom[addr + 0x28] = int(year   / 100)
-    rom[addr + 0x29] = int(year   % 100)
-    rom[addr + 0x2A] = (month       )
-    rom[addr + 0x2B] = (day         )
-
-    #Name
-    name = entity.get_name()
-    if len(name) > 19:
-        name = name[:19]
-    _string_to_rom(name, 19, rom, addr + 0x2C)
-
-def _generate_component_rom(entity, rom, addr):
-    address_first = Array('B')
-    address_last = Array('B')
-    start_address = entity.get_start_address_as_int()
-    end_address = entity.get_end_address_as_int()
-    for i in range (0, RECORD_LENGTH, 8):
-        address_first.append((start_address >> (56 - i) & 0xFF))
-        address_last.append((end_address >> (56 - i) & 0xFF))
-
-    rom[addr + 0x08] = address_first[0]
-    rom[addr + 0x09] = address_first[1]
-    rom[addr + 0x0A] = address_first[2]
-    rom[addr + 0x0B] = address_first[3]
-    rom[addr + 0x0C] = address_first[4]
-    rom[addr + 0x0D] = address_first[5]
-    rom[addr + 0x0E] = address_first[6]
-    rom[addr + 0x0F] = address_first[7]
-
-    rom[addr + 0x10] = address_last[0]
-    rom[addr + 0x11] = address_last[1]
-    rom[addr + 0x12] = address_last[2]
-    rom[addr + 0x13] = address_last[3]
-    rom[addr + 0x14] = address_last[4]
-    rom[addr + 0x15] = address_last[5]
-    rom[addr + 0x16] = address_last[6]
-    rom[addr + 0x17] = address_last[7]
-
-def _string_to_rom(s, max_length, rom, addr):
-    if len(s) > max_length:
-        s = s[:max_length]
-    s  = Array('B', s)
-
-    for i in range(len(s)):
-        rom[addr + i] = s[i]
 
+    #Put in a marker for an empty buffer
+    SDB_EMPTY_RECORD.pack_into(rom, addr, SDB_RECORD_TYPE_EMPTY)
@@ -18,67 +18,262 @@
 from __future__ import absolute_import, division, print_function
 
 import sys
-from array import array as Array
-from sdb_component import SDBComponent as sdbc
-import sdb_component
-
-from sdb_object_model import SOM
-from sdb_object_model import SOMBus
+import hashlib
+import mmap
+import struct
+from .sdb_component import SDBComponent as sdbc
+from . import sdb_component
+
+from .sdb_object_model import SOM
+from .sdb_object_model import SOMBus
+from .sdb_object_model import SOMComponent
+
+from .sdb_core import SDBInfo
+from .sdb_core import SDBWarning
+from .sdb_core import SDBError
+
+from .sdb_component import STRING_TYPES
+from .sdb_component import SDB_INTERCONNECT_MAGIC
+from .sdb_component import SDB_ROM_RECORD_LENGTH as RECORD_LENGTH
+from .sdb_component import SDB_RECORD_TYPE_INTERCONNECT
+from .sdb_component import SDB_RECORD_TYPE_DEVICE
+from .sdb_component import SDB_RECORD_TYPE_BRIDGE
+from .sdb_component import SDB_RECORD_TYPE_INTEGRATION
+from .sdb_component import SDB_RECORD_TYPE_REPO_URL
+from .sdb_component import SDB_RECORD_TYPE_SYNTHESIS
+from .sdb_component import SDB_RECORD_TYPE_EMPTY
+from .sdb_component import SDB_BUS_TYPE_WISHBONE
+from .sdb_component import SDB_BUS_TYPE_STORAGE
+from .sdb_component import SDB_ENDIAN_BIG
+from .sdb_component import SDB_ENDIAN_LITTLE
+from .sdb_component import SDB_INTERCONNECT_RECORD
+from .sdb_component import SDB_DEVICE_RECORD
+from .sdb_component import SDB_BRIDGE_RECORD
+from .sdb_component import SDB_REPO_URL_RECORD
+from .sdb_component import SDB_SYNTHESIS_RECORD
+
+
+
+#The integration record does not define a component portion but the first
+#and last address are still read from it
+_INTEGRATION_RECORD = struct.Struct(">8x" "QQ" "QII4B19s" "B")
+_MAGIC              = struct.Struct(">I")
+_RECORD_TYPE        = struct.Struct(">63xB")
+_BRIDGE_CHILD_ADDR  = struct.Struct(">Q")
+_ADDRESS_RANGE      = struct.Struct(">8xQQ")
+
+_RECORD_TYPES = (SDB_RECORD_TYPE_DEVICE,
+                 SDB_RECORD_TYPE_BRIDGE,
+                 SDB_RECORD_TYPE_INTEGRATION,
+                 SDB_RECORD_TYPE_REPO_URL,
+                 SDB_RECORD_TYPE_SYNTHESIS,
+                 SDB_RECORD_TYPE_EMPTY)
+
+_ADDRESSED_RECORD_TYPES = (SDB_RECORD_TYPE_DEVICE,
+                           SDB_RECORD_TYPE_BRIDGE,
+                           SDB_RECORD_TYPE_INTEGRATION)
+
+class LazySOMComponent(SOMComponent):
+    """
+    SOMComponent that decodes its SDBComponent from the ROM the first time
+    the component is used
+    """
 
-from sdb_core import SDBInfo
-from sdb_core import SDBWarning
-from sdb_core import SDBError
+    def __init__(self, parent, rom, addr, record_type):
+        self.rom = rom
+        self.addr = addr
+        self.record_type = record_type
+        super(LazySOMComponent, self).__init__(parent, None)
+
+    @property
+    def c(self):
+        if self._c is None:
+            self._c = parse_rom_element(self.rom, self.addr)
+            self._c.set_owner(self)
+            self.rom = None
+        return self._c
+
+    @c.setter
+    def c(self, c):
+        self._set_component(c)
+
+    def get_hash(self):
+        if self.hash is None and self._c is None:
+            #The same as hashing the decoded component but without decoding it
+            digest = hashlib.sha1(b"R")
+            digest.update(self.rom[self.addr:self.addr + RECORD_LENGTH])
+            self.hash = digest.digest()
+        return super(LazySOMComponent, self).get_hash()
+
+    def get_record_type(self):
+        #Available without decoding the record
+        if self._c is not None:
+            return self._c.get_module_record_type()
+        return self.record_type
+
+    def is_decoded(self):
+        """
+        Returns True if the component has been decoded from the ROM
+
+        Args:
+            Nothing
+
+        Returns (boolean):
+            True: The component has been decoded
+            False: The component is still in the ROM
+
+        Raises:
+            Nothing
+        """
+        return self._c is not None
+
+#Number of hex characters to collect before converting them to bytes
+HEX_CHUNK_SIZE = 64 * 1024
 
-from sdb_component import SDB_INTERCONNECT_MAGIC
-from sdb_component import SDB_ROM_RECORD_LENGTH as RECORD_LENGTH
-from sdb_component import SDB_RECORD_TYPE_INTERCONNECT
-from sdb_component import SDB_RECORD_TYPE_DEVICE
-from sdb_component import SDB_RECORD_TYPE_BRIDGE
-from sdb_component import SDB_RECORD_TYPE_INTEGRATION
-from sdb_component import SDB_RECORD_TYPE_REPO_URL
-from sdb_component import SDB_RECORD_TYPE_SYNTHESIS
-from sdb_component import SDB_RECORD_TYPE_EMPTY
+#Public Facing Functions
+def parse_rom_image(rom, lazy = False):
+    """
+    Parse a ROM image into an SOM
 
+    In lazy mode only the interconnect records are decoded, every other
+    record is decoded the first time its component is used. The SOM keeps
+    a reference to the ROM so an mmap must stay open while the SOM is used
 
+    Args:
+        rom (buffer, string or file): ROM image, either a binary buffer
+            (bytes, bytearray, memoryview, mmap or array), a string
+            containing a hex dump or a file object to read a hex dump from
+        lazy (boolean): decode the records when they are first used
 
-def read_and_strip (rom, start, end):
-    data = rom[start:end]
-    if sys.version_info > (3,):
-        #print ("Before: %s" % data)
-        data = data.tobytes()
-        #print ("string: %s" % data)
-        data = data.strip(b'\x00').decode('utf-8')
-    else:
-        data = data.tostring().strip("\0")
-    return data
+    Returns (SOM):
+        SDB Object Model described by the ROM
 
-#Public Facing Functions
-def parse_rom_image(rom):
-    if isinstance(rom, str):
-        lines = rom.splitlines()
-        buf = ""
-        for line in lines:
-            buf += line
-        rom = Array('B')
-        for i in range(0, len(buf), 2):
-            rom.append(int(buf[i:i + 2], 16))
+    Raises:
+        SDBError: the ROM is not a valid SDB image
+    """
+    if isinstance(rom, STRING_TYPES):
+        rom = read_hex_rom(rom.splitlines())
+    elif hasattr(rom, "read") and not isinstance(rom, mmap.mmap):
+        rom = read_hex_rom(rom)
 
+    if lazy:
+        return _index_bus(None, None, rom, addr = 0)
     return _parse_bus(None, None, rom, addr = 0)
 
+def read_hex_rom(lines):
+    """
+    Convert a hex dump of a ROM into bytes
+
+    A file object is read HEX_CHUNK_SIZE characters at a time so it can be
+    passed in directly. Whitespace is ignored, as is anything following a
+    '//' on a line, so commented dumps can be read
+
+    Args:
+        lines (iterable): lines of hex text (a file object or a list)
+
+    Returns (bytearray):
+        ROM image
+
+    Raises:
+        SDBError: the dump contains something other than hex digits
+    """
+    rom = bytearray()
+    carry = ""
+    held = ""
+    in_comment = False
+    for block in _iter_hex_blocks(lines):
+        block = held + block
+        held = ""
+        #A comment may start across the end of the block, the last line is
+        #finished with the next block
+        end = block.rfind("\n") + 1
+        if "/" in block[end:]:
+            held = block[end:]
+            block = block[:end]
+        block, in_comment = _strip_hex_comments(block, in_comment)
+        carry = _extend_hex(rom, carry + block)
+
+    block, in_comment = _strip_hex_comments(held, in_comment)
+    if _extend_hex(rom, carry + block):
+        raise SDBError("Hex dump contains an odd number of digits")
+    return rom
+
 #Private Facing Functions
 def _parse_bus(som, bus, rom, addr):
-    """Recursive function used to parse a bus,
-    when a sub bus is found then parse that bus
+    """Parse a bus and all the buses underneath it, when a bridge is found
+    the sub bus is put on a stack to be parsed after the current bus so
+    there is no limit on the depth of the buses
     """
 
     #This first element is a Known interconnect
-    num_devices = 0
     if bus is None:
         #This is the top element
         som = SOM(auto_address = False)
         som.initialize_root()
         bus = som.get_root()
 
+    #Lay out the buses once after all of the entities are parsed
+    with som.batch():
+        pending = [(bus, addr)]
+        parsed = set()
+        while len(pending) > 0:
+            bus, addr = pending.pop()
+            entity = _parse_interconnect(rom, addr, parsed)
+            num_devices = entity.get_number_of_records_as_int()
+            #print "entity: %s" % entity
+            #Keep the size from the ROM so validate can find children that
+            #do not fit
+            bus.set_fixed_size(entity.get_size_as_int())
+            som.set_bus_component(bus, entity)
+
+            #print "Number of entities to parse: %d" % num_devices
+            #Get the spacing and size of each device for calculating spacing
+            entity_size = []
+            entity_addr_start = []
+            #Add 1 to the number of devices so we account for the empty
+            for i in range(1, (num_devices + 1)):
+                #print "Working on %d" % i
+                I = (i * RECORD_LENGTH) + addr
+                entity = parse_rom_element(rom, I)
+
+                #Gather spacing data to analyze later
+                end = entity.get_end_address_as_int()
+                start = entity.get_start_address_as_int()
+
+                entity_addr_start.append(start)
+                entity_size.append(end - start)
+
+                if entity.is_bridge():
+                    #print "Found a bus: %s" % entity.get_name()
+                    #print "start: 0x%08X" % start
+                    sub_bus = som.insert_bus(root = bus,
+                                             name = entity.get_name())
+
+                    #print "Bridge address: 0x%08X" % entity.get_bridge_address_as_int()
+                    #Set address as 2 X higher because SDB is using a 64 bit bus, but
+                    #ROM in FPGA is only 32 bits
+                    pending.append((sub_bus, entity.get_bridge_address_as_int() * 8))
+                else:
+                    #print "Found a non bus: %s" % entity.get_name()
+                    som.insert_component(root = bus,
+                                         component = entity)
+
+            spacing = _get_spacing(entity_addr_start, entity_size)
+
+            #print "\tspacing for %s: 0x%08X" % (bus.get_name(), spacing)
+            #bus.set_child_spacing(spacing)
+            som.set_child_spacing(bus, spacing)
+    return som
+
+def _parse_interconnect(rom, addr, parsed):
+    """Decode the interconnect record at the start of a bus, 'parsed' is the
+    set of the addresses of all the buses parsed so far, a bridge that
+    points back to one of them would never finish
+    """
+    if addr in parsed:
+        raise SDBError("Bus @ 0x%08X is referenced by more than one bridge" % addr)
+    parsed.add(addr)
+
     #print "Address: 0x%02X" % addr
     try:
         entity = parse_rom_element(rom, addr)
@@ -88,46 +283,115 @@ def _parse_bus(som, bus, rom, addr):
 
     if not entity.is_interconnect():
         raise SDBError("Rom data does not point to an interconnect")
-    num_devices = entity.get_number_of_records_as_int()
-    #print "entity: %s" % entity
-    som.set_bus_component(bus, entity)
-
-    #print "Number of entities to parse: %d" % num_devices
-    #Get the spacing and size of each device for calculating spacing
-    entity_size = []
-    entity_addr_start = []
-    #Add 1 to the number of devices so we account for the empty
-    for i in range(1, (num_devices + 1)):
-        #print "Working on %d" % i
-        I = (i * RECORD_LENGTH) + addr
-        entity = parse_rom_element(rom, I)
-
-        #Gather spacing data to analyze later
-        end = entity.get_end_address_as_int()
-        start = entity.get_start_address_as_int()
-
-        entity_addr_start.append(start)
-        entity_size.append(end - start)
-
-        if entity.is_bridge():
-            #print "Found a bus: %s" % entity.get_name()
-            #print "start: 0x%08X" % start
-            sub_bus = som.insert_bus(root = bus,
-                                     name = entity.get_name())
-
-            #print "Bridge address: 0x%08X" % entity.get_bridge_address_as_int()
-            #Set address as 2 X higher because SDB is using a 64 bit bus, but
-            #ROM in FPGA is only 32 bits
-            _parse_bus(som, sub_bus, rom, entity.get_bridge_address_as_int() * 8)
-        else:
-            #print "Found a non bus: %s" % entity.get_name()
-            som.insert_component(root = bus,
-                                 component = entity)
+    return entity
 
+def _strip_hex_comments(block, in_comment):
+    """Remove the comments and whitespace from a block of a hex dump, returns
+    the hex digits and whether the block ends within a comment
+    """
+    if in_comment or "//" in block:
+        parts = block.split("\n")
+        for i in range(len(parts)):
+            if i > 0:
+                in_comment = False
+            if in_comment:
+                parts[i] = ""
+            elif "//" in parts[i]:
+                parts[i] = parts[i].split("//", 1)[0]
+                in_comment = True
+        block = "\n".join(parts)
+    return "".join(block.split()), in_comment
+
+def _iter_hex_blocks(lines):
+    """Yield the text of a hex dump in blocks, the lines of a list are
+    joined into blocks of about HEX_CHUNK_SIZE characters
+    """
+    if hasattr(lines, "read"):
+        while True:
+            block = lines.read(HEX_CHUNK_SIZE)
+            if not block:
+                break
+            if isinstance(block, bytes) and not isinstance(block, str):
+                block = block.decode("ascii", "replace")
+            yield block
+        return
+
+    block = []
+    block_size = 0
+    for line in lines:
+        if isinstance(line, bytes) and not isinstance(line, str):
+            line = line.decode("ascii", "replace")
+        block.append(line)
+        block_size += len(line)
+        if block_size >= HEX_CHUNK_SIZE:
+            yield "\n".join(block) + "\n"
+            block = []
+            block_size = 0
+    yield "\n".join(block) + "\n"
+
+def _extend_hex(rom, data):
+    """
+    Append the bytes described by 'data' to 'rom', a trailing half byte is
+    returned to be prepended to the next chunk
+    """
+    carry = data[len(data) - (len(data) % 2):]
+    try:
+        rom.extend(bytearray.fromhex(data[:len(data) - len(carry)]))
+    except ValueError as e:
+        raise SDBError("Hex dump contains invalid data: %s" % str(e))
+    return carry
+
+def _index_bus(som, bus, rom, addr):
+    """Lazy version of _parse_bus, the interconnect of every bus is decoded
+    but all other records are only indexed. The size and number of records
+    of a bus come from its interconnect so the buses are not laid out
+    """
+    if bus is None:
+        som = SOM(auto_address = False)
+        som.initialize_root()
+        bus = som.get_root()
+
+    pending = [(bus, addr)]
+    parsed = set()
+    while len(pending) > 0:
+        bus, addr = pending.pop()
+        entity = _parse_interconnect(rom, addr, parsed)
+        num_devices = entity.get_number_of_records_as_int()
+        bus.set_fixed_size(entity.get_size_as_int())
+        bus.c = entity
+
+        entity_size = []
+        entity_addr_start = []
+        for i in range(1, (num_devices + 1)):
+            I = (i * RECORD_LENGTH) + addr
+            record_type = _get_record_type(rom, I)
+
+            #Informative records do not have an address range
+            start = 0
+            end = 0
+            if record_type in _ADDRESSED_RECORD_TYPES:
+                start, end = _ADDRESS_RANGE.unpack_from(rom, I)
+            entity_addr_start.append(start)
+            entity_size.append(end - start)
+
+            if record_type == SDB_RECORD_TYPE_BRIDGE:
+                sub_bus = SOMBus(bus)
+                bus.insert_child(sub_bus)
+                pending.append((sub_bus, _BRIDGE_CHILD_ADDR.unpack_from(rom, I)[0] * 8))
+            else:
+                bus.insert_child(LazySOMComponent(bus, rom, I, record_type))
+
+        bus.set_child_spacing(_get_spacing(entity_addr_start, entity_size))
+    return som
+
+def _get_spacing(entity_addr_start, entity_size):
+    """Find the spacing between the children of a bus from their start
+    addresses and sizes
+    """
     spacing = 0
     prev_start = None
     prev_size = None
-    for i in range(num_devices):
+    for i in range(len(entity_size)):
         #print "i: %d" % i
         size = entity_size[i]
         start_addr = entity_addr_start[i]
@@ -150,172 +414,166 @@ def _parse_bus(som, bus, rom, addr):
 
         prev_size = size
         prev_start = start_addr
+    return spacing
 
-    #print "\tspacing for %s: 0x%08X" % (bus.get_name(), spacing)
-    #bus.set_child_spacing(spacing)
-    som.set_child_spacing(bus, spacing)
-    return som
+def _get_record_type(rom, addr):
+    try:
+        record_type = _RECORD_TYPE.unpack_from(rom, addr)[0]
+    except struct.error:
+        raise SDBError("Rom is too short for a record @ addr 0x%04X" % addr)
+    if record_type not in _RECORD_TYPES:
+        data = " ".join(["0x%02X" % i for i in bytearray(rom[addr:addr + RECORD_LENGTH])])
+        raise SDBError("Info: Unrecognized Record @ addr 0x%04X (record: 0x%02X)\nFull element: %s" % (addr, record_type, data))
+    return record_type
 
 #ROM -> SDB
 def parse_rom_element(rom, addr = 0, debug = False):
+    """
+    Decode the 64 byte record at 'addr' into an SDBComponent
+
+    The record is decoded in place with 'struct.unpack_from' so 'rom' can
+    be anything that supports the buffer protocol (bytes, bytearray,
+    memoryview, mmap or array)
+
+    Args:
+        rom (buffer): ROM image
+        addr (integer): byte offset of the record within the ROM
+
+    Returns (SDBComponent):
+        Component described by the record
+
+    Raises:
+        SDBError: the record is truncated or of an unknown type
+    """
     entity = sdbc()
-    possible_magic = rom[addr + 0] << 24 | \
-                     rom[addr + 1] << 16 | \
-                     rom[addr + 2] <<  8 | \
-                     rom[addr + 3] <<  0
+    try:
+        possible_magic = _MAGIC.unpack_from(rom, addr)[0]
+        record_type = _RECORD_TYPE.unpack_from(rom, addr)[0]
+    except struct.error:
+        raise SDBError("Rom is too short for a record @ addr 0x%04X" % addr)
 
     if (possible_magic == SDB_INTERCONNECT_MAGIC):
         #if debug: print "Found Interconnect!"
         _parse_rom_interconnect_element(entity, rom, addr, debug)
-        entity.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_INTERCONNECT
-    elif rom[addr + 63] == SDB_RECORD_TYPE_DEVICE:
+        entity.set_record_type(SDB_RECORD_TYPE_INTERCONNECT)
+    elif record_type == SDB_RECORD_TYPE_DEVICE:
         _parse_rom_device_element(entity, rom, addr, debug)
-        entity.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_DEVICE
-    elif rom[addr + 63] == SDB_RECORD_TYPE_BRIDGE:
+        entity.set_record_type(SDB_RECORD_TYPE_DEVICE)
+    elif record_type == SDB_RECORD_TYPE_BRIDGE:
         _parse_rom_bridge_element(entity, rom, addr, debug)
-        entity.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_BRIDGE
-    elif rom[addr + 63] == SDB_RECORD_TYPE_INTEGRATION:
+        entity.set_record_type(SDB_RECORD_TYPE_BRIDGE)
+    elif record_type == SDB_RECORD_TYPE_INTEGRATION:
         _parse_integration_element(entity, rom, addr, debug)
-        entity.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_INTEGRATION
-    elif rom[addr + 63] == SDB_RECORD_TYPE_REPO_URL:
+        entity.set_record_type(SDB_RECORD_TYPE_INTEGRATION)
+    elif record_type == SDB_RECORD_TYPE_REPO_URL:
         _parse_repo_url_element(entity, rom, addr, debug)
-        entity.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_REPO_URL
-    elif rom[addr + 63] == SDB_RECORD_TYPE_SYNTHESIS:
+        entity.set_record_type(SDB_RECORD_TYPE_REPO_URL)
+    elif record_type == SDB_RECORD_TYPE_SYNTHESIS:
         _parse_synthesis_element(entity, rom, addr, debug)
-        entity.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_SYNTHESIS
-    elif rom[addr + 63] == SDB_RECORD_TYPE_EMPTY:
-        entity.d["SDB_RECORD_TYPE"] = SDB_RECORD_TYPE_EMPTY
+        entity.set_record_type(SDB_RECORD_TYPE_SYNTHESIS)
+    elif record_type == SDB_RECORD_TYPE_EMPTY:
+        entity.set_record_type(SDB_RECORD_TYPE_EMPTY)
     else:
-        data = " ".join(["0x%02X" % i for i in rom])
-        raise SDBError("Info: Unrecognized Record @ addr 0x%04X (record: 0x%02X)\nFull element: %s" % (addr, rom[addr + 63], data))
+        data = " ".join(["0x%02X" % i for i in bytearray(rom[addr:addr + RECORD_LENGTH])])
+        raise SDBError("Info: Unrecognized Record @ addr 0x%04X (record: 0x%02X)\nFull element: %s" % (addr, record_type, data))
     return entity
 
 def _parse_integration_element(entity, rom, addr, debug = False):
-    _parse_rom_component_element(entity, rom, addr, debug)
+    values = _INTEGRATION_RECORD.unpack_from(rom, addr)
+    _set_component_values(entity, values[0:2])
+    _set_product_values(entity, values[2:10])
 
 def _parse_repo_url_element(entity, rom, addr, debug = False):
-    #entity.d["SDB_MODULE_URL"] = rom[addr:addr + RECORD_LENGTH - 1].tostring().strip("\0")
-    endity.d["SDB_MODULE_URL"] = read_and_string(rom, addr, addr + RECORD_LENGTH - 1)
+    url, record_type = SDB_REPO_URL_RECORD.unpack_from(rom, addr)
+    entity.set_url(_decode_string(url))
 
 def _parse_rom_device_element(entity, rom, addr, debug = False):
-    entity.d["SDB_ABI_CLASS"] = hex(  rom[addr + 0] <<  8 | \
-                                    rom[addr + 1] <<  0)
-    entity.d["SDB_ABI_VERSION_MAJOR"] = hex(rom[addr + 2])
-    entity.d["SDB_ABI_VERSION_MINOR"] = hex(rom[addr + 3])
-    bus_width = rom[addr + 6]
-    endian = (rom[addr + 7] >> 4) & 0x01
-    executable = (rom[addr + 7] >> 2) & 0x01
-    writeable = (rom[addr + 7] >> 1) & 0x01
-    readable = (rom[addr + 7] >> 0) & 0x01
-
-    if executable:
-        entity.d["SDB_EXECUTABLE"] = "True"
-    else:
-        entity.d["SDB_EXECUTABLE"] = "False"
-
-    if writeable:
-        entity.d["SDB_WRITEABLE"] = "True"
-    else:
-        entity.d["SDB_WRITEABLE"] = "False"
-
-    if readable:
-        entity.d["SDB_READABLE"] = "True"
-    else:
-        entity.d["SDB_READABLE"] = "False"
+    values = SDB_DEVICE_RECORD.unpack_from(rom, addr)
+    abi_class, version_major, version_minor, reserved, bus_width, flags = values[0:6]
+    entity.set_abi_class(abi_class)
+    entity.set_abi_version_major(version_major)
+    entity.set_abi_version_minor(version_minor)
+    endian = (flags >> 4) & 0x01
+    executable = (flags >> 2) & 0x01
+    writeable = (flags >> 1) & 0x01
+    readable = (flags >> 0) & 0x01
+
+    entity.enable_executable(executable == 1)
+    entity.enable_write(writeable == 1)
+    entity.enable_read(readable == 1)
 
     if endian:
-        entity.d["SDB_ABI_ENDIAN"] = "Little"
+        entity.set_endian(SDB_ENDIAN_LITTLE)
     else:
-        entity.d["SDB_ABI_ENDIAN"] = "Big"
+        entity.set_endian(SDB_ENDIAN_BIG)
 
     if (bus_width == 0):
-        entity.d["SDB_ABI_DEVICE_WIDTH"] = "8"
+        entity.set_bus_width(8)
     elif (bus_width == 1):
-        entity.d["SDB_ABI_DEVICE_WIDTH"] = "16"
+        entity.set_bus_width(16)
     elif (bus_width == 2):
-        entity.d["SDB_ABI_DEVICE_WIDTH"] = "32"
+        entity.set_bus_width(32)
     elif (bus_width == 3):
-        entity.d["SDB_ABI_DEVICE_WIDTH"] = "64"
-
-    if endian:
-        entity.d["SDB_ABI_ENDIAN"] = "Little"
-    else:
-        entity.d["SDB_ABI_ENDIAN"] = "Big"
+        entity.set_bus_width(64)
 
-    _parse_rom_component_element(entity, rom, addr, debug)
+    _set_component_values(entity, values[6:8])
+    _set_product_values(entity, values[8:16])
 
 def _parse_rom_bridge_element(entity, rom, addr, debug = False):
-    entity.d["SDB_BRIDGE_CHILD_ADDR"] = hex(_convert_rom_to_int(rom[addr +  0:addr + 8]))
-    _parse_rom_component_element(entity, rom, addr, debug)
-
+    values = SDB_BRIDGE_RECORD.unpack_from(rom, addr)
+    entity.set_bridge_child_addr(values[0])
+    _set_component_values(entity, values[1:3])
+    _set_product_values(entity, values[3:11])
 
 def _parse_rom_interconnect_element(entity, rom, addr, debug = False):
-    entity.d["SDB_NRECS"] = hex(rom[addr + 4] << 8 | \
-                              rom[addr + 5] << 0)
-    #if debug: print "Number of Records: %d" % entity.d["SDB_NRECS"]
-    entity.d["SDB_VERSION"] = rom[addr + 6]
-    if rom[addr + 7] == 0:
-        entity.d["SDB_BUS_TYPE"] = "wishbone"
-    elif rom[addr + 7] == 1:
-        entity.d["SDB_BUS_TYPE"] = "storage"
-    _parse_rom_component_element(entity, rom, addr, debug)
-    if rom[addr + 63] != 0x00:
-        raise SDBError("Interconnect element record does not match type: 0x%02X" % rom[addr + 63])
-
-def _parse_rom_component_element(entity, rom, addr, debug = False):
-    entity.d["SDB_START_ADDRESS"] =   hex(_convert_rom_to_int(rom[addr +  8: addr + 16]))
-    entity.d["SDB_LAST_ADDRESS"] =    hex(_convert_rom_to_int(rom[addr + 16: addr + 24]))
-
-    start_address = entity.get_start_address_as_int()
-    end_address = entity.get_end_address_as_int()
+    values = SDB_INTERCONNECT_RECORD.unpack_from(rom, addr)
+    magic, nrecs, version, bus_type = values[0:4]
+    entity.set_number_of_records(nrecs)
+    #if debug: print "Number of Records: %d" % entity.get_number_of_records_as_int()
+    entity.set_version(version)
+    if bus_type == 0:
+        entity.set_bus_type(SDB_BUS_TYPE_WISHBONE)
+    elif bus_type == 1:
+        entity.set_bus_type(SDB_BUS_TYPE_STORAGE)
+    _set_component_values(entity, values[4:6])
+    _set_product_values(entity, values[6:14])
+    if values[14] != 0x00:
+        raise SDBError("Interconnect element record does not match type: 0x%02X" % values[14])
+
+def _set_component_values(entity, values):
+    """
+    Populate an entity from the component portion of a record:
+        first address, last address
+    """
+    start_address, end_address = values
+    entity.set_start_address(start_address)
     entity.set_size(end_address - start_address)
-    _parse_rom_product_element(entity, rom, addr, debug)
-
-def _parse_rom_product_element(entity, rom, addr, debug = False):
-    entity.d["SDB_VENDOR_ID"] =       hex(_convert_rom_to_int(rom[addr + 24: addr + 32]))
-    entity.d["SDB_DEVICE_ID"] =       hex(_convert_rom_to_int(rom[addr + 32: addr + 36]))
-    core_version    =                 _convert_rom_to_int(rom[addr + 36: addr + 40])
-    core_version_string =             "%1d" % ((core_version >> 24) & 0x0F)
-    core_version_string +=            "."
-    core_version_string +=            "%1d" % ((core_version >> 16) & 0x0F)
-    core_version_string +=            "."
-    core_version_string +=            "%02d" % ((core_version) & 0xFF)
-    entity.d["SDB_CORE_VERSION"] =    core_version_string
-    date =                            _convert_rom_to_int(rom[addr + 40: addr + 44])
-    entity.d["SDB_DATE"] =            "%02d%02d/%02d/%02d" % (  date >> 24 & 0xFF,
-                                                                date >> 16 & 0xFF,
-                                                                date >> 8 & 0xFF,
-                                                                date & 0xFF)
-    #print "Date: %s" % entity.d["SDB_DATE"]
-    #entity.d["SDB_NAME"] =            rom[addr + 44:addr + 63].tostring().strip("\0")
-    entity.d["SDB_NAME"] =            read_and_strip(rom, addr + 44, addr + 63)
-
-def _parse_synthesis_element(entity, rom, addr, debug = False):
-    #entity.d["SDB_SYNTH_NAME"] =      rom[addr + 0x00:addr + 0x10].tostring().strip("\0")
-    entity.d["SDB_SYNTH_NAME"] =      read_and_strip(rom, addr + 0x00, addr + 0x10)
-    #entity.d["SDB_SYNTH_COMMIT_ID"] = rom[addr + 0x10:addr + 0x20].tostring().strip("\0")
-    entity.d["SDB_SYNTH_COMMIT_ID"] = read_and_strip(rom, addr + 0x10, addr + 0x20)
-    #entity.d["SDB_SYNTH_TOOL_NAME"] = rom[addr + 0x20:addr + 0x28].tostring().strip("\0")
-    entity.d["SDB_SYNTH_TOOL_NAME"] = read_and_strip(rom, addr + 0x20, addr + 0x28)
-    #entity.d["SDB_SYNTH_TOOL_VER"] =  rom[addr + 0x28:addr + 0x2C].tostring()
-    entity.d["SDB_SYNTH_TOOL_VER"] =  read_and_strip(rom, addr + 0x28, addr + 0x2C)
-    date =                            _convert_rom_to_int(rom[addr + 0x2C: addr + 0x30])
-    entity.d["SDB_DATE"] =            "%02d%02d/%02d/%02d" % (  date >> 24 & 0xFF,
-                                                                date >> 16 & 0xFF,
-                                                                date >> 8 & 0xFF,
-                                                                date & 0xFF)
-
-    #entity.d["SDB_DATE"]       =      rom[addr + 40:addr + 48].tostring()
-    #entity.d["SDB_SYNTH_USER_NAME"] = rom[addr + 0x30:addr + 0x3F].tostring().strip("\0")
-    entity.d["SDB_SYNTH_USER_NAME"] = read_and_strip(rom, addr + 0x30, addr + 0x3F)
-
-def _convert_rom_to_int(rom):
-    s = ""
-    val = 0
-    for i in range(len(rom)):
-        val = val << 8 | rom[i]
-        #print "val: 0x%016X" % val
-
-    return val
 
+def _set_product_values(entity, values):
+    """
+    Populate an entity from the product portion of a record:
+        vendor id, device id, version, date (4 bytes), name
+    """
+    vendor_id, device_id, core_version = values[0:3]
+    entity.set_vendor_id(vendor_id)
+    entity.set_device_id(device_id)
+    entity.set_core_version("%1d.%1d.%02d" % ((core_version >> 24) & 0x0F,
+                                              (core_version >> 16) & 0x0F,
+                                              (core_version) & 0xFF))
+    entity.set_date("%02d%02d/%02d/%02d" % values[3:7])
+    entity.set_name(_decode_string(values[7]))
 
+def _parse_synthesis_element(entity, rom, addr, debug = False):
+    values = SDB_SYNTHESIS_RECORD.unpack_from(rom, addr)
+    entity.set_synthesis_name(_decode_string(values[0]))
+    entity.set_synthesis_commit_id(_decode_string(values[1]))
+    entity.set_synthesis_tool_name(_decode_string(values[2]))
+    entity.set_synthesis_tool_version(_decode_string(values[3]))
+    entity.set_date("%02d%02d/%02d/%02d" % values[4:8])
+    entity.set_synthesis_user_name(_decode_string(values[8]))
+
+def _decode_string(data):
+    data = data.strip(b'\x00')
+    if sys.version_info > (3,):
+        data = data.decode('utf-8')
+    return data
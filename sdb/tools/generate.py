@@ -16,15 +16,19 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import io
 import os
 import sys
 import json
 import logging
 from collections import OrderedDict
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
-import sdb_object_model
-import sdb_component
+from .. import sdb_object_model
+from .. import sdb_component
+from .. import som_rom_generator
+from .. import som_rom_emitter
+from .. import som_rom_cache
+from ..sdb_core import SDBError
 
 NAME = "generate"
 SCRIPT_NAME = "sdb %s" % NAME
@@ -34,15 +38,24 @@ __author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
 DESCRIPTION = "Generate an SDB from a JSON configuration file"
 
 EPILOG = "Currently the only input format is json\n"       \
-         "Currently the only output format is a 32-bit hex ROM that can installed into a block RAM\n" \
+         "Output formats:\n" + \
+         "".join(["\t%-12s%s\n" % (oformat, som_rom_emitter.EMITTERS[oformat]["description"])
+                  for oformat in som_rom_emitter.EMITTERS]) + \
+         "\t%-12s%s\n" % ("som", "Description of the SDB Object Model") + \
          "Examples\n"\
          "Read in an SDB in a JSON format and generate a 32-bit ROM file\n" \
-         "\tsdb %s --format rom /path/to/json_config.json\n" % NAME
+         "\tsdb %s --oformat rom --output rom.txt /path/to/json_config.json\n" \
+         "Generate a Xilinx and an Altera ROM: build/sdb.coe and build/sdb.mif\n" \
+         "\tsdb %s --oformat coe mif --output build/sdb /path/to/json_config.json\n" % (NAME, NAME)
 
 def setup_parser(parser):
     parser.description = DESCRIPTION
     parser.add_argument("--iformat", type=str, nargs='*', default=["json"], help="Specify the configuration format (default: json)")
-    parser.add_argument("--oformat", type=str, nargs='*', default=["rom"], help="Specify the type of output to generate (default: rom)")
+    parser.add_argument("--oformat", type=str, nargs='*', default=["rom"], choices=list(som_rom_emitter.EMITTERS.keys()) + ["som"], help="Specify the type of output to generate (default: rom)")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Specify the output file, with more than one output format the extension of each format is added (default: stdout)")
+    parser.add_argument("--cache", type=str, default=None, help="Specify a directory used to cache generated ROMs")
+    parser.add_argument("--cache-size", type=int, default=som_rom_cache.DEFAULT_MAX_SIZE, help="Specify the maximum size of the ROM cache in bytes (default: %d)" % som_rom_cache.DEFAULT_MAX_SIZE)
+    parser.add_argument("--cache-exclude-date", action="store_true", help="Reuse cached ROMs that only differ by the date of the records")
     parser.add_argument("filename", type=str, nargs=1, help="Specify a file used to generate an SDB bus from a JSON file")
     return parser
 
@@ -51,15 +64,26 @@ def generate(args):
     filepath = args.filename[0]
     #If this fails, 
     try:
-        f = open(filepath, 'r')
-        s.debug("Opened File")
+        with open(filepath, 'rb') as f:
+            config = f.read()
+        s.debug("Read File")
     except IOError as err:
         print ("Filename: %s does not exists!" % filepath)
         sys.exit(0)
 
+    try:
+        _write_outputs(config, args)
+    except (ValueError, SDBError) as err:
+        #As an example a placeholder date (YYYY/MM/DD) can not be written to a ROM
+        print ("Failed to generate the SDB from %s:" % filepath)
+        print (str(err))
+        sys.exit(1)
+
+def _load_som(config):
+    s = logging.getLogger("sdb")
     sdb_dict = None
     try:
-        sdb_dict = json.load(f, object_pairs_hook = OrderedDict)
+        sdb_dict = json.loads(config.decode("utf-8"), object_pairs_hook = OrderedDict)
         s.debug("Loaded JSON File")
     except ValueError as err:
         print ("Detected an Error in the JSON Configuration file:")
@@ -67,77 +91,135 @@ def generate(args):
         sys.exit(0)
 
     #Now we have an SDB structure in the form of a Python dictionary
-    generate_som(sdb_dict)
+    return generate_som(sdb_dict)
+
+def _generate_rom(config, som, args):
+    """Returns the SOM (None if it was not needed) and the ROM, a ROM in the
+    cache is found by the contents of the configuration so the SOM is only
+    built when the ROM has to be generated
+    """
+    s = logging.getLogger("sdb")
+    cache = None
+    if args.cache is not None:
+        cache = som_rom_cache.ROMCache(args.cache,
+                                       max_size = args.cache_size,
+                                       include_date = not args.cache_exclude_date)
+        key = som_rom_generator.get_config_digest(config, cache.is_date_included())
+        rom = cache.get(key)
+        if rom is not None:
+            s.debug("Found the ROM in the cache")
+            return som, rom
+
+    if som is None:
+        som = _load_som(config)
+    rom = som_rom_generator.generate_rom_image(som)
+    if cache is not None:
+        cache.put(key, rom)
+    return som, rom
+
+def _write_outputs(config, args):
+    s = logging.getLogger("sdb")
+    som = None
+    rom = None
+    for oformat in args.oformat:
+        if oformat == "som":
+            if som is None:
+                som = _load_som(config)
+            som.pretty_print_sdb()
+            continue
+
+        if rom is None:
+            som, rom = _generate_rom(config, som, args)
+        binary = som_rom_emitter.is_binary_format(oformat)
+        if args.output is None:
+            stream = sys.stdout
+            if binary:
+                stream = getattr(sys.stdout, "buffer", sys.stdout)
+            som_rom_emitter.emit_rom(rom, oformat, stream)
+            continue
+
+        path = args.output
+        if len(args.oformat) > 1:
+            path += som_rom_emitter.get_format_extension(oformat)
+        if binary:
+            f = io.open(path, "wb")
+        else:
+            f = io.open(path, "w")
+        with f:
+            som_rom_emitter.emit_rom(rom, oformat, f)
+        s.debug("Wrote %s" % path)
 
 def _extract_data(som, root_bus, bus_dict):
-    if "interconnects" in bus_dict:
-        for bus in bus_dict["interconnects"]:
-            som_bus = som.insert_bus(root_bus, bus)
-            sub_dict = bus_dict["interconnects"][bus]
-            _extract_data(som, som_bus, sub_dict)
-
-    if "devices" in bus_dict:
-        for dev in bus_dict["devices"]:
-            #print ("dev index: %s" % str(dev))
-            component = sdb_component.create_device_record(name = dev)
-            c_dict = bus_dict["devices"][dev]
-            ###: XXX REALLY BAD PROGRAMMING PRACTICE, THIS NEEDS TO CHANGE!!
-            if "abi_class" in c_dict:
-                component.d["SDB_ABI_CLASS"] = c_dict["abi_class"]
+    #Lay out the SOM once after all the entities are added
+    with som.batch():
+        if "interconnects" in bus_dict:
+            for bus in bus_dict["interconnects"]:
+                som_bus = som.insert_bus(root_bus, bus)
+                sub_dict = bus_dict["interconnects"][bus]
+                _extract_data(som, som_bus, sub_dict)
+
+        if "devices" in bus_dict:
+            for dev in bus_dict["devices"]:
+                #print ("dev index: %s" % str(dev))
+                component = sdb_component.create_device_record(name = dev)
+                c_dict = bus_dict["devices"][dev]
+                ###: XXX REALLY BAD PROGRAMMING PRACTICE, THIS NEEDS TO CHANGE!!
+                if "abi_class" in c_dict:
+                    component.d["SDB_ABI_CLASS"] = c_dict["abi_class"]
         
-            if "abi_ver_major" in c_dict:
-                component.d["SDB_ABI_VERSION_MAJOR"] = hex(c_dict["abi_ver_major"])
+                if "abi_ver_major" in c_dict:
+                    component.set_abi_version_major(c_dict["abi_ver_major"])
         
-            if "abi_ver_minor" in c_dict:
-                component.d["SDB_ABI_VERSION_MINOR"] = hex(c_dict["abi_ver_minor"])
+                if "abi_ver_minor" in c_dict:
+                    component.set_abi_version_minor(c_dict["abi_ver_minor"])
         
-            if "version" in c_dict:
-                component.d["SDB_CORE_VERSION"] = c_dict["version"]
+                if "version" in c_dict:
+                    component.d["SDB_CORE_VERSION"] = c_dict["version"]
         
-            if "vendor_id" in c_dict:
-                component.d["SDB_VENDOR_ID"] = c_dict["vendor_id"]
+                if "vendor_id" in c_dict:
+                    component.d["SDB_VENDOR_ID"] = c_dict["vendor_id"]
         
-            if "component.d_id" in c_dict:
-                component.d["SDB_DEVICE_ID"] = c_dict["component.d_id"]
+                if "component.d_id" in c_dict:
+                    component.d["SDB_DEVICE_ID"] = c_dict["component.d_id"]
         
-            if "date" in c_dict:
-                component.d["SDB_DATE"] = c_dict["date"]
+                if "date" in c_dict:
+                    component.d["SDB_DATE"] = c_dict["date"]
         
-            if "version" in c_dict:
-                component.d["SDB_CORE_VERSION"] = c_dict["version"]
+                if "version" in c_dict:
+                    component.d["SDB_CORE_VERSION"] = c_dict["version"]
 
-            som.insert_component(root_bus, component)
-            if "size" in c_dict:
-                size = int(c_dict["size"], 0)
-                component.set_size(size)
+                som.insert_component(root_bus, component)
+                if "size" in c_dict:
+                    size = int(c_dict["size"], 0)
+                    component.set_size(size)
 
 
-    if "integration" in bus_dict:
-        for info in bus_dict["integration"]:
-            c_dict = bus_dict["integration"][info]
-            component = sdb_component.create_integration_record(information = info)
-            if "vendor_id" in c_dict:
-                component.d["SDB_VENDOR_ID"] = hex(int(c_dict["vendor_id"], 0))
+        if "integration" in bus_dict:
+            for info in bus_dict["integration"]:
+                c_dict = bus_dict["integration"][info]
+                component = sdb_component.create_integration_record(information = info)
+                if "vendor_id" in c_dict:
+                    component.set_vendor_id(int(c_dict["vendor_id"], 0))
         
-            if "device_id" in c_dict:
-                component.d["SDB_DEVICE_ID"] = hex(int(c_dict["device_id"], 0))
+                if "device_id" in c_dict:
+                    component.set_device_id(int(c_dict["device_id"], 0))
         
-            if "date" in c_dict:
-                component.d["SDB_DATE"] = c_dict["date"]
+                if "date" in c_dict:
+                    component.d["SDB_DATE"] = c_dict["date"]
+                som.insert_component(root_bus, component)
+
+        if "repo_url" in bus_dict:
+            component = sdb_component.create_repo_url_record(bus_dict["repo_url"])
             som.insert_component(root_bus, component)
 
-    if "repo_url" in bus_dict:
-        component = sdb_component.create_repo_url_record(bus_dict["repo_url"])
-        som.insert_component(root_bus, component)
-
-    if "synthesis" in bus_dict:
-        c_dict = bus_dict["synthesis"]
-        component = sdb_component.create_synthesis_record(synthesis_name = c_dict["syn_name"],
-                                commit_id = c_dict["commit_id"],
-                                tool_name = c_dict["tool_name"],
-                                tool_version = c_dict["tool_version"],
-                                user_name = c_dict["user_name"])
-        som.insert_component(root_bus, component)
+        if "synthesis" in bus_dict:
+            c_dict = bus_dict["synthesis"]
+            component = sdb_component.create_synthesis_record(synthesis_name = c_dict["syn_name"],
+                                    commit_id = c_dict["commit_id"],
+                                    tool_name = c_dict["tool_name"],
+                                    tool_version = c_dict["tool_version"],
+                                    user_name = c_dict["user_name"])
+            som.insert_component(root_bus, component)
  
 
 
@@ -153,6 +235,6 @@ def generate_som(sdb_dict):
     root = som.get_root()
     som.set_bus_name(root, root_name)
     _extract_data(som, root, sdb_dict[root_name])
-    som.pretty_print_sdb()
+    return som
 
 
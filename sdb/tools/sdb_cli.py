@@ -27,6 +27,7 @@ import sys
 #from completer_extractor import completer_extractor as ce
 from . import generate
 from . import sdb_viewer
+from . import sdb_diff
 
 __author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
 
@@ -57,6 +58,11 @@ TOOL_DICT = collections.OrderedDict([
         "type": "viewer",
         "module": sdb_viewer,
         "tool": sdb_viewer.view_sdb
+    }),
+    (sdb_diff.NAME,{
+        "type": "viewer",
+        "module": sdb_diff,
+        "tool": sdb_diff.diff_sdb
     })
 ])
 
@@ -0,0 +1,224 @@
+# this file is part of SDB.
+#
+# SDB is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# SDB is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with SDB.  If not, see <http://www.gnu.org/licenses/>
+
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import sys
+import json
+from collections import OrderedDict
+
+from ..som_rom_parser import parse_rom_image
+from ..sdb_core import SDBError
+from . import generate
+
+NAME = "diff"
+SCRIPT_NAME = "sdb %s" % NAME
+
+__author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
+
+DESCRIPTION = "compare the SDB of two ROM images or of a ROM image and a JSON configuration"
+
+EPILOG = "The inputs can be hex ROM files, binary ROM files (.bin) or JSON configuration files (.json)\n" \
+         "The exit status is 1 when the SDBs are different and 2 when a file is not a valid SDB\n" \
+         "Examples\n" \
+         "Compare the ROM of a deployed board with the ROM of a new build\n" \
+         "\tsdb %s deployed_rom.txt build/sdb.rom\n" % NAME
+
+ADDED = "added"
+REMOVED = "removed"
+MOVED = "moved"
+RESIZED = "resized"
+REVERSIONED = "re-versioned"
+CHANGED = "changed"
+
+#Elements that are reported as moved, resized or re-versioned or that follow
+#from added and removed entities, everything else is reported as changed
+_SEPARATE_ELEMENTS = ["SDB_START_ADDRESS",
+                      "SDB_LAST_ADDRESS",
+                      "SDB_SIZE",
+                      "SDB_CORE_VERSION",
+                      "SDB_ABI_VERSION_MAJOR",
+                      "SDB_ABI_VERSION_MINOR",
+                      "SDB_NRECS",
+                      "SDB_BRIDGE_CHILD_ADDR",
+                      "SDB_DATE"]
+
+
+def setup_parser(parser):
+    parser.description = DESCRIPTION
+    parser.epilog = EPILOG
+    parser.add_argument("filename",
+                        type=str,
+                        nargs=2,
+                        help="Specify the two files to compare")
+    return parser
+
+
+def diff_sdb(args):
+    try:
+        som = read_sdb_file(args.filename[0])
+        other = read_sdb_file(args.filename[1])
+        changes = diff_soms(som, other)
+    except (IOError, ValueError, SDBError) as err:
+        #A record that cannot be written to a ROM, such as a placeholder date
+        print ("Error: %s" % str(err))
+        sys.exit(2)
+    for change in changes:
+        print (format_change(change))
+    if len(changes) > 0:
+        sys.exit(1)
+    print ("SDBs are the same")
+    sys.exit(0)
+
+def read_sdb_file(filename):
+    """
+    Read an SDB from a ROM image or a JSON configuration
+
+    Args:
+        filename (string): .json configuration, .bin binary ROM image or a
+            hex ROM image
+
+    Return:
+        (SOM): the SDB, a ROM image is parsed lazily
+
+    Raises:
+        IOError: file does not exist
+        SDBError: the file is not a valid SDB
+    """
+    if not os.path.exists(filename):
+        raise IOError("File: %s does not exist!" % filename)
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".json":
+        with open(filename, 'r') as f:
+            try:
+                sdb_dict = json.load(f, object_pairs_hook = OrderedDict)
+            except ValueError as err:
+                raise SDBError("%s: %s" % (filename, str(err)))
+        return generate.generate_som(sdb_dict)
+
+    if extension == ".bin":
+        with open(filename, 'rb') as f:
+            return parse_rom_image(bytearray(f.read()), lazy = True)
+
+    with open(filename, 'r') as f:
+        return parse_rom_image(f, lazy = True)
+
+def diff_soms(som, other):
+    """
+    Compare two SOMs, the buses that are the same in both are skipped
+    using their hashes
+
+    A device that is removed from one bus and added to another with the
+    same vendor ID, device ID and name is reported as moved
+
+    Args:
+        som (SOM): original SDB
+        other (SOM): new SDB
+
+    Return:
+        (list of tuples): (kind, path, description) where kind is ADDED,
+            REMOVED, MOVED, RESIZED, REVERSIONED or CHANGED, an entity can
+            have more than one change
+
+    Raises:
+        Nothing
+    """
+    changes = []
+    removed = OrderedDict()
+    for path, entity, other_entity in som.diff(other):
+        if other_entity is None:
+            removed.setdefault(_get_identity(entity), []).append((path, entity))
+            changes.append((REMOVED, path, entity))
+        elif entity is None:
+            changes.append((ADDED, path, other_entity))
+        else:
+            changes.extend(_get_record_changes(path,
+                                               entity.get_component(),
+                                               other_entity.get_component()))
+
+    #Match the entities that moved to another bus
+    moved = set()
+    for i in range(len(changes)):
+        kind, path, entity = changes[i]
+        if kind != ADDED:
+            continue
+        candidates = removed.get(_get_identity(entity))
+        if not candidates:
+            continue
+        old_path, old_entity = candidates.pop(0)
+        moved.add(id(old_entity))
+        changes[i] = (MOVED, path, "from %s" % old_path)
+
+    report = []
+    for kind, path, entity in changes:
+        if kind == REMOVED:
+            if id(entity) in moved:
+                continue
+            entity = _describe_entity(entity)
+        elif kind == ADDED:
+            entity = _describe_entity(entity)
+        report.append((kind, path, entity))
+    return report
+
+def format_change(change):
+    kind, path, description = change
+    return "%-14s%s: %s" % (kind, path, description)
+
+def _get_identity(entity):
+    c = entity.get_component()
+    return (c.get_module_record_type(),
+            c.get_vendor_id_as_int(),
+            c.get_device_id_as_int(),
+            c.get_name())
+
+def _describe_entity(entity):
+    c = entity.get_component()
+    return "@ 0x%X : Size: 0x%X" % (c.get_start_address_as_int(), c.get_size_as_int())
+
+def _get_record_changes(path, c, other_c):
+    changes = []
+    if c.get_start_address_as_int() != other_c.get_start_address_as_int():
+        changes.append((MOVED, path, "0x%X -> 0x%X" % (c.get_start_address_as_int(),
+                                                       other_c.get_start_address_as_int())))
+    if c.get_size_as_int() != other_c.get_size_as_int():
+        changes.append((RESIZED, path, "0x%X -> 0x%X" % (c.get_size_as_int(),
+                                                         other_c.get_size_as_int())))
+
+    if _get_version(c) != _get_version(other_c):
+        changes.append((REVERSIONED, path, "%s (ABI %02d:%02d) -> %s (ABI %02d:%02d)" %
+                        ((c.get_core_version(),) + _get_version(c)[1:] +
+                         (other_c.get_core_version(),) + _get_version(other_c)[1:])))
+
+    elements = []
+    #Compare the date the way it is written to the ROM
+    if c.get_date() != other_c.get_date():
+        elements.append("SDB_DATE: %s -> %s" % (c.get_date(), other_c.get_date()))
+    for e in c.ELEMENTS:
+        if e in _SEPARATE_ELEMENTS:
+            continue
+        if c.d[e] != other_c.d[e]:
+            elements.append("%s: %s -> %s" % (e, c.d[e], other_c.d[e]))
+    if len(elements) > 0:
+        changes.append((CHANGED, path, ", ".join(elements)))
+    return changes
+
+def _get_version(c):
+    #The version strings "1.2.03" and "01.002.003" are the same in the ROM
+    return (c.get_core_version_as_int(),
+            c.get_abi_version_major_as_int(),
+            c.get_abi_version_minor_as_int())
@@ -21,8 +21,9 @@ import os
 import sys
 import time
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
-from som_rom_parser import parse_rom_image
+from ..som_rom_parser import parse_rom_image
+from ..sdb_core import SDBError
+from .. import sdb_component
 
 NAME = "sdb-viewer"
 SCRIPT_NAME = "sdb %s" % NAME
@@ -31,11 +32,28 @@ __author__ = "dave.mccoy@cospandesign.com (Dave McCoy)"
 
 DESCRIPTION = "display the contents of the SDB of the specified file"
 
-EPILOG = "\n"
+EPILOG = "Examples\n" \
+         "Display only the devices on the peripheral bus\n" \
+         "\tsdb %s --bus top.peripheral --type device /path/to/rom.txt\n" % NAME
+
+RECORD_TYPES = {"device":       sdb_component.SDB_RECORD_TYPE_DEVICE,
+                "integration":  sdb_component.SDB_RECORD_TYPE_INTEGRATION,
+                "url":          sdb_component.SDB_RECORD_TYPE_REPO_URL,
+                "synthesis":    sdb_component.SDB_RECORD_TYPE_SYNTHESIS}
 
 
 def setup_parser(parser):
     parser.description = DESCRIPTION
+    parser.add_argument("--bus",
+                        type=str,
+                        default=None,
+                        help="Only display the bus with this path (example: top.peripheral)")
+    parser.add_argument("--type",
+                        type=str,
+                        nargs='*',
+                        default=None,
+                        choices=sorted(RECORD_TYPES.keys()),
+                        help="Only display these types of records (the buses are always displayed)")
     parser.add_argument("filename",
                         type=str,
                         nargs=1,
@@ -44,17 +62,25 @@ def setup_parser(parser):
 
 
 def view_sdb(args):
-    parse_sdb_file(args.filename[0])
+    parse_sdb_file(args.filename[0], args.bus, args.type)
     sys.exit(0)
 
-def parse_sdb_file(filename):
+def parse_sdb_file(filename, bus = None, record_types = None, stream = None):
     if not os.path.exists(filename):
         raise IOError("File: %s does not exist!", filename)
-    f = open(filename, 'r')
-    buf = f.read()
-    f.close()
-    som = parse_rom_image(buf)
-    som.pretty_print_sdb()
+    #Only the records that are displayed are decoded
+    with open(filename, 'r') as f:
+        som = parse_rom_image(f, lazy = True)
+
+    root = None
+    if bus is not None:
+        root = som.find_bus_by_path(bus)
+        if root is None:
+            raise SDBError("Bus: %s does not exist!" % bus)
+
+    if record_types is not None:
+        record_types = [RECORD_TYPES[t] for t in record_types]
+    som.pretty_print_sdb(stream, root, record_types)
 
 
 
@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import json
+import os
+import shutil
+import sys
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+
+from sdb import device_manager
+
+def write_devices(path, devices, mtime = None):
+    with open(path, "w") as f:
+        f.write(json.dumps({"version": 1, "devices": devices}))
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+class Test (unittest.TestCase):
+    """Unit Test"""
+
+    def setUp(self):
+        self.local_device_list = device_manager.LOCAL_DEVICE_LIST
+        self.environ = dict(os.environ)
+        self.directory = tempfile.mkdtemp()
+        #Keep the user's own device lists out of the tests
+        os.environ["XDG_CONFIG_HOME"] = os.path.join(self.directory, "config")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.directory, "cache")
+        os.environ.pop(device_manager.DEVICE_LIST_ENV, None)
+        device_manager.refresh_device_lists()
+
+    def tearDown(self):
+        device_manager.LOCAL_DEVICE_LIST = self.local_device_list
+        os.environ.clear()
+        os.environ.update(self.environ)
+        device_manager.refresh_device_lists()
+        shutil.rmtree(self.directory)
+
+    def test_lookups(self):
+        self.assertEqual(device_manager.get_device_name_from_id(3), "UART")
+        self.assertEqual(device_manager.get_device_name_from_id(0x1000), "Unknown Device")
+        self.assertEqual(device_manager.get_device_id_from_name(" gpio "), 2)
+        self.assertEqual(device_manager.get_device_type(2), "GPIO")
+        devices = device_manager.get_device_list()
+        self.assertEqual(devices[3]["name"], "UART")
+        with self.assertRaises(device_manager.SDBError):
+            device_manager.get_device_id_from_name("flux capacitor")
+
+    def test_reload_on_change(self):
+        path = os.path.join(self.directory, "devices.json")
+        write_devices(path, {"GPIO": {"ID": "0x0002"}}, 1000)
+        device_manager.LOCAL_DEVICE_LIST = path
+        self.assertEqual(device_manager.get_device_name_from_id(2), "GPIO")
+
+        #The file is only read again after it changes
+        registry = device_manager._get_registry()
+        device_manager.refresh_device_lists()
+        self.assertIs(device_manager._get_registry(), registry)
+        write_devices(path, {"Blinker": {"ID": "0x0002"}}, 2000)
+        device_manager.refresh_device_lists()
+        self.assertEqual(device_manager.get_device_name_from_id(2), "Blinker")
+        self.assertIsNot(device_manager._get_registry(), registry)
+
+    def test_refresh_interval(self):
+        path = os.path.join(self.directory, "devices.json")
+        write_devices(path, {"GPIO": {"ID": "0x0002"}}, 1000)
+        device_manager.LOCAL_DEVICE_LIST = path
+        self.assertEqual(device_manager.get_device_name_from_id(2), "GPIO")
+
+        #Lookups between checks do not touch the device lists
+        getmtime = os.path.getmtime
+        os.path.getmtime = None
+        try:
+            write_devices(path, {"Blinker": {"ID": "0x0002"}}, 2000)
+            self.assertEqual(device_manager.get_device_name_from_id(2), "GPIO")
+        finally:
+            os.path.getmtime = getmtime
+
+        device_manager.refresh_device_lists()
+        self.assertEqual(device_manager.get_device_name_from_id(2), "Blinker")
+
+    def test_overlays(self):
+        user_dir = os.path.join(self.directory, "config", "sdb")
+        os.makedirs(user_dir)
+        user_list = os.path.join(user_dir, "devices.json")
+        write_devices(user_list, {"Blinker": {"ID": "0x0100"},
+                                  "gpio": {"ID": "0x0002", "description": "Mine"}})
+        env_list = os.path.join(self.directory, "env.json")
+        write_devices(env_list, {"Widget": {"ID": "0x0101"}})
+        os.environ[device_manager.DEVICE_LIST_ENV] = env_list
+        device_manager.refresh_device_lists()
+
+        self.assertEqual(device_manager.get_device_list_paths()[1:],
+                         [user_list, env_list])
+        os.environ["XDG_CONFIG_HOME"] = ""
+        self.assertEqual(device_manager.get_device_list_paths()[1],
+                         os.path.join(os.path.expanduser("~"), ".config", "sdb", "devices.json"))
+        os.environ["XDG_CONFIG_HOME"] = os.path.join(self.directory, "config")
+        self.assertEqual(device_manager.get_device_name_from_id(0x100), "Blinker")
+        self.assertEqual(device_manager.get_device_id_from_name("widget"), 0x101)
+        self.assertEqual(device_manager.get_device_name_from_id(3), "UART")
+        gpio = device_manager.get_device_list()[2]
+        self.assertEqual(gpio["description"], "Mine")
+
+        write_devices(env_list, {"Widget": {"ID": "0x0003"}}, 3000)
+        device_manager.refresh_device_lists()
+        with self.assertRaises(device_manager.SDBError) as context:
+            device_manager.get_device_name_from_id(3)
+        self.assertIn("UART", str(context.exception))
+
+    def test_overlay_lookups(self):
+        overlays = []
+        for i in range(20):
+            overlay = os.path.join(self.directory, "overlay%d.json" % i)
+            write_devices(overlay, {"Overlay%d" % i: {"ID": "0x%04X" % (0x200 + i)}})
+            overlays.append(overlay)
+        os.environ[device_manager.DEVICE_LIST_ENV] = os.pathsep.join(overlays)
+        device_manager.refresh_device_lists()
+        self.assertEqual(device_manager.get_device_name_from_id(0x200), "Overlay0")
+
+        #The number of layered lists does not change the cost of a lookup
+        exists = os.path.exists
+        getmtime = os.path.getmtime
+        os.path.exists = None
+        os.path.getmtime = None
+        try:
+            for i in range(20):
+                self.assertEqual(device_manager.get_device_id_from_name("overlay%d" % i), 0x200 + i)
+            self.assertEqual(device_manager.get_device_name_from_id(3), "UART")
+        finally:
+            os.path.exists = exists
+            os.path.getmtime = getmtime
+
+    def test_snapshot(self):
+        path = os.path.join(self.directory, "devices.json")
+        write_devices(path, {"GPIO": {"ID": "0x0002"}})
+        device_manager.LOCAL_DEVICE_LIST = path
+        self.assertEqual(device_manager.get_device_name_from_id(2), "GPIO")
+        snapshot_dir = os.path.join(self.directory, "cache", "sdb")
+        self.assertEqual(device_manager.get_snapshot_dir(), snapshot_dir)
+        os.environ["XDG_CACHE_HOME"] = ""
+        self.assertEqual(device_manager.get_snapshot_dir(),
+                         os.path.join(os.path.expanduser("~"), ".cache", "sdb"))
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.directory, "cache")
+        self.assertEqual(len(os.listdir(snapshot_dir)), 1)
+
+        #A new process loads the snapshot instead of the JSON
+        device_manager._registry = None
+        read_device_list = device_manager._read_device_list
+        device_manager._read_device_list = None
+        try:
+            self.assertEqual(device_manager.get_device_id_from_name("gpio"), 2)
+        finally:
+            device_manager._read_device_list = read_device_list
+
+        #Each set of device lists has its own snapshot
+        env_list = os.path.join(self.directory, "env.json")
+        write_devices(env_list, {"Widget": {"ID": "0x0101"}})
+        os.environ[device_manager.DEVICE_LIST_ENV] = env_list
+        device_manager.refresh_device_lists()
+        self.assertEqual(device_manager.get_device_id_from_name("widget"), 0x101)
+        self.assertEqual(len(os.listdir(snapshot_dir)), 2)
+        os.environ.pop(device_manager.DEVICE_LIST_ENV)
+        device_manager.refresh_device_lists()
+        device_manager._read_device_list = None
+        try:
+            self.assertEqual(device_manager.get_device_id_from_name("gpio"), 2)
+        finally:
+            device_manager._read_device_list = read_device_list
+
+        #A snapshot that can not be read falls back to the JSON
+        write_devices(path, {"Blinker": {"ID": "0x0002"}}, 2000)
+        digest = device_manager._hash_device_lists([path])
+        with open(device_manager._get_snapshot_path(digest), "wb") as f:
+            f.write(b"garbage")
+        device_manager._registry = None
+        self.assertEqual(device_manager.get_device_name_from_id(2), "Blinker")
+
+        #Only the most recently used snapshots are kept
+        for i in range(device_manager.SNAPSHOT_LIMIT):
+            write_devices(path, {"Blinker": {"ID": "0x%04X" % (i + 2)}}, 3000 + i)
+            device_manager.refresh_device_lists()
+            device_manager.get_device_list()
+        self.assertEqual(len(os.listdir(snapshot_dir)), device_manager.SNAPSHOT_LIMIT)
+
+if __name__ == "__main__":
+    unittest.main()
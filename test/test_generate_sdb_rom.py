@@ -3,19 +3,41 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import unittest
+import argparse
+import shutil
+import tempfile
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__),
                              os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 from sdb import sdb_object_model
 from sdb import sdb_component
+from sdb import device_manager
+from sdb.tools import generate
 
 class Test (unittest.TestCase):
     """Unit Test"""
 
     def setUp(self):
-        pass
+        #Keep the device registry snapshots out of the user's cache
+        self.environ = dict(os.environ)
+        self.cache_directory = tempfile.mkdtemp()
+        os.environ["XDG_CACHE_HOME"] = self.cache_directory
+        device_manager.refresh_device_lists()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        device_manager.refresh_device_lists()
+        shutil.rmtree(self.cache_directory)
 
     def xtest_simple_flat_bus(self):
         print ("Test create a SOM with one device")
@@ -142,6 +164,55 @@ class Test (unittest.TestCase):
         som.pretty_print_sdb()
 
 
+    def test_generate_placeholder_date(self):
+        #The sample configuration has placeholder dates (YYYY/MM/DD)
+        filename = os.path.join(os.path.dirname(__file__), "bus.json")
+        parser = generate.setup_parser(argparse.ArgumentParser())
+        args = parser.parse_args([filename])
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            with self.assertRaises(SystemExit) as context:
+                generate.generate(args)
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(context.exception.code, 1)
+        self.assertIn("Failed to generate the SDB from %s" % filename, output)
+        self.assertIn("YYYY", output)
+
+    def test_generate_cache_hit(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "bus.json")
+            with open(os.path.join(os.path.dirname(__file__), "bus.json"), "r") as f:
+                config = f.read().replace("YYYY/MM/DD", "2017/02/26")
+            with open(filename, "w") as f:
+                f.write(config)
+
+            parser = generate.setup_parser(argparse.ArgumentParser())
+            output = os.path.join(directory, "sdb")
+            args = parser.parse_args([filename,
+                                      "--oformat", "bin",
+                                      "--cache", os.path.join(directory, "cache"),
+                                      "--output", output])
+            generate.generate(args)
+            with open(output, "rb") as f:
+                rom = f.read()
+            os.remove(output)
+
+            #A hit does not build the SOM or generate the ROM
+            generate_som = generate.generate_som
+            generate.generate_som = None
+            try:
+                generate.generate(args)
+            finally:
+                generate.generate_som = generate_som
+            with open(output, "rb") as f:
+                self.assertEqual(f.read(), rom)
+        finally:
+            shutil.rmtree(directory)
+
     def test_complex_buses(self):
         print ("Complex buses")
 
@@ -0,0 +1,67 @@
+#! /usr/bin/env python
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+
+from sdb import sdb_component
+
+class Test (unittest.TestCase):
+    """Unit Test"""
+
+    def setUp(self):
+        pass
+
+    def test_native_values(self):
+        component = sdb_component.create_device_record(name = "uart1",
+                                                       vendor_id = 0x800000000000C594,
+                                                       device_id = 0x00000003,
+                                                       version_major = 3,
+                                                       version_minor = 1,
+                                                       size = 0x08)
+        component.set_start_address(0x01000000)
+        self.assertFalse(hasattr(component, "__dict__"))
+        self.assertEqual(component.get_vendor_id_as_int(), 0x800000000000C594)
+        self.assertEqual(component.get_abi_version_major_as_int(), 3)
+        self.assertEqual(component.get_end_address_as_int(), 0x01000008)
+        self.assertTrue(component.is_device())
+
+    def test_dictionary_view(self):
+        component = sdb_component.create_device_record(name = "gpio1",
+                                                       vendor_id = 0x800000000000C594,
+                                                       size = 0x100)
+        self.assertEqual(component.d["SDB_NAME"], "gpio1")
+        self.assertEqual(component.d["SDB_SIZE"], "0x100")
+        self.assertEqual(component.d["SDB_VENDOR_ID"], "0x800000000000c594")
+        self.assertEqual(component.d["SDB_EXECUTABLE"], "True")
+        self.assertEqual(component.d["SDB_RECORD_TYPE"], sdb_component.SDB_RECORD_TYPE_DEVICE)
+
+        component.d["SDB_ABI_VERSION_MAJOR"] = "2"
+        component.d["SDB_DEVICE_ID"] = "0x0010"
+        component.d["SDB_WRITEABLE"] = "False"
+        component.d["SDB_ABI_ENDIAN"] = "Little"
+        component.d["SDB_CORE_VERSION"] = "1.2.03"
+        self.assertEqual(component.get_abi_version_major_as_int(), 2)
+        self.assertEqual(component.get_device_id_as_int(), 0x10)
+        self.assertFalse(component.is_writeable())
+        self.assertEqual(component.get_endian_as_int(), sdb_component.SDB_ENDIAN_LITTLE)
+        self.assertEqual(component.get_core_version_as_int(), 0x01020003)
+
+        od = component.generated_ordered_dict()
+        self.assertEqual(list(od.keys()), sdb_component.SDBComponent.ELEMENTS)
+
+    def test_number_of_records(self):
+        component = sdb_component.create_interconnect_record(name = "top")
+        component.set_number_of_records(16)
+        self.assertEqual(component.get_number_of_records_as_int(), 16)
+        self.assertEqual(component.d["SDB_NRECS"], "0x10")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#! /usr/bin/env python
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import shutil
+import tempfile
+import io
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+
+from sdb import som_rom_generator
+from sdb import som_rom_emitter
+from sdb.tools import sdb_diff
+#The same SOM as the object model tests
+from test_sdb_object_model import create_device
+from test_sdb_object_model import create_tree
+
+class Test (unittest.TestCase):
+    """Unit Test"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same(self):
+        self.assertEqual(sdb_diff.diff_soms(create_tree(), create_tree()), [])
+
+    def test_record_changes(self):
+        som = create_tree()
+        other = create_tree()
+        periph, memory = other.get_buses()
+        with other.batch():
+            memory.get_child_from_index(1).get_component().set_size(0x20000)
+            c = periph.get_child_from_index(0).get_component()
+            c.d["SDB_ABI_VERSION_MINOR"] = "2"
+            c.set_device_id(0x10)
+
+        changes = sdb_diff.diff_soms(som, other)
+        self.assertIn((sdb_diff.RESIZED, "top.memory.mem1", "0x10000 -> 0x20000"), changes)
+        kinds = [(kind, path) for kind, path, description in changes]
+        self.assertIn((sdb_diff.REVERSIONED, "top.peripheral.dev0"), kinds)
+        self.assertIn((sdb_diff.CHANGED, "top.peripheral.dev0"), kinds)
+        #Only the bus with the resized memory moves
+        self.assertNotIn((sdb_diff.MOVED, "top.peripheral"), kinds)
+
+    def test_added_removed_and_moved(self):
+        som = create_tree()
+        other = create_tree()
+        periph, memory = other.get_buses()
+        with other.batch():
+            other.move_component(periph, 3, memory, -1)
+            other.remove_component_by_index(periph, 0)
+            other.insert_component(periph, create_device("dev4", 0x100, 4))
+
+        changes = sdb_diff.diff_soms(som, other)
+        self.assertIn((sdb_diff.MOVED, "top.memory.dev3", "from top.peripheral.dev3"), changes)
+        kinds = [(kind, path) for kind, path, description in changes]
+        self.assertIn((sdb_diff.REMOVED, "top.peripheral.dev0"), kinds)
+        self.assertIn((sdb_diff.ADDED, "top.peripheral.dev4"), kinds)
+        self.assertNotIn((sdb_diff.REMOVED, "top.peripheral.dev3"), kinds)
+
+    def test_read_rom_files(self):
+        som = create_tree()
+        rom = som_rom_generator.generate_rom_image(som)
+        hex_path = os.path.join(self.directory, "sdb.rom")
+        bin_path = os.path.join(self.directory, "sdb.bin")
+        with io.open(hex_path, "w") as f:
+            som_rom_emitter.emit_rom(rom, "rom", f)
+        with io.open(bin_path, "wb") as f:
+            som_rom_emitter.emit_rom(rom, "bin", f)
+
+        self.assertEqual(sdb_diff.diff_soms(sdb_diff.read_sdb_file(hex_path), som), [])
+        self.assertEqual(sdb_diff.diff_soms(sdb_diff.read_sdb_file(bin_path), som), [])
+
+        other = create_tree()
+        other.get_buses()[0].get_child_from_index(2).get_component().set_device_id(0x20)
+        changes = sdb_diff.diff_soms(sdb_diff.read_sdb_file(hex_path), other)
+        self.assertEqual(changes, [(sdb_diff.CHANGED,
+                                    "top.peripheral.dev2",
+                                    "SDB_DEVICE_ID: 0x2 -> 0x20")])
+
+if __name__ == "__main__":
+    unittest.main()
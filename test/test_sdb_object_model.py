@@ -0,0 +1,480 @@
+#! /usr/bin/env python
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+
+from sdb import sdb_object_model
+from sdb import sdb_component
+
+def create_device(name, size, device_id = 0x01, version_major = 2, version_minor = 1, date = "2017/02/26"):
+    component = sdb_component.create_device_record(name = name,
+                                                   vendor_id = 0x800000000000C594,
+                                                   device_id = device_id,
+                                                   core_version = "1.2.03",
+                                                   version_major = version_major,
+                                                   version_minor = version_minor,
+                                                   size = size)
+    #A fixed date so the ROM images are the same every day
+    component.set_date(date)
+    return component
+
+def create_som(auto_address = True):
+    som = sdb_object_model.SOM(auto_address = auto_address)
+    som.initialize_root()
+    som.set_bus_name(som.get_root(), "top")
+    return som
+
+def create_tree():
+    som = create_som()
+    root = som.get_root()
+    with som.batch():
+        periph = som.insert_bus(root, "peripheral")
+        for i in range(4):
+            som.insert_component(periph, create_device("dev%d" % i, 0x100, i))
+        memory = som.insert_bus(root, "memory")
+        som.insert_component(memory, create_device("mem0", 0x10000))
+        som.insert_component(memory, create_device("mem1", 0x10000))
+    return som
+
+class Test (unittest.TestCase):
+    """Unit Test"""
+
+    def setUp(self):
+        pass
+
+    def test_batch_defers_update(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            bus = som.insert_bus(root, "peripheral")
+            for i in range(4):
+                som.insert_component(bus, create_device("dev%d" % i, 0x100))
+            self.assertTrue(som.is_batch_active())
+            self.assertEqual(bus.get_component().get_size_as_int(), 0)
+
+        self.assertFalse(som.is_batch_active())
+        self.assertEqual(bus.get_component().get_size_as_int(), 0x400)
+        self.assertEqual(root.get_component().get_size_as_int(), 0x400)
+        self.assertEqual(bus.get_child_from_index(3).get_component().get_start_address_as_int(), 0x300)
+
+    def test_nested_batch(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            bus = som.insert_bus(root, "peripheral")
+            with som.batch():
+                som.insert_component(bus, create_device("dev0", 0x10))
+            self.assertEqual(bus.get_component().get_size_as_int(), 0)
+        self.assertEqual(bus.get_component().get_size_as_int(), 0x10)
+
+    def test_update_only_lays_out_changed_buses(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            periph = som.insert_bus(root, "peripheral")
+            memory = som.insert_bus(root, "memory")
+            som.insert_component(periph, create_device("dev0", 0x100))
+            som.insert_component(memory, create_device("mem0", 0x1000))
+
+        laid_out = []
+        layout_bus = som._layout_bus
+        def record_layout(bus):
+            laid_out.append(bus.get_name())
+            return layout_bus(bus)
+        som._layout_bus = record_layout
+
+        som.insert_component(periph, create_device("dev1", 0x100))
+        self.assertEqual(laid_out, ["peripheral", "top"])
+        self.assertEqual(memory.get_component().get_start_address_as_int(), 0x200)
+
+        #The size of the bus does not change so the parent is left alone
+        del laid_out[:]
+        periph.get_child_from_index(0).get_component().set_name("renamed")
+        som.refresh(periph.get_child_from_index(0))
+        self.assertEqual(laid_out, ["peripheral"])
+
+    def test_informative_records_moved_to_end(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            url = sdb_component.create_repo_url_record("http://www.example.com")
+            som.insert_component(root, url)
+            som.insert_component(root, create_device("dev0", 0x100))
+            synth = sdb_component.create_synthesis_record(
+                                            synthesis_name = "project.bit",
+                                            commit_id = 0,
+                                            tool_name = "vivado",
+                                            tool_version = "2016.4",
+                                            user_name = "user")
+            som.insert_component(root, synth)
+            som.insert_component(root, create_device("dev1", 0x100))
+            som.insert_component(root, create_device("dev2", 0x100))
+
+        components = [root.get_child_from_index(i).get_component() for i in range(root.get_child_count())]
+        self.assertEqual([c.get_name() for c in components[:3]], ["dev0", "dev1", "dev2"])
+        self.assertTrue(components[3].is_url_record())
+        self.assertTrue(components[4].is_synthesis_record())
+
+    def test_find_by_address(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            periph = som.insert_bus(root, "peripheral")
+            memory = som.insert_bus(root, "memory")
+            for i in range(4):
+                som.insert_component(periph, create_device("dev%d" % i, 0x100))
+            som.insert_component(memory, create_device("mem0", 0x1000))
+
+        self.assertEqual(som.find_by_address(0x000).get_name(), "dev0")
+        self.assertEqual(som.find_by_address(0x2FF).get_name(), "dev2")
+        self.assertEqual(som.find_by_address(0x400).get_name(), "mem0")
+        self.assertEqual(som.find_by_address(0x13FF).get_name(), "mem0")
+        self.assertIsNone(som.find_by_address(0x1400))
+
+        #Growing the peripheral bus moves the memory bus up
+        som.insert_component(periph, create_device("dev4", 0x100))
+        self.assertEqual(som.find_by_address(0x400).get_name(), "dev4")
+        self.assertEqual(som.find_by_address(0x500).get_name(), "mem0")
+
+        #The layout is packed again when a device is removed
+        som.remove_component_by_index(periph, 4)
+        self.assertEqual(som.find_by_address(0x400).get_name(), "mem0")
+        self.assertIsNone(som.find_by_address(0x1400))
+
+    def test_find_by_address_within_batch(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            som.insert_component(root, create_device("a", 0x100))
+            som.insert_component(root, create_device("b", 0x100))
+            #Nothing has been laid out yet
+            self.assertIsNone(som.find_by_address(0x100))
+
+        #The lookup within the batch must not leave a stale index behind
+        self.assertEqual(som.find_by_address(0x100).get_name(), "b")
+        self.assertEqual(som.find_by_address(0x0FF).get_name(), "a")
+
+    def test_find_by_path(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            periph = som.insert_bus(root, "peripheral")
+            memory = som.insert_bus(root, "memory")
+            uart0 = som.insert_component(periph, create_device("uart0", 0x10))
+            som.insert_component(periph, create_device("gpio0", 0x10))
+            som.insert_component(memory, create_device("uart1", 0x10))
+
+        self.assertIs(som.find_by_path("top.peripheral"), periph)
+        self.assertIs(som.find_by_path("top.peripheral.uart0"), uart0)
+        self.assertIs(som.find_bus_by_path("top.peripheral"), periph)
+        self.assertIs(som.find_bus_by_path("top"), root)
+        self.assertIsNone(som.find_bus_by_path("top.peripheral.uart0"))
+        self.assertIsNone(som.find_bus_by_path("bottom.peripheral"))
+        self.assertEqual(som.get_path(uart0), "top.peripheral.uart0")
+        self.assertIsNone(som.find_by_path("top.peripheral.uart1"))
+
+        uart0.set_name("uart2")
+        self.assertIsNone(som.find_by_path("top.peripheral.uart0"))
+        self.assertIs(som.find_by_path("top.peripheral.uart2"), uart0)
+
+        som.set_bus_name(periph, "io")
+        self.assertIs(som.find_by_path("top.io.uart2"), uart0)
+        self.assertIsNone(som.find_by_path("top.peripheral"))
+
+        som.move_component(periph, 1, memory, 0)
+        self.assertIsNone(som.find_by_path("top.io.gpio0"))
+        self.assertEqual(som.find_by_path("top.memory.gpio0").get_parent(), memory)
+
+        names = [som.get_path(e) for e in som.find_by_glob("top.*.uart*")]
+        self.assertEqual(names, ["top.io.uart2", "top.memory.uart1"])
+        self.assertEqual(len(som.find_by_glob("*.memory.*")), 2)
+        self.assertEqual(som.find_by_glob("top.memory"), [memory])
+
+        som.remove_bus(memory)
+        self.assertIsNone(som.find_by_path("top.memory.uart1"))
+        self.assertEqual(len(som.find_by_glob("top.*.*")), 1)
+
+    def test_find_by_vendor_product_and_abi(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            periph = som.insert_bus(root, "peripheral")
+            uart0 = som.insert_component(periph, create_device("uart0", 0x10, 0x03, 3, 1))
+            uart1 = som.insert_component(periph, create_device("uart1", 0x10, 0x03, 3, 2))
+            gpio0 = som.insert_component(periph, create_device("gpio0", 0x10, 0x02, 2, 1))
+            url = sdb_component.create_repo_url_record("http://www.example.com")
+            som.insert_component(root, url)
+
+        self.assertEqual(som.find_by_vendor_product(0x800000000000C594, 0x03), [uart0, uart1])
+        self.assertEqual(som.find_by_vendor_product(0x800000000000C594, 0x04), [])
+        self.assertEqual(som.find_by_abi(3), [uart0, uart1])
+        self.assertEqual(som.find_by_abi(3, minor = 2), [uart1])
+        self.assertEqual(som.find_by_abi(2, abi_class = 0), [gpio0])
+
+        memory = som.insert_bus(root, "memory")
+        uart2 = som.insert_component(memory, create_device("uart2", 0x10, 0x03, 3, 1))
+        self.assertEqual(som.find_by_abi(3, minor = 1), [uart0, uart2])
+
+        som.remove_component_by_index(periph, 0)
+        som.remove_bus(memory)
+        self.assertEqual(som.find_by_vendor_product(0x800000000000C594, 0x03), [uart1])
+
+        #Components changed directly are picked up on a refresh
+        gpio0.get_component().set_abi_version_major(3)
+        som.refresh(gpio0)
+        self.assertEqual(som.find_by_abi(3), [uart1, gpio0])
+        self.assertEqual(som.find_by_abi(2), [])
+
+        #The index is kept by ABI class as well as major version
+        gpio0.get_component().set_abi_class(1)
+        som.refresh(gpio0)
+        self.assertEqual(som.find_by_abi(3, abi_class = 0), [uart1])
+        self.assertEqual(som.find_by_abi(3, abi_class = 1), [gpio0])
+        self.assertEqual(som.find_by_abi(3, minor = 1, abi_class = 1), [gpio0])
+        self.assertEqual(som.find_by_abi(3), [uart1, gpio0])
+        self.assertEqual(som.find_by_abi(3, abi_class = 2), [])
+
+    def test_validate(self):
+        som = create_som(auto_address = False)
+        root = som.get_root()
+        with som.batch():
+            periph = som.insert_bus(root, "peripheral")
+            for name, start, size in [("dev0", 0x000, 0x100),
+                                      ("dev1", 0x100, 0x400),
+                                      ("dev2", 0x200, 0x100),
+                                      ("dev3", 0x400, 0x100),
+                                      ("dev4", 0x600, 0x100),
+                                      ("dev5", 0x280, 0x40)]:
+                c = create_device(name, size)
+                c.set_start_address(start)
+                som.insert_component(periph, c)
+            url = sdb_component.create_repo_url_record("http://www.example.com")
+            som.insert_component(periph, url)
+
+        self.assertEqual(periph.get_component().get_size_as_int(), 0x700)
+        errors = som.validate()
+        self.assertEqual(len(errors), 4)
+        self.assertIn("top.peripheral: dev2 (0x200 - 0x300) overlaps dev1 (0x100 - 0x500)", errors)
+        self.assertIn("top.peripheral: dev3 (0x400 - 0x500) overlaps dev1 (0x100 - 0x500)", errors)
+        #A device within two others overlaps both of them
+        self.assertIn("top.peripheral: dev5 (0x280 - 0x2C0) overlaps dev1 (0x100 - 0x500)", errors)
+        self.assertIn("top.peripheral: dev5 (0x280 - 0x2C0) overlaps dev2 (0x200 - 0x300)", errors)
+
+        #The device that starts last is found within overlapping ranges
+        self.assertEqual(som.find_by_address(0x250).get_name(), "dev2")
+        self.assertEqual(som.find_by_address(0x350).get_name(), "dev1")
+        self.assertEqual(som.find_by_address(0x450).get_name(), "dev3")
+        self.assertIsNone(som.find_by_address(0x550))
+        self.assertEqual(som.find_by_address(0x650).get_name(), "dev4")
+
+        periph.get_component().set_size(0x680)
+        errors = som.validate(periph)
+        self.assertEqual(len(errors), 5)
+        self.assertIn("top.peripheral: dev4 (0x600 - 0x700) is outside of the bus (size: 0x680)", errors)
+
+    def test_allocator_spacing(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            bus = som.insert_bus(root, "peripheral")
+            som.set_child_spacing(bus, 0x1000)
+            for size in [0x100, 0x1800, 0x100]:
+                som.insert_component(bus, create_device("dev", size))
+
+        starts = [bus.get_child_from_index(i).get_component().get_start_address_as_int() for i in range(3)]
+        self.assertEqual(starts, [0x0000, 0x1000, 0x3000])
+        self.assertEqual(bus.get_component().get_size_as_int(), 0x3100)
+
+    def test_allocator_constraints(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            bus = som.insert_bus(root, "peripheral")
+            small0 = som.insert_component(bus, create_device("small0", 0x10))
+            aligned = som.insert_component(bus, create_device("aligned", 0x10))
+            pinned = som.insert_component(bus, create_device("pinned", 0x100))
+            small1 = som.insert_component(bus, create_device("small1", 0x10))
+            som.set_alignment(aligned, 0x100)
+            som.set_fixed_address(pinned, 0x200)
+
+        start = lambda e: e.get_component().get_start_address_as_int()
+        self.assertEqual(start(small0), 0x000)
+        self.assertEqual(start(aligned), 0x100)
+        self.assertEqual(start(pinned), 0x200)
+        #First fit goes back into the hole left by the alignment
+        self.assertEqual(start(small1), 0x010)
+        self.assertEqual(bus.get_component().get_size_as_int(), 0x300)
+        self.assertEqual(som.validate(), [])
+
+        som.set_fixed_address(pinned, None)
+        self.assertEqual(start(pinned), 0x110)
+
+        #The constraints move with the entity
+        other = som.insert_bus(root, "other")
+        som.insert_component(other, create_device("other0", 0x10))
+        som.set_fixed_address(pinned, 0x400)
+        som.move_component(bus, 2, other, -1)
+        self.assertIs(other.get_child_from_index(1), pinned)
+        self.assertIs(som.find_by_path("top.other.pinned"), pinned)
+        self.assertEqual(start(pinned), 0x400)
+        som.move_component(bus, 1, other, 1)
+        self.assertIs(other.get_child_from_index(1), aligned)
+        self.assertEqual(aligned.get_alignment(), 0x100)
+        self.assertEqual(start(aligned), 0x100)
+        with self.assertRaises(sdb_object_model.SDBError):
+            som.move_component(root, 1, bus, 0)
+
+    def test_allocator_best_fit_natural_alignment(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            bus = som.insert_bus(root, "peripheral")
+            devices = [som.insert_component(bus, create_device("dev%d" % i, size))
+                       for i, size in enumerate([0x30, 0x400, 0x80, 0x10])]
+            som.set_allocation_policy(bus, sdb_object_model.ALLOCATE_BEST_FIT,
+                                      natural_alignment = True)
+
+        starts = [d.get_component().get_start_address_as_int() for d in devices]
+        for d, s in zip(devices, starts):
+            size = d.get_component().get_size_as_int()
+            self.assertEqual(s % sdb_object_model._next_power_of_two(size), 0)
+        self.assertEqual(starts, [0x480, 0x000, 0x400, 0x4B0])
+        self.assertEqual(bus.get_component().get_size_as_int(), 0x4C0)
+
+        with self.assertRaises(sdb_object_model.SDBError):
+            som.set_allocation_policy(bus, "worst_fit")
+
+    def test_iteration_is_reentrant(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            for i in range(3):
+                som.insert_component(root, create_device("dev%d" % i, 0x10))
+
+        pairs = [(a.get_name(), b.get_name()) for a in root for b in root]
+        self.assertEqual(len(pairs), 9)
+        self.assertEqual(pairs[-1], ("dev2", "dev2"))
+
+    def test_walk(self):
+        som = create_som()
+        root = som.get_root()
+        with som.batch():
+            periph = som.insert_bus(root, "peripheral")
+            som.insert_component(periph, create_device("uart0", 0x10))
+            som.insert_component(root, create_device("dev0", 0x10))
+            memory = som.insert_bus(root, "memory")
+            som.insert_component(memory, create_device("mem0", 0x10))
+
+        depth_first = [(path, depth) for path, depth, entity in som.walk()]
+        self.assertEqual(depth_first, [("top", 0),
+                                       ("top.peripheral", 1),
+                                       ("top.peripheral.uart0", 2),
+                                       ("top.dev0", 1),
+                                       ("top.memory", 1),
+                                       ("top.memory.mem0", 2)])
+        breadth_first = [path for path, depth, entity in som.walk(order = "breadth")]
+        self.assertEqual(breadth_first, ["top",
+                                         "top.peripheral",
+                                         "top.dev0",
+                                         "top.memory",
+                                         "top.peripheral.uart0",
+                                         "top.memory.mem0"])
+        self.assertEqual([p for p, d, e in som.walk(memory)], ["memory", "memory.mem0"])
+        with self.assertRaises(sdb_object_model.SDBError):
+            list(som.walk(order = "sideways"))
+
+    def test_merkle_hash(self):
+        som = create_tree()
+        other = create_tree()
+        self.assertTrue(som.is_equal(other))
+        self.assertEqual(som.get_hash(), other.get_hash())
+
+        periph, memory = som.get_buses()
+        dev = periph.get_child_from_index(2)
+        self.assertEqual(som.get_hash(periph), other.get_hash(other.get_buses()[0]))
+
+        #A change only clears the hashes on the way up to the root
+        dev.get_component().set_device_id(0x10)
+        self.assertIsNone(dev.hash)
+        self.assertIsNone(periph.hash)
+        self.assertIsNone(som.get_root().hash)
+        self.assertIsNotNone(memory.hash)
+        self.assertIsNotNone(periph.get_child_from_index(1).hash)
+        self.assertFalse(som.is_equal(other))
+
+        dev.get_component().set_device_id(2)
+        self.assertTrue(som.is_equal(other))
+
+        som.move_component(memory, 1, memory, 0)
+        self.assertFalse(som.is_equal(other))
+        som.move_component(memory, 1, memory, 0)
+        self.assertTrue(som.is_equal(other))
+
+        #Components removed from the SOM no longer report changes
+        component = periph.get_component()
+        som.set_bus_component(periph, sdb_component.create_interconnect_record(name = "peripheral"))
+        self.assertIs(periph.get_component().get_owner(), periph)
+        self.assertIsNone(component.get_owner())
+        som.get_hash()
+        component.set_device_id(0x20)
+        self.assertIsNotNone(periph.hash)
+
+    def test_component_owner(self):
+        som = create_tree()
+        other = create_tree()
+        periph = som.get_buses()[0]
+        component = periph.get_child_from_index(0).get_component()
+        child_count = other.get_buses()[0].get_child_count()
+
+        #A component can only be in one place, otherwise a change to it
+        #would only be seen by one of the SOMs
+        with self.assertRaises(sdb_object_model.SDBError):
+            other.insert_component(other.get_buses()[0], component)
+        with self.assertRaises(sdb_object_model.SDBError):
+            som.insert_component(periph, component)
+        self.assertEqual(other.get_buses()[0].get_child_count(), child_count)
+        self.assertIs(component.get_owner(), periph.get_child_from_index(0))
+        self.assertIs(type(component), sdb_component.SDBComponent)
+
+        #A removed component can be inserted again
+        som.remove_component_by_index(periph, 0)
+        self.assertIsNone(component.get_owner())
+        memory = other.get_buses()[1]
+        other.insert_component(memory, component)
+        other.get_hash()
+        component.set_device_id(0x20)
+        self.assertIsNone(memory.hash)
+        self.assertIsNone(other.get_root().hash)
+
+    def test_diff(self):
+        som = create_tree()
+        other = create_tree()
+        self.assertEqual(som.diff(other), [])
+
+        periph, memory = other.get_buses()
+        periph.get_child_from_index(1).get_component().set_device_id(0x10)
+        other.insert_component(periph, create_device("uart0", 0x100, 3))
+        other.remove_component_by_index(memory, 1)
+
+        changes = [(path, entity is None, other_entity is None)
+                   for path, entity, other_entity in som.diff(other)]
+        #The sizes of the buses changed as well
+        self.assertEqual(changes, [("top", False, False),
+                                   ("top.peripheral", False, False),
+                                   ("top.peripheral.dev1", False, False),
+                                   ("top.peripheral.uart0", True, False),
+                                   ("top.memory", False, False),
+                                   ("top.memory.mem1", False, True)])
+        path, entity, other_entity = som.diff(other)[2]
+        self.assertEqual(other_entity.get_component().get_device_id_as_int(), 0x10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,363 @@
+#! /usr/bin/env python
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import struct
+import mmap
+import shutil
+import tempfile
+import binascii
+import io
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+
+from sdb import sdb_object_model
+from sdb import sdb_component
+from sdb import som_rom_generator
+from sdb import som_rom_parser
+from sdb import device_manager
+#The same devices as the object model tests
+from test_sdb_object_model import create_device
+
+def create_som():
+    som = sdb_object_model.SOM()
+    som.initialize_root()
+    root = som.get_root()
+    som.set_bus_name(root, "top")
+    with som.batch():
+        periph = som.insert_bus(root, "peripheral")
+        mem = som.insert_bus(root, "memory")
+        for i in range(12):
+            som.insert_component(periph, create_device("dev%d" % i, 0x100, i))
+        som.insert_component(mem, create_device("mem0", 0x10000))
+        url = sdb_component.create_repo_url_record("http://www.example.com")
+        som.insert_component(root, url)
+    return som
+
+def record(rom, index):
+    return bytearray(rom[index * 64: (index + 1) * 64])
+
+class Test (unittest.TestCase):
+    """Unit Test"""
+
+    def setUp(self):
+        #Keep the device registry snapshots out of the user's cache
+        self.environ = dict(os.environ)
+        self.cache_directory = tempfile.mkdtemp()
+        os.environ["XDG_CACHE_HOME"] = self.cache_directory
+        device_manager.refresh_device_lists()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        device_manager.refresh_device_lists()
+        shutil.rmtree(self.cache_directory)
+
+    def test_one_copy_of_each_module(self):
+        #The parser builds the same buses the generator writes
+        self.assertIs(som_rom_parser.SOMBus, sdb_object_model.SOMBus)
+        self.assertIs(sdb_component.SDBError, som_rom_generator.SDBError)
+        self.assertIs(device_manager.SDBError, som_rom_parser.SDBError)
+
+    def test_generate_rom_layout(self):
+        som = create_som()
+        rom = som_rom_generator.generate_rom_image(som)
+        #top: 3 + 2, peripheral: 12 + 2, memory: 1 + 2
+        self.assertEqual(len(rom), (5 + 14 + 3) * 64)
+
+        top = record(rom, 0)
+        magic, nrecs = struct.unpack_from(">IH", top, 0)
+        self.assertEqual(magic, sdb_component.SDB_INTERCONNECT_MAGIC)
+        self.assertEqual(nrecs, 3)
+        self.assertEqual(record(rom, 4)[63], sdb_component.SDB_RECORD_TYPE_EMPTY)
+
+        #The bridges point to the tables of the sub buses in 8 byte units
+        self.assertEqual(record(rom, 1)[63], sdb_component.SDB_RECORD_TYPE_BRIDGE)
+        self.assertEqual(struct.unpack_from(">Q", record(rom, 1), 0)[0], 5 * 64 // 8)
+        self.assertEqual(struct.unpack_from(">Q", record(rom, 2), 0)[0], 19 * 64 // 8)
+
+        periph = record(rom, 5)
+        self.assertEqual(struct.unpack_from(">H", periph, 4)[0], 12)
+        self.assertEqual(record(rom, 3)[63], sdb_component.SDB_RECORD_TYPE_REPO_URL)
+
+        dev = record(rom, 7)
+        self.assertEqual(dev[63], sdb_component.SDB_RECORD_TYPE_DEVICE)
+        self.assertEqual(struct.unpack_from(">QQ", dev, 8), (0x100, 0x200))
+        self.assertEqual(bytes(dev[0x2C:0x30]), b"dev1")
+        self.assertEqual(struct.unpack_from(">I", dev, 0x24)[0], 0x01020003)
+
+    def test_total_number_of_records(self):
+        som = create_som()
+        count = som_rom_generator.get_total_number_of_records(som)
+        self.assertEqual(count, len(som_rom_generator.generate_rom_image(som)) // 64)
+
+        buses = som.get_buses()
+        sub = som.insert_bus(buses[1], "sub")
+        som.insert_component(sub, create_device("sub0", 0x10))
+        som.remove_component_by_index(buses[0], 0)
+        som.move_component(buses[0], 0, sub, 0)
+        count = som_rom_generator.get_total_number_of_records(som)
+        self.assertEqual(count, len(som_rom_generator.generate_rom_image(som)) // 64)
+
+        #top: 2 + 2, peripheral: 10 + 2
+        som.remove_bus(buses[1])
+        self.assertEqual(som_rom_generator.get_total_number_of_records(som), 4 + 12)
+
+    def test_generate_parse_round_trip(self):
+        som = create_som()
+        rom = som_rom_generator.generate_rom_image(som)
+        parsed = som_rom_parser.parse_rom_image(rom)
+        root = parsed.get_root()
+        self.assertEqual(root.get_name(), "top")
+        buses = parsed.get_buses()
+        self.assertEqual([b.get_name() for b in buses], ["peripheral", "memory"])
+        periph = buses[0]
+        self.assertEqual(periph.get_child_count(), 12)
+        dev = periph.get_child_from_index(11).get_component()
+        self.assertEqual(dev.get_name(), "dev11")
+        self.assertEqual(dev.get_start_address_as_int(), 0xB00)
+        self.assertEqual(dev.get_size_as_int(), 0x100)
+        self.assertEqual(dev.get_device_id_as_int(), 11)
+        url = root.get_child_from_index(2).get_component()
+        self.assertEqual(url.get_url(), "http://www.example.com")
+
+        #A SOM parsed from the ROM matches the SOM the ROM was generated from
+        self.assertTrue(parsed.is_equal(som))
+        self.assertTrue(som_rom_parser.parse_rom_image(rom, lazy = True).is_equal(som))
+        self.assertEqual(som_rom_generator.get_som_digest(parsed),
+                         som_rom_generator.get_som_digest(som))
+
+    def test_parse_buffer_types(self):
+        rom = som_rom_generator.generate_rom_image(create_som())
+        with tempfile.TemporaryFile() as f:
+            f.write(rom)
+            f.flush()
+            mapped = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            buffers = [rom, memoryview(rom), mapped]
+            if sys.version_info > (3,):
+                #On Python 2 a string is treated as a hex dump
+                buffers.append(bytes(rom))
+            for buf in buffers:
+                parsed = som_rom_parser.parse_rom_image(buf)
+                buses = parsed.get_buses()
+                self.assertEqual([b.get_name() for b in buses], ["peripheral", "memory"])
+                self.assertEqual(buses[0].get_child_count(), 12)
+                mem = buses[1].get_child_from_index(0).get_component()
+                self.assertEqual(mem.get_name(), "mem0")
+                self.assertEqual(mem.get_size_as_int(), 0x10000)
+            mapped.close()
+
+    def test_parse_truncated_rom(self):
+        rom = som_rom_generator.generate_rom_image(create_som())
+        with self.assertRaises(som_rom_parser.SDBError):
+            #Drop the last device record and the empty record of the last bus
+            som_rom_parser.parse_rom_image(rom[:-128])
+
+    def test_parse_commented_hex_dump(self):
+        rom = som_rom_generator.generate_rom_image(create_som())
+        text = binascii.hexlify(rom).decode("ascii")
+        lines = []
+        for i in range(0, len(text), 16):
+            if i % 128 == 0:
+                lines.append("//Record %d" % (i // 128))
+            lines.append("%s %s  // comment" % (text[i:i + 8], text[i + 8:i + 16]))
+        dump = "\n".join(lines)
+
+        chunk_size = som_rom_parser.HEX_CHUNK_SIZE
+        #Force a chunk boundary in the middle of a byte
+        som_rom_parser.HEX_CHUNK_SIZE = 7
+        try:
+            self.assertEqual(som_rom_parser.read_hex_rom(io.StringIO(dump)), rom)
+        finally:
+            som_rom_parser.HEX_CHUNK_SIZE = chunk_size
+
+        parsed = som_rom_parser.parse_rom_image(io.StringIO(dump))
+        self.assertEqual(parsed.get_root().get_name(), "top")
+        with self.assertRaises(som_rom_parser.SDBError):
+            som_rom_parser.read_hex_rom(["5344422"])
+
+    def test_lazy_parse(self):
+        som = create_som()
+        periph = som.get_buses()[0]
+        som.set_child_spacing(periph, 0x1000)
+        rom = som_rom_generator.generate_rom_image(som)
+        parsed = som_rom_parser.parse_rom_image(rom)
+        lazy = som_rom_parser.parse_rom_image(rom, lazy = True)
+
+        buses = lazy.get_buses()
+        self.assertEqual([b.get_name() for b in buses], ["peripheral", "memory"])
+        leaves = [buses[0].get_child_from_index(i) for i in range(12)]
+        self.assertFalse(any([leaf.is_decoded() for leaf in leaves]))
+
+        self.assertEqual(leaves[5].get_name(), "dev5")
+        self.assertEqual([leaf.is_decoded() for leaf in leaves].count(True), 1)
+        #Buses are not laid out so their size comes straight from the ROM
+        self.assertEqual(buses[0].get_component().get_size_as_int(),
+                         periph.get_component().get_size_as_int())
+
+        #Every record decodes to the same thing as the eager parser
+        for eager_bus, lazy_bus in zip([parsed.get_root()] + list(parsed.get_buses()),
+                                       [lazy.get_root()] + list(buses)):
+            self.assertEqual(eager_bus.get_child_count(), lazy_bus.get_child_count())
+            self.assertEqual(eager_bus.get_child_spacing(), lazy_bus.get_child_spacing())
+            self.assertEqual(eager_bus.get_name(), lazy_bus.get_name())
+            for i in range(eager_bus.get_child_count()):
+                if parsed.is_entity_a_bus(eager_bus, i):
+                    continue
+                self.assertEqual(dict(eager_bus.get_child_from_index(i).get_component().d),
+                                 dict(lazy_bus.get_child_from_index(i).get_component().d))
+
+    def test_diff_lazy(self):
+        som = create_som()
+        rom = som_rom_generator.generate_rom_image(som)
+        periph, mem = som.get_buses()
+        periph.get_child_from_index(3).get_component().set_size(0x200)
+        som.refresh(periph.get_child_from_index(3))
+        other_rom = som_rom_generator.generate_rom_image(som)
+
+        lazy = som_rom_parser.parse_rom_image(rom, lazy = True)
+        other = som_rom_parser.parse_rom_image(other_rom, lazy = True)
+        paths = [path for path, entity, other_entity in lazy.diff(other)]
+        self.assertIn("top.peripheral.dev3", paths)
+        self.assertIn("top.memory", paths)
+        self.assertNotIn("top.memory.mem0", paths)
+
+        #Only the records that moved or changed are decoded
+        buses = lazy.get_buses()
+        decoded = [child.get_name() for bus in [lazy.get_root()] + list(buses)
+                   for child in bus
+                   if isinstance(child, som_rom_parser.LazySOMComponent) and child.is_decoded()]
+        self.assertEqual(decoded, ["dev%d" % i for i in range(3, 12)])
+
+    def test_deep_hierarchy(self):
+        depth = sys.getrecursionlimit() + 100
+        som = sdb_object_model.SOM()
+        som.initialize_root()
+        bus = som.get_root()
+        with som.batch():
+            for i in range(depth):
+                bus = som.insert_bus(bus, "b%d" % i)
+            som.insert_component(bus, create_device("leaf", 0x10))
+
+        rom = som_rom_generator.generate_rom_image(som)
+        for lazy in [False, True]:
+            parsed = som_rom_parser.parse_rom_image(rom, lazy = lazy)
+            entities = list(parsed.walk())
+            self.assertEqual(len(entities), depth + 2)
+            path, d, leaf = entities[-1]
+            self.assertEqual(d, depth + 1)
+            self.assertEqual(leaf.get_name(), "leaf")
+        self.assertEqual(parsed.get_root().get_component().get_size_as_int(), 0x10)
+        self.assertIn("leaf", parsed._gen_bus_string(parsed.get_root()))
+
+    def test_pretty_print_filters(self):
+        rom = som_rom_generator.generate_rom_image(create_som())
+        parsed = som_rom_parser.parse_rom_image(rom, lazy = True)
+        stream = io.StringIO()
+        parsed.pretty_print_sdb(stream, record_types = [sdb_component.SDB_RECORD_TYPE_REPO_URL])
+        text = stream.getvalue()
+        self.assertIn("Bus: peripheral", text)
+        self.assertIn("URL: http://www.example.com", text)
+        self.assertNotIn("Device:", text)
+        #Records that are filtered out are never decoded
+        periph = parsed.get_buses()[0]
+        self.assertFalse(any([child.is_decoded() for child in periph]))
+
+        #Finding the bus does not decode the records either
+        self.assertIs(parsed.find_bus_by_path("top.peripheral"), periph)
+        self.assertFalse(any([child.is_decoded() for child in periph]))
+        stream = io.StringIO()
+        parsed.pretty_print_sdb(stream, root = periph)
+        text = stream.getvalue()
+        self.assertTrue(text.startswith("    Bus: peripheral"))
+        self.assertEqual(text.count("Device:"), 12)
+        self.assertNotIn("memory", text)
+
+    def test_validate_parsed_rom(self):
+        rom = som_rom_generator.generate_rom_image(create_som())
+        #Shrink the peripheral bus so only the first device fits
+        struct.pack_into(">Q", rom, 5 * 64 + 16, 0x180)
+        for lazy in [False, True]:
+            parsed = som_rom_parser.parse_rom_image(rom, lazy = lazy)
+            periph = parsed.get_buses()[0]
+            self.assertEqual(periph.get_component().get_size_as_int(), 0x180)
+            errors = parsed.validate()
+            self.assertEqual(len(errors), 11)
+            self.assertIn("top.peripheral: dev1 (0x100 - 0x200) is outside of the bus (size: 0x180)", errors)
+
+            #The size from the ROM is kept when the bus is laid out again
+            parsed.refresh()
+            self.assertEqual(periph.get_component().get_size_as_int(), 0x180)
+            parsed.set_fixed_size(periph, None)
+            self.assertEqual(periph.get_component().get_size_as_int(), 0xC00)
+            self.assertEqual(parsed.validate(), [])
+
+    def test_patch_rom(self):
+        som = create_som()
+        periph = som.get_buses()[0]
+        som.set_child_spacing(periph, 0x1000)
+        layout = som_rom_generator.ROMLayout()
+        rom = som_rom_generator.generate_rom_image(som, layout = layout)
+        self.assertEqual(som_rom_generator.patch_rom_image(som, rom, layout), [])
+        #The hashes taken from the ROM match the hashes of the components
+        dev0 = periph.get_child_from_index(0)
+        digest = dev0.get_hash()
+        dev0.invalidate_hash()
+        self.assertEqual(dev0.get_hash(), digest)
+
+        #A version bump only rewrites the record of the device
+        dev3 = periph.get_child_from_index(3)
+        addr = layout.get_record_address(dev3)
+        self.assertEqual(addr, layout.get_table_address(periph) + 4 * 64)
+        dev3.get_component().set_core_version("1.3.00")
+        ranges = som_rom_generator.patch_rom_image(som, rom, layout)
+        self.assertEqual(ranges, [(addr // 4, (addr + 64) // 4)])
+        self.assertEqual(rom, som_rom_generator.generate_rom_image(som))
+
+        #Resizing a device within the spacing does not move anything else
+        dev5 = periph.get_child_from_index(5)
+        dev6 = periph.get_child_from_index(6)
+        dev5.get_component().set_size(0x200)
+        dev6.get_component().set_size(0x200)
+        som.refresh(dev5)
+        ranges = som_rom_generator.patch_rom_image(som, rom, layout)
+        addr = layout.get_record_address(dev5)
+        self.assertEqual(ranges, [(addr // 4, (addr + 128) // 4)])
+        self.assertEqual(rom, som_rom_generator.generate_rom_image(som))
+        self.assertEqual(som_rom_generator.patch_rom_image(som, rom, layout), [])
+
+    def test_patch_rom_layout_change(self):
+        som = create_som()
+        layout = som_rom_generator.ROMLayout()
+        rom = som_rom_generator.generate_rom_image(som, layout = layout)
+        size = len(rom)
+
+        #A new device moves the tables after it, the ROM is generated again
+        mem = som.get_buses()[1]
+        som.insert_component(mem, create_device("mem1", 0x10000))
+        ranges = som_rom_generator.patch_rom_image(som, rom, layout)
+        self.assertEqual(rom, som_rom_generator.generate_rom_image(som))
+        self.assertEqual(len(rom), size + 64)
+        self.assertEqual(layout.get_size(), len(rom))
+        #The peripheral table does not change
+        for start, end in ranges:
+            self.assertTrue(end <= 5 * 16 or start >= (5 + 14) * 16)
+
+        #The layout follows the new ROM
+        mem1 = mem.get_child_from_index(1)
+        mem1.get_component().set_device_id(0x20)
+        addr = layout.get_record_address(mem1)
+        self.assertEqual(som_rom_generator.patch_rom_image(som, rom, layout),
+                         [(addr // 4, (addr + 64) // 4)])
+        self.assertEqual(rom, som_rom_generator.generate_rom_image(som))
+        with self.assertRaises(som_rom_generator.SDBError):
+            layout.get_record_address(som.get_root())
+
+if __name__ == "__main__":
+    unittest.main()
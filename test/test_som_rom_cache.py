@@ -0,0 +1,117 @@
+#! /usr/bin/env python
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import shutil
+import tempfile
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+
+from sdb import sdb_object_model
+from sdb import som_rom_generator
+from sdb import som_rom_cache
+#The same devices as the object model tests
+from test_sdb_object_model import create_device
+
+def create_som(count = 4, date = "2017/02/26"):
+    som = sdb_object_model.SOM()
+    som.initialize_root()
+    root = som.get_root()
+    som.set_bus_name(root, "top")
+    with som.batch():
+        periph = som.insert_bus(root, "peripheral")
+        for i in range(count):
+            som.insert_component(periph, create_device("dev%d" % i, 0x100, i, date = date))
+    return som
+
+class Test (unittest.TestCase):
+    """Unit Test"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_digest(self):
+        digest = som_rom_generator.get_som_digest(create_som())
+        self.assertEqual(som_rom_generator.get_som_digest(create_som()), digest)
+        self.assertNotEqual(som_rom_generator.get_som_digest(create_som(5)), digest)
+
+        som = create_som()
+        periph = som.get_buses()[0]
+        som.set_child_spacing(periph, 0x1000)
+        self.assertNotEqual(som_rom_generator.get_som_digest(som), digest)
+
+        later = create_som(date = "2018/01/01")
+        self.assertNotEqual(som_rom_generator.get_som_digest(later), digest)
+        self.assertEqual(som_rom_generator.get_som_digest(later, include_date = False),
+                         som_rom_generator.get_som_digest(create_som(), include_date = False))
+
+    def test_config_digest(self):
+        config = b'{"top": {"devices": {}}}'
+        digest = som_rom_generator.get_config_digest(config)
+        self.assertEqual(som_rom_generator.get_config_digest(config), digest)
+        self.assertNotEqual(som_rom_generator.get_config_digest(config + b" "), digest)
+        self.assertNotEqual(som_rom_generator.get_config_digest(config, include_date = False), digest)
+
+        #ROMs from another version of the generator are not used
+        version = som_rom_generator.GENERATOR_VERSION
+        som_rom_generator.GENERATOR_VERSION += 1
+        try:
+            self.assertNotEqual(som_rom_generator.get_config_digest(config), digest)
+        finally:
+            som_rom_generator.GENERATOR_VERSION = version
+
+    def test_cache_hit(self):
+        cache = som_rom_cache.ROMCache(self.directory)
+        rom = som_rom_generator.generate_rom_image(create_som(), cache)
+        self.assertEqual(cache.get_size(), len(rom))
+
+        #A hit does not generate the ROM again
+        bus_to_rom = som_rom_generator._bus_to_rom
+        som_rom_generator._bus_to_rom = None
+        try:
+            self.assertEqual(som_rom_generator.generate_rom_image(create_som(), cache), rom)
+        finally:
+            som_rom_generator._bus_to_rom = bus_to_rom
+
+        other = som_rom_generator.generate_rom_image(create_som(5), cache)
+        self.assertNotEqual(other, rom)
+        self.assertEqual(cache.get_size(), len(rom) + len(other))
+
+        #The dates are only part of the key when they are included
+        later = create_som(date = "2018/01/01")
+        self.assertNotEqual(som_rom_generator.generate_rom_image(later, cache), rom)
+        cache = som_rom_cache.ROMCache(self.directory, include_date = False)
+        som_rom_generator.generate_rom_image(create_som(), cache)
+        self.assertEqual(som_rom_generator.generate_rom_image(later, cache), rom)
+
+    def test_lru_eviction(self):
+        roms = [som_rom_generator.generate_rom_image(create_som(count)) for count in [1, 2, 3]]
+        keys = [som_rom_generator.get_som_digest(create_som(count)) for count in [1, 2, 3]]
+        cache = som_rom_cache.ROMCache(self.directory, max_size = len(roms[0]) + len(roms[2]))
+        cache.put(keys[0], roms[0])
+        cache.put(keys[1], roms[1])
+        os.utime(cache._get_path(keys[0]), (1000, 1000))
+        os.utime(cache._get_path(keys[1]), (2000, 2000))
+
+        #Using the first image makes the second one the least recently used
+        self.assertEqual(cache.get(keys[0]), roms[0])
+        cache.put(keys[2], roms[2])
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertEqual(cache.get(keys[0]), roms[0])
+        self.assertEqual(cache.get(keys[2]), roms[2])
+        self.assertLessEqual(cache.get_size(), cache.get_max_size())
+
+        cache.clear()
+        self.assertEqual(cache.get_size(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
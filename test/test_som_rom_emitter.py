@@ -0,0 +1,120 @@
+#! /usr/bin/env python
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+import binascii
+import io
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir))
+sys.path.append(os.path.join(os.path.dirname(__file__),
+                             os.pardir,
+                             "sdb"))
+
+from sdb import sdb_object_model
+from sdb import sdb_component
+from sdb import som_rom_generator
+from sdb import som_rom_emitter
+#The same devices as the object model tests
+from test_sdb_object_model import create_device
+
+def create_rom():
+    som = sdb_object_model.SOM()
+    som.initialize_root()
+    root = som.get_root()
+    som.set_bus_name(root, "top")
+    with som.batch():
+        periph = som.insert_bus(root, "peripheral")
+        for i in range(4):
+            som.insert_component(periph, create_device("dev%d" % i, 0x100, i))
+    return som_rom_generator.generate_rom_image(som)
+
+def emit(rom, oformat):
+    stream = io.StringIO()
+    som_rom_emitter.emit_rom(rom, oformat, stream)
+    return stream.getvalue()
+
+def read_ihex(text):
+    rom = bytearray()
+    upper = 0
+    for line in text.splitlines():
+        record = bytearray(binascii.unhexlify(line[1:]))
+        if sum(record) & 0xFF != 0:
+            raise ValueError("Bad checksum: %s" % line)
+        length, address, record_type = record[0], (record[1] << 8) | record[2], record[3]
+        data = record[4:4 + length]
+        if record_type == 0x04:
+            upper = (data[0] << 8) | data[1]
+        elif record_type == 0x00:
+            offset = (upper << 16) | address
+            rom[offset:offset + length] = data
+    return rom
+
+class Test (unittest.TestCase):
+    """Unit Test"""
+
+    def setUp(self):
+        self.rom = create_rom()
+        self.chunk_size = som_rom_emitter.CHUNK_SIZE
+        #Make sure the ROM is converted in more than one chunk
+        som_rom_emitter.CHUNK_SIZE = 100
+
+    def tearDown(self):
+        som_rom_emitter.CHUNK_SIZE = self.chunk_size
+
+    def test_binary(self):
+        stream = io.BytesIO()
+        som_rom_emitter.emit_rom(self.rom, "bin", stream)
+        self.assertEqual(stream.getvalue(), bytes(self.rom))
+        self.assertTrue(som_rom_emitter.is_binary_format("bin"))
+
+    def test_readmemh(self):
+        text = emit(self.rom, "readmemh32")
+        self.assertEqual(text, sdb_component.convert_rom_to_32bit_buffer(self.rom) + "\n")
+        self.assertEqual(emit(self.rom, "rom"), text)
+        lines = emit(self.rom, "readmemh64").splitlines()
+        self.assertEqual(len(lines), len(self.rom) // 8)
+        self.assertEqual(lines[0], "5344422D00010100")
+        self.assertEqual(bytearray(binascii.unhexlify("".join(lines))), self.rom)
+
+    def test_coe_and_mif(self):
+        lines = emit(self.rom, "coe").splitlines()
+        self.assertEqual(lines[:2], ["memory_initialization_radix=16;",
+                                     "memory_initialization_vector="])
+        words = lines[2:]
+        self.assertEqual(len(words), len(self.rom) // 4)
+        self.assertTrue(all([word.endswith(",") for word in words[:-1]]))
+        self.assertEqual(words[-1], "000000FF;")
+
+        text = emit(self.rom, "mif")
+        self.assertIn("DEPTH=%d;" % (len(self.rom) // 4), text)
+        self.assertIn("\t1 : 00010100;\n", text)
+        self.assertTrue(text.endswith("END;\n"))
+
+    def test_ihex(self):
+        self.assertEqual(read_ihex(emit(self.rom, "ihex")), self.rom)
+        #Images over 64K need extended linear address records
+        rom = bytearray(range(256)) * 0x110
+        text = emit(rom, "ihex")
+        self.assertIn(":020000040001F9\n", text)
+        self.assertTrue(text.endswith(":00000001FF\n"))
+        self.assertEqual(read_ihex(text), rom)
+
+    def test_c_header(self):
+        text = emit(self.rom, "header")
+        self.assertIn("#define SDB_ROM_SIZE %d" % len(self.rom), text)
+        values = text[text.index("{") + 1:text.index("}")].replace(",", " ").split()
+        self.assertEqual(bytearray([int(value, 16) for value in values]), self.rom)
+
+    def test_register_emitter(self):
+        with self.assertRaises(som_rom_emitter.SDBError):
+            som_rom_emitter.emit_rom(self.rom, "srec", io.StringIO())
+        with self.assertRaises(som_rom_emitter.SDBError):
+            som_rom_emitter.register_emitter("bin", som_rom_emitter.emit_binary, ".bin")
+        with self.assertRaises(som_rom_emitter.SDBError):
+            emit(self.rom[:-2], "readmemh32")
+
+if __name__ == "__main__":
+    unittest.main()